@@ -0,0 +1,226 @@
+import threading
+import weakref
+from datetime import date
+
+ATTENDANCE_FILE = "attendance_log.json"
+
+
+def _visit_day(log):
+    """Day ordinal of a check-in, or None if it has no valid check-in time."""
+    check_in = log.get('check_in_time')
+    if not check_in:
+        return None
+    try:
+        return date.fromisoformat(check_in[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _bit_positions(bits):
+    """Positions of the set bits of an int, lowest first."""
+    digits = bin(bits)[:1:-1]
+    positions = []
+    position = digits.find('1')
+    while position != -1:
+        positions.append(position)
+        position = digits.find('1', position + 1)
+    return positions
+
+
+class ActivityBitmaps:
+    """Which members visited on each day, as one bitset per day.
+
+    Every member gets a bit position the first time they check in; each
+    day is a Python int with the bits of the members who checked in that
+    day. Distinct visitors over any date range are then an OR of the
+    day bitsets and a popcount, instead of a scan of the attendance log.
+
+    Kept up to date from change events (see DataManager.subscribe), so a
+    check-in costs one bit set. Reflects the attendance log as saved.
+    When the log is replaced wholesale (a reload or a restore, which send
+    no events), the bitmaps are rebuilt on the next query.
+    """
+
+    def __init__(self):
+        self.member_ids = []      # Bit position -> member ID
+        self.member_bits = {}     # Member ID -> bit position
+        self.days = {}            # Day ordinal -> bitset of members who visited
+        self._repeat_visits = {}  # (day ordinal, bit position) -> visits that day, when more than one
+        self._version = None      # Attendance version the bitmaps match
+        self._lock = threading.RLock()
+
+    # ==================== Maintenance ====================
+
+    def rebuild(self, attendance_log, version=None):
+        """Builds the bitmaps from a whole attendance log."""
+        with self._lock:
+            # Collect bit positions per day, then set them in one bytearray
+            # per day: or-ing into big ints one check-in at a time is quadratic
+            day_positions = {}
+            days_of = {}  # Check-in date string -> day ordinal
+            for log in attendance_log:
+                check_in = log.get('check_in_time')
+                if not check_in:
+                    continue
+                day = days_of.get(check_in[:10], False)
+                if day is False:
+                    day = days_of[check_in[:10]] = _visit_day(log)
+                if day is None:
+                    continue
+                positions = day_positions.get(day)
+                if positions is None:
+                    positions = day_positions[day] = []
+                positions.append(self._bit(log['member_id']))
+
+            size = len(self.member_ids) // 8 + 1
+            self.days = {}
+            self._repeat_visits = {}
+            for day, positions in day_positions.items():
+                bits = bytearray(size)
+                for position in positions:
+                    byte, mask = position >> 3, 1 << (position & 7)
+                    if bits[byte] & mask:
+                        visit = (day, position)
+                        self._repeat_visits[visit] = self._repeat_visits.get(visit, 1) + 1
+                    bits[byte] |= mask
+                self.days[day] = int.from_bytes(bits, 'little')
+            self._version = version
+
+    def sync(self, data_source):
+        """Rebuilds the bitmaps if the attendance log changed without events.
+
+        Sources without ``versions`` are rebuilt on every call.
+        """
+        versions = getattr(data_source, 'versions', None)
+        version = versions.get(ATTENDANCE_FILE, 0) if versions is not None else None
+        with self._lock:
+            if version is None or version != self._version:
+                self.rebuild(data_source.attendance_log, version)
+
+    def on_records_changed(self, events):
+        """Applies attendance change events (subscribed by activity_for).
+
+        Events already reflected by a rebuild are skipped. A gap in the
+        versions means the log also changed without events (e.g. it was
+        reloaded), so the bitmaps are rebuilt on the next query.
+        """
+        with self._lock:
+            for event in events:
+                if self._version is None or event.version <= self._version:
+                    continue
+                if event.version != self._version + 1:
+                    self._version = None
+                    return
+                self._version = event.version
+                
+                previous = self._visit(event.previous)
+                current = self._visit(event.record)
+                if previous != current:  # e.g. a check-out changes nothing here
+                    if previous:
+                        self._remove_visit(*previous)
+                    if current:
+                        self._add_visit(*current)
+
+    def _bit(self, member_id):
+        """Bit position of a member, assigning the next one on first sight."""
+        bit = self.member_bits.get(member_id)
+        if bit is None:
+            bit = self.member_bits[member_id] = len(self.member_ids)
+            self.member_ids.append(member_id)
+        return bit
+
+    def _visit(self, log):
+        """(day ordinal, bit position) of a check-in, or None."""
+        day = _visit_day(log) if log else None
+        return (day, self._bit(log['member_id'])) if day is not None else None
+
+    def _add_visit(self, day, bit):
+        bits = self.days.get(day, 0)
+        if bits >> bit & 1:
+            self._repeat_visits[(day, bit)] = self._repeat_visits.get((day, bit), 1) + 1
+        else:
+            self.days[day] = bits | (1 << bit)
+
+    def _remove_visit(self, day, bit):
+        count = self._repeat_visits.pop((day, bit), 1)
+        if count > 2:
+            self._repeat_visits[(day, bit)] = count - 1
+        elif count == 1 and day in self.days:
+            self.days[day] &= ~(1 << bit)
+
+    # ==================== Queries ====================
+
+    def active_bits(self, first_day, last_day):
+        """Bitset of members who visited between two dates (inclusive)."""
+        first, last = first_day.toordinal(), last_day.toordinal()
+        bits = 0
+        with self._lock:
+            if last - first < len(self.days):
+                for day in range(first, last + 1):
+                    bits |= self.days.get(day, 0)
+            else:
+                for day, day_bits in self.days.items():
+                    if first <= day <= last:
+                        bits |= day_bits
+        return bits
+
+    def count_active(self, first_day, last_day):
+        """Number of distinct members who visited between two dates (inclusive)."""
+        return self.active_bits(first_day, last_day).bit_count()
+
+    def members(self, bits):
+        """Member IDs for a bitset."""
+        return [self.member_ids[position] for position in _bit_positions(bits)]
+
+    def bits_for(self, member_ids):
+        """Bitset of the given members; members who never visited are skipped."""
+        bits = 0
+        for member_id in member_ids:
+            bit = self.member_bits.get(member_id)
+            if bit is not None:
+                bits |= 1 << bit
+        return bits
+
+    def last_visits(self, member_ids, before_day):
+        """Each member's latest visit day before a date.
+
+        Walks the days backwards, dropping members as their latest visit
+        is found, so it stops as soon as every member is accounted for.
+
+        Returns:
+            dict: Member ID -> date of last visit (members who never
+                visited before that date are left out)
+        """
+        remaining = self.bits_for(member_ids)
+        found = {}
+        with self._lock:
+            for day in sorted((d for d in self.days if d < before_day.toordinal()), reverse=True):
+                if not remaining:
+                    break
+                hit = self.days[day] & remaining
+                if hit:
+                    visit = date.fromordinal(day)
+                    for member_id in self.members(hit):
+                        found[member_id] = visit
+                    remaining &= ~hit
+        return found
+
+
+_bitmaps = weakref.WeakKeyDictionary()
+_bitmaps_guard = threading.Lock()
+
+
+def activity_for(data_source):
+    """Returns up-to-date ActivityBitmaps for a data manager (or snapshot).
+
+    Bitmaps for a data manager are built once and then maintained from its
+    change events; a snapshot's are built once, since it never changes.
+    """
+    with _bitmaps_guard:
+        bitmaps = _bitmaps.get(data_source)
+        if bitmaps is None:
+            bitmaps = _bitmaps[data_source] = ActivityBitmaps()
+            if hasattr(data_source, 'subscribe'):
+                data_source.subscribe(bitmaps.on_records_changed, {ATTENDANCE_FILE})
+    bitmaps.sync(data_source)
+    return bitmaps
@@ -1,14 +1,57 @@
-from datetime import datetime, timedelta
+import heapq
+from datetime import date, datetime, timedelta
 from collections import defaultdict
 
+from .activity_bitmaps import activity_for
+from .balance_ledger import ledger_for
+from .churn_risk import risk_index_for
+from .numpy_engine import NumpyEngine, numpy_available
+from .session_stats import session_stats_for
+from .result_cache import cache_for, cached
+
+MEMBERS_FILE = "members.json"
+MEMBERSHIPS_FILE = "membership_history.json"
+PAYMENTS_FILE = "payments_log.json"
+ATTENDANCE_FILE = "attendance_log.json"
+PLANS_FILE = "plans.json"
+TRAINERS_FILE = "trainers.json"
+
 class Analytics:
-    """Analytics module for retention metrics and revenue prediction."""
+    """Analytics module for retention metrics and revenue prediction.
+    
+    Results are cached per data manager until a collection they read is
+    saved again (see result_cache.cached), so reopening the dashboard with
+    unchanged data recomputes nothing, and a new payment only invalidates
+    the revenue results.
+    
+    With ``engine="numpy"`` the heavy computations run vectorized on
+    NumPy arrays (see numpy_engine.NumpyEngine) and return identical
+    results; without NumPy installed it falls back to pure Python.
+    """
     
-    def __init__(self, data_manager):
+    def __init__(self, data_manager, cache=None, engine="python"):
+        """
+        Args:
+            data_manager: DataManager (or DataSnapshot) to analyse
+            cache: ResultCache to use; defaults to the one shared by every
+                Analytics of this data manager
+            engine: "python" (default) or "numpy"
+        """
         self.data_manager = data_manager
+        self.cache = cache if cache is not None else cache_for(data_manager)
+        
+        if engine not in ("python", "numpy"):
+            raise ValueError(f"Unknown analytics engine: {engine}")
+        self.engine = None
+        if engine == "numpy":
+            if numpy_available():
+                self.engine = NumpyEngine(data_manager)
+            else:
+                print("NumPy is not installed; using the pure-Python analytics engine.")
     
     # ==================== Retention Metrics ====================
     
+    @cached(MEMBERSHIPS_FILE)
     def calculate_churn_rate(self, period_months=1, month_offset=0):
         """Calculates churn rate for the specified period.
         
@@ -21,6 +64,9 @@ class Analytics:
         Returns:
             float: Churn rate percentage
         """
+        if self.engine:
+            return self.engine.churn_rate(period_months, month_offset)
+        
         today = datetime.now()
         # Calculate start and end of the period based on offset
         period_end = today - timedelta(days=month_offset * 30)
@@ -59,6 +105,7 @@ class Analytics:
         churn_rate = (len(expired_in_period) / total_expired) * 100
         return round(churn_rate, 2)
     
+    @cached(MEMBERSHIPS_FILE)
     def calculate_retention_rate(self, period_months=1, month_offset=0):
         """Calculates retention rate for the specified period.
         
@@ -75,6 +122,7 @@ class Analytics:
         retention_rate = 100 - churn_rate
         return round(retention_rate, 2)
     
+    @cached(MEMBERSHIPS_FILE, MEMBERS_FILE)
     def get_at_risk_members(self, days_threshold=30):
         """Identifies members whose memberships are expiring soon.
         
@@ -84,6 +132,9 @@ class Analytics:
         Returns:
             list: List of dicts with member info and expiry date
         """
+        if self.engine:
+            return self.engine.at_risk_members(days_threshold)
+        
         today = datetime.now()
         threshold_date = today + timedelta(days=days_threshold)
         
@@ -111,6 +162,7 @@ class Analytics:
         at_risk.sort(key=lambda x: x['days_remaining'])
         return at_risk
     
+    @cached(MEMBERSHIPS_FILE)
     def get_retention_trend(self, months=6):
         """Gets historical retention rate trend.
         
@@ -120,6 +172,9 @@ class Analytics:
         Returns:
             dict: Month labels and retention rates
         """
+        if self.engine:
+            return self.engine.retention_trend(months)
+        
         today = datetime.now()
         trends = {'months': [], 'rates': []}
         
@@ -138,8 +193,20 @@ class Analytics:
     
     # ==================== Revenue Prediction ====================
     
+    @cached(MEMBERSHIPS_FILE, PLANS_FILE, TRAINERS_FILE)
     def predict_revenue(self, months_ahead=6):
-        """Predicts future revenue based on historical data and active memberships.
+        """Predicts future revenue from the renewal schedule of active memberships.
+        
+        Each active membership is expected to renew when it expires, at
+        its plan's current price plus its trainer's fee, with the renewal
+        probability observed for that plan (see get_renewal_rates). A
+        renewed membership may expire and renew again within the horizon,
+        with the probabilities multiplied. The forecast is deterministic,
+        so it can be cached, and takes one pass over active memberships.
+        
+        Month i covers the 30 days up to today + i*30 days; renewals already
+        overdue count in the first month. Frozen memberships are left out
+        until they are active again.
         
         Args:
             months_ahead: Number of months to predict (default: 6)
@@ -148,25 +215,89 @@ class Analytics:
             dict: Predicted revenue by month
         """
         today = datetime.now()
-        predictions = {'months': [], 'predicted': []}
+        today_ordinal = today.date().toordinal()
+        horizon_days = months_ahead * 30
+        renewal_rates = self.get_renewal_rates()
+        default_rate = renewal_rates.get(None, 0.5)
         
-        # Calculate average monthly revenue from history
-        avg_monthly_revenue = self._calculate_average_monthly_revenue()
+        expected = [0.0] * months_ahead
+        for membership in self.data_manager.membership_history:
+            if membership['status'] != 'Active':
+                continue
+            plan = self.data_manager.get_plan(membership.get('plan_id'))
+            if not plan:
+                continue
+            price = plan['base_price']
+            trainer_id = membership.get('assigned_trainer_id')
+            trainer = self.data_manager.get_trainer(trainer_id) if trainer_id else None
+            if trainer:
+                price += trainer['fee']
+            rate = renewal_rates.get(membership['plan_id'], default_rate)
+            period_days = max(1, plan.get('duration_months', 1)) * 30
+            
+            # Walk the renewal chain that falls within the horizon
+            days_until = date.fromisoformat(membership['end_date'][:10]).toordinal() - today_ordinal
+            probability = rate
+            while days_until <= horizon_days and probability > 0:
+                month_index = max(0, (days_until - 1) // 30)
+                expected[month_index] += price * probability
+                days_until = max(days_until, 0) + period_days
+                probability *= rate
         
-        import random
+        predictions = {'months': [], 'predicted': []}
         for i in range(1, months_ahead + 1):
             future_date = today + timedelta(days=i * 30)
-            month_label = future_date.strftime("%b %Y")
-            
-            # Predicted revenue = average historical with some variation for realism
-            variation = random.uniform(0.9, 1.1)
-            predicted = avg_monthly_revenue * variation
-            
-            predictions['months'].append(month_label)
-            predictions['predicted'].append(round(predicted, 2))
+            predictions['months'].append(future_date.strftime("%b %Y"))
+            predictions['predicted'].append(round(expected[i - 1], 2))
         
         return predictions
     
+    @cached(MEMBERSHIPS_FILE)
+    def get_renewal_rates(self):
+        """Observed renewal probability per plan, from memberships that have ended.
+        
+        A membership counts as renewed if the member has another membership
+        starting on or after its end date. Rates are smoothed as
+        (renewed + 1) / (ended + 2), so plans with little history stay near
+        50% instead of jumping to 0% or 100%.
+        
+        Returns:
+            dict: plan_id -> probability, plus None -> rate over all plans
+        """
+        today = datetime.now().date().isoformat()
+        
+        # Latest and second-latest start per member: a membership was
+        # renewed if the latest other membership starts after it ends
+        latest = {}
+        for membership in self.data_manager.membership_history:
+            member_id = membership['member_id']
+            start = membership['start_date'][:10]
+            best = latest.get(member_id)
+            if best is None:
+                latest[member_id] = (start, membership['membership_id'], "")
+            elif start > best[0]:
+                latest[member_id] = (start, membership['membership_id'], best[0])
+            elif start > best[2]:
+                latest[member_id] = (best[0], best[1], start)
+        
+        ended = defaultdict(int)
+        renewed = defaultdict(int)
+        for membership in self.data_manager.membership_history:
+            end = membership['end_date'][:10]
+            if end > today:
+                continue
+            best_start, best_id, second_start = latest[membership['member_id']]
+            other_start = second_start if best_id == membership['membership_id'] else best_start
+            for plan_id in {membership.get('plan_id'), None}:
+                ended[plan_id] += 1
+                if other_start and other_start >= end:
+                    renewed[plan_id] += 1
+        
+        rates = {plan_id: (renewed[plan_id] + 1) / (ended[plan_id] + 2) for plan_id in ended}
+        rates.setdefault(None, 0.5)
+        return rates
+    
+    @cached(PAYMENTS_FILE)
     def _calculate_average_monthly_revenue(self, months=6):
         """Calculates average monthly revenue from historical data.
         
@@ -176,6 +307,9 @@ class Analytics:
         Returns:
             float: Average monthly revenue
         """
+        if self.engine:
+            return self.engine.average_monthly_revenue(months)
+        
         today = datetime.now()
         start_date = today - timedelta(days=months * 30)
         
@@ -197,6 +331,7 @@ class Analytics:
         avg_revenue = sum(monthly_revenue.values()) / len(monthly_revenue)
         return round(avg_revenue, 2)
     
+    @cached(PAYMENTS_FILE)
     def get_historical_revenue_trend(self, months=12):
         """Gets historical revenue trend.
         
@@ -206,6 +341,9 @@ class Analytics:
         Returns:
             dict: Month labels and revenue amounts
         """
+        if self.engine:
+            return self.engine.historical_revenue_trend(months)
+        
         today = datetime.now()
         start_date = today - timedelta(days=months * 30)
         
@@ -229,6 +367,28 @@ class Analytics:
             'revenue': [round(monthly_revenue[m], 2) for m in sorted_months]
         }
     
+    @cached(PAYMENTS_FILE)
+    def get_outstanding_balances(self):
+        """Totals what members still owe, aged by how overdue it is.
+        
+        Read from the balance ledger (see balance_ledger.BalanceLedger),
+        which is kept up to date as payments change instead of summing the
+        payments log.
+        
+        Returns:
+            dict: 'total' outstanding, 'unpaid_count', 'overdue_count' and
+                'aging', the amount and count per bucket ("not_due", "0-30",
+                "31-60", "60+" days overdue)
+        """
+        ledger = ledger_for(self.data_manager)
+        return {
+            'total': ledger.total_outstanding(),
+            'unpaid_count': ledger.unpaid_count,
+            'overdue_count': ledger.overdue_count(),
+            'aging': ledger.aging()
+        }
+    
+    @cached(PAYMENTS_FILE, MEMBERSHIPS_FILE)
     def calculate_confidence_interval(self):
         """Calculates prediction confidence based on data availability.
         
@@ -240,15 +400,18 @@ class Analytics:
         # 2. Consistency of revenue
         # 3. Number of active members
         
-        paid_payments = [p for p in self.data_manager.payments_log if p['status'] == 'Paid']
-        active_members = len([m for m in self.data_manager.membership_history if m['status'] == 'Active'])
+        if self.engine:
+            paid_count, active_members = self.engine.confidence_counts()
+        else:
+            paid_count = len([p for p in self.data_manager.payments_log if p['status'] == 'Paid'])
+            active_members = len([m for m in self.data_manager.membership_history if m['status'] == 'Active'])
         
         confidence = 50  # Base confidence
         
         # More historical data = higher confidence
-        if len(paid_payments) > 50:
+        if paid_count > 50:
             confidence += 20
-        elif len(paid_payments) > 20:
+        elif paid_count > 20:
             confidence += 10
         
         # More active members = higher confidence
@@ -271,3 +434,319 @@ class Analytics:
             'confidence': confidence,
             'message': message
         }
+    
+    @cached(ATTENDANCE_FILE, PAYMENTS_FILE, MEMBERS_FILE)
+    def get_churn_risk_scores(self):
+        """Scores every member's churn risk from their visits and payments.
+        
+        Unlike get_at_risk_members, which only looks at expiry dates, this
+        catches members who stopped coming. See churn_risk.ChurnRiskIndex
+        for how scores are made; only members whose check-ins or payments
+        changed are rescored.
+        
+        Returns:
+            dict: Member ID -> score details ('score' 0-100, 'level',
+                'days_since_visit', 'visits', 'avg_minutes', 'overdue',
+                'unpaid')
+        """
+        return risk_index_for(self.data_manager).scores()
+    
+    @cached(ATTENDANCE_FILE, PAYMENTS_FILE, MEMBERS_FILE)
+    def get_churn_risk_summary(self, top=10):
+        """Counts members per churn risk level and lists the riskiest.
+        
+        Args:
+            top: Number of highest-scoring members to list
+            
+        Returns:
+            dict: 'high', 'medium' and 'low' counts and 'top', the riskiest
+                members with their name, contact and score details
+        """
+        scores = self.get_churn_risk_scores()
+        summary = {'high': 0, 'medium': 0, 'low': 0, 'top': []}
+        for details in scores.values():
+            summary[details['level'].lower()] += 1
+        
+        riskiest = heapq.nsmallest(top, scores.items(), key=lambda item: (-item[1]['score'], item[0]))
+        for member_id, details in riskiest:
+            member = self.data_manager.get_member(member_id)
+            if member:
+                summary['top'].append(dict(details, member_id=member_id,
+                                           member_name=f"{member['first_name']} {member['last_name']}",
+                                           contact=member.get('contact', '')))
+        return summary
+    
+    # ==================== Cohorts ====================
+    
+    @cached(MEMBERS_FILE, MEMBERSHIPS_FILE)
+    def get_cohort_retention(self, cohorts=12):
+        """Builds the cohort retention grid: members by join month, retained N months later.
+        
+        A member counts as retained in a month if one of their memberships
+        covers it: Active and Frozen memberships from their start to their
+        end month, Expired ones only up to last month (they are no longer
+        held). Memberships are swept once, sorted by member, merging each
+        member's overlapping months into intervals that are added to their
+        cohort's difference array, so no cell is computed by rescanning.
+        
+        Args:
+            cohorts: Number of most recent join months to include; offsets
+                run from 0 to cohorts - 1 months
+            
+        Returns:
+            dict: Cohort labels, cohort sizes and, per cohort, the
+                percentage retained at each month offset (None for months
+                that have not happened yet, and for cohorts with no members)
+        """
+        today = datetime.now()
+        current_month = today.year * 12 + today.month - 1
+        first_cohort = current_month - cohorts + 1
+        
+        month_indexes = {}  # Dates repeat a lot; parse each once
+        
+        def month_index(iso_date):
+            index = month_indexes.get(iso_date)
+            if index is None:
+                index = month_indexes[iso_date] = int(iso_date[:4]) * 12 + int(iso_date[5:7]) - 1
+            return index
+        
+        # Cohort of each member, by join month
+        member_cohort = {}
+        sizes = [0] * cohorts
+        for member_id, member in self.data_manager.members_db.items():
+            join_date = member.get('join_date')
+            if not join_date:
+                continue
+            cohort = month_index(join_date) - first_cohort
+            if 0 <= cohort < cohorts:
+                member_cohort[member_id] = cohort
+                sizes[cohort] += 1
+        
+        # One sweep over memberships grouped by member: merged month
+        # intervals go into a difference array per cohort
+        deltas = [[0] * (cohorts + 1) for _ in range(cohorts)]
+        
+        def add_interval(cohort, first, last):
+            join = first_cohort + cohort
+            first = max(first, join) - join
+            last = min(last, current_month) - join
+            if first <= last:
+                deltas[cohort][first] += 1
+                deltas[cohort][last + 1] -= 1
+        
+        memberships = sorted(
+            (m for m in self.data_manager.membership_history if m['member_id'] in member_cohort),
+            key=lambda m: (m['member_id'], m['start_date'])
+        )
+        current_member = None
+        run_first = run_last = None
+        for membership in memberships:
+            first = month_index(membership['start_date'])
+            last = month_index(membership['end_date'])
+            if membership.get('status') not in ('Active', 'Frozen'):
+                last = min(last, current_month - 1)
+            if last < first:
+                continue
+            
+            if membership['member_id'] != current_member or first > run_last + 1:
+                if current_member is not None:
+                    add_interval(member_cohort[current_member], run_first, run_last)
+                current_member = membership['member_id']
+                run_first, run_last = first, last
+            else:
+                run_last = max(run_last, last)
+        if current_member is not None:
+            add_interval(member_cohort[current_member], run_first, run_last)
+        
+        labels = []
+        rates = []
+        for cohort in range(cohorts):
+            month = first_cohort + cohort
+            labels.append(datetime(month // 12, month % 12 + 1, 1).strftime("%b %Y"))
+            row = []
+            retained = 0
+            for offset in range(cohorts):
+                if month + offset > current_month:
+                    row.append(None)
+                    continue
+                retained += deltas[cohort][offset]
+                row.append(round(retained / sizes[cohort] * 100, 1) if sizes[cohort] else None)
+            rates.append(row)
+        
+        return {'cohorts': labels, 'sizes': sizes, 'rates': rates}
+    
+    # ==================== Attendance ====================
+    
+    @cached(ATTENDANCE_FILE)
+    def get_peak_hours(self, days=7, first_hour=6, last_hour=22):
+        """Counts check-ins per hour of day over the last few days.
+        
+        Args:
+            days: Number of days to look back (default: 7)
+            first_hour: First hour of day to include (default: 6 AM)
+            last_hour: Last hour of day to include (default: 10 PM)
+            
+        Returns:
+            dict: Hours and check-in counts
+        """
+        if self.engine:
+            return self.engine.peak_hours(days, first_hour, last_hour)
+        
+        since = datetime.now().date() - timedelta(days=days)
+        hour_counts = defaultdict(int)
+        
+        for log in self.data_manager.attendance_log:
+            check_in = log.get('check_in_time')
+            if not check_in:
+                continue
+            try:
+                dt = datetime.fromisoformat(check_in.replace(' ', 'T'))
+            except ValueError:
+                continue
+            if dt.date() >= since:
+                hour_counts[dt.hour] += 1
+        
+        hours = list(range(first_hour, last_hour + 1))
+        return {
+            'hours': hours,
+            'counts': [hour_counts.get(h, 0) for h in hours]
+        }
+    
+    @cached(ATTENDANCE_FILE)
+    def get_active_member_counts(self):
+        """Counts distinct members who checked in today, this week and this month.
+        
+        Periods end today and cover the last 1, 7 and 30 days. Counted
+        from the daily activity bitmaps (see activity_bitmaps), not by
+        scanning the attendance log.
+        
+        Returns:
+            dict: 'dau', 'wau' and 'mau' member counts
+        """
+        activity = activity_for(self.data_manager)
+        today = date.today()
+        return {
+            'dau': activity.count_active(today, today),
+            'wau': activity.count_active(today - timedelta(days=6), today),
+            'mau': activity.count_active(today - timedelta(days=29), today),
+        }
+    
+    @cached(ATTENDANCE_FILE)
+    def get_active_members_trend(self, days=7, periods=8):
+        """Counts distinct members who checked in during each of the last few periods.
+        
+        Args:
+            days: Length of each period in days (default: 7, weekly)
+            periods: Number of periods, the last one ending today
+            
+        Returns:
+            dict: Period labels (first day of each period) and member counts
+        """
+        activity = activity_for(self.data_manager)
+        today = date.today()
+        trend = {'periods': [], 'counts': []}
+        for i in range(periods - 1, -1, -1):
+            last_day = today - timedelta(days=i * days)
+            first_day = last_day - timedelta(days=days - 1)
+            trend['periods'].append(first_day.strftime("%d %b"))
+            trend['counts'].append(activity.count_active(first_day, last_day))
+        return trend
+    
+    @cached(ATTENDANCE_FILE, MEMBERS_FILE, MEMBERSHIPS_FILE)
+    def get_lapsed_members(self, days=21):
+        """Finds members with an active membership who have not checked in lately.
+        
+        Args:
+            days: Days without a check-in, counting today (default: 21)
+            
+        Returns:
+            list: Lapsed members with their last visit (None if they never
+                visited) and days since it, longest absence first
+        """
+        activity = activity_for(self.data_manager)
+        today = date.today()
+        since = today - timedelta(days=days - 1)
+        
+        active_ids = {m['member_id'] for m in self.data_manager.membership_history
+                      if m.get('status') == 'Active'}
+        visited = set(activity.members(activity.active_bits(since, today)))
+        lapsed_ids = [member_id for member_id in active_ids if member_id not in visited]
+        last_visits = activity.last_visits(lapsed_ids, since)
+        
+        lapsed = []
+        for member_id in lapsed_ids:
+            member = self.data_manager.get_member(member_id)
+            if not member:
+                continue
+            last_visit = last_visits.get(member_id)
+            lapsed.append({
+                'member_id': member_id,
+                'member_name': f"{member['first_name']} {member['last_name']}",
+                'contact': member.get('contact', ''),
+                'last_visit': last_visit.isoformat() if last_visit else None,
+                'days_since_visit': (today - last_visit).days if last_visit else None
+            })
+        lapsed.sort(key=lambda x: (x['days_since_visit'] is not None, -(x['days_since_visit'] or 0), x['member_id']))
+        return lapsed
+    
+    # ==================== Session Lengths ====================
+    
+    @cached(ATTENDANCE_FILE)
+    def get_session_duration_stats(self, days=30):
+        """Summarizes session lengths over the last few days.
+        
+        Merged from per-day streaming stats and quantile sketches (see
+        session_stats.SessionDurationIndex), so no sessions are sorted.
+        
+        Args:
+            days: Number of days, counting today (default: 30)
+            
+        Returns:
+            dict: Session count, mean, stdev and approximate p50/p90/p99
+                length in minutes (None when there are no sessions)
+        """
+        today = date.today()
+        index = session_stats_for(self.data_manager)
+        return index.period(today - timedelta(days=days - 1), today).summary()
+    
+    @cached(ATTENDANCE_FILE)
+    def get_session_duration_trend(self, days=14):
+        """Daily session-length trend.
+        
+        Args:
+            days: Number of days, ending today (default: 14)
+            
+        Returns:
+            dict: Day labels and per-day mean, p50 and p90 length in minutes
+                (None for days without sessions)
+        """
+        today = date.today()
+        index = session_stats_for(self.data_manager)
+        trend = {'days': [], 'mean': [], 'p50': [], 'p90': []}
+        for i in range(days - 1, -1, -1):
+            day = today - timedelta(days=i)
+            summary = index.day(day).summary()
+            trend['days'].append(day.strftime("%d %b"))
+            for field in ('mean', 'p50', 'p90'):
+                trend[field].append(summary[field])
+        return trend
+    
+    @cached(ATTENDANCE_FILE)
+    def get_session_duration_by_hour(self, first_hour=6, last_hour=22):
+        """Session lengths by check-in hour, over all recorded sessions.
+        
+        Returns:
+            dict: Hours and the mean, p50 and p90 length in minutes of
+                sessions starting in each (None for hours without sessions)
+        """
+        index = session_stats_for(self.data_manager)
+        by_hour = {'hours': list(range(first_hour, last_hour + 1)), 'mean': [], 'p50': [], 'p90': []}
+        for hour in by_hour['hours']:
+            summary = index.hour(hour).summary()
+            for field in ('mean', 'p50', 'p90'):
+                by_hour[field].append(summary[field])
+        return by_hour
+    
+    def get_member_session_stats(self, member_id):
+        """Summarizes one member's session lengths (count, mean, stdev, p50/p90/p99)."""
+        return session_stats_for(self.data_manager).member(member_id).summary()
@@ -1,13 +1,20 @@
 import customtkinter as ctk
 from .data_manager import DataManager
 from .backup_manager import BackupManager
+from .check_in_service import CheckInService
 from .styles import *
 from PIL import Image
 import os
 import sys
 
+BACKUP_CHECK_INTERVAL_MS = 60 * 1000  # How often to check whether a scheduled backup is due
+REMOTE_POLL_INTERVAL_MS = 5 * 1000  # How often a thin client pulls other terminals' changes
+REMOTE_POLL_MAX_INTERVAL_MS = 60 * 1000  # Longest wait between polls while the server is unreachable
+SEGMENT_POLL_INTERVAL_MS = 2 * 1000  # How often a node merges other nodes' segments
+CHANGE_DELIVERY_INTERVAL_MS = 250  # How often changes made on worker threads reach the screens
+
 class App(ctk.CTk):
-    def __init__(self, auth_manager):
+    def __init__(self, auth_manager, server_url=None, node_id=None, token=None):
         super().__init__()
         
         self.auth_manager = auth_manager
@@ -17,11 +24,21 @@ class App(ctk.CTk):
         self.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT}")
         self.resizable(True, True)
 
-        # Data Manager
-        self.data_manager = DataManager()
+        # Data Manager (a thin client keeps its data on the server, which also takes the backups)
+        if server_url:
+            from .remote_data_manager import RemoteDataManager
+            self.data_manager = RemoteDataManager(server_url, token=token)
+            self.backup_manager = None
+        else:
+            self.data_manager = DataManager(node_id=node_id)
+            self.backup_manager = BackupManager(node_id=node_id)
+        
+        # Indexed check-in path shared by every Attendance screen
+        self.check_in_service = CheckInService(self.data_manager)
         
-        # Backup Manager
-        self.backup_manager = BackupManager()
+        # Screen currently shown in the content frame
+        self.current_view = None
+        self.data_manager.add_listener(self._on_data_reloaded)
 
         # Layout Configuration
         self.grid_columnconfigure(1, weight=1)
@@ -92,6 +109,16 @@ class App(ctk.CTk):
         
         # Set window icons after window is fully created
         self.after(100, self._set_window_icons)
+        
+        # Periodic background backups, or syncing with the server / other nodes
+        if self.backup_manager:
+            self.after(BACKUP_CHECK_INTERVAL_MS, self._scheduled_backup)
+        else:
+            self._poll_interval_ms = REMOTE_POLL_INTERVAL_MS
+            self.after(REMOTE_POLL_INTERVAL_MS, self._poll_server)
+        if node_id:
+            self.after(SEGMENT_POLL_INTERVAL_MS, self._poll_segments)
+        self.after(CHANGE_DELIVERY_INTERVAL_MS, self._deliver_changes)
 
     def get_resource_path(self, relative_path):
         """Get absolute path to resource, works for dev and PyInstaller."""
@@ -147,37 +174,43 @@ class App(ctk.CTk):
     def show_dashboard(self):
         self.clear_content_frame()
         from .ui.dashboard import Dashboard
-        Dashboard(self.content_frame, self.data_manager)
+        self.current_view = Dashboard(self.content_frame, self.data_manager)
 
     def show_members(self):
         self.clear_content_frame()
         from .ui.members import Members
-        Members(self.content_frame, self.data_manager)
+        self.current_view = Members(self.content_frame, self.data_manager)
 
     def show_trainers(self):
         self.clear_content_frame()
         from .ui.trainers import Trainers
-        Trainers(self.content_frame, self.data_manager)
+        self.current_view = Trainers(self.content_frame, self.data_manager)
 
     def show_payments(self):
         self.clear_content_frame()
         from .ui.payments import Payments
-        Payments(self.content_frame, self.data_manager)
+        self.current_view = Payments(self.content_frame, self.data_manager)
 
     def show_attendance(self):
         self.clear_content_frame()
         from .ui.attendance import Attendance
-        Attendance(self.content_frame, self.data_manager)
+        self.current_view = Attendance(self.content_frame, self.data_manager, self.check_in_service)
 
     def show_visitors(self):
         self.clear_content_frame()
         from .ui.visitors import Visitors
-        Visitors(self.content_frame, self.data_manager)
+        self.current_view = Visitors(self.content_frame, self.data_manager)
     
     def show_settings(self):
         self.clear_content_frame()
         from .ui.settings import Settings
-        Settings(self.content_frame, self.data_manager, self.backup_manager, self.auth_manager)
+        self.current_view = Settings(self.content_frame, self.data_manager, self.backup_manager, self.auth_manager)
+    
+    def _on_data_reloaded(self, changes):
+        """Lets the open screen update itself after data is reloaded from disk."""
+        on_data_changed = getattr(self.current_view, "on_data_changed", None)
+        if on_data_changed:
+            on_data_changed(changes)
     
     def logout(self):
         """Logs out the current user and closes the app."""
@@ -186,11 +219,59 @@ class App(ctk.CTk):
             self.auth_manager.logout()
             self.on_close()
     
-    def on_close(self):
-        # Create auto-backup before closing
-        success, backup_name, message = self.backup_manager.create_backup()
+    def _scheduled_backup(self):
+        """Queues a background backup when one is due, then re-arms the timer."""
+        if self.backup_manager.is_backup_due():
+            self.backup_manager.create_backup_async(
+                self.data_manager.serialize_snapshot,
+                callback=self._log_backup_result,
+                log_seq=self.data_manager.snapshot_seq
+            )
+        self.after(BACKUP_CHECK_INTERVAL_MS, self._scheduled_backup)
+    
+    def _poll_server(self):
+        """Pulls changes made on other terminals on the sync worker.
+        
+        _deliver_changes hands them to the open screen. While the server is
+        unreachable, the poll backs off up to REMOTE_POLL_MAX_INTERVAL_MS.
+        """
+        self.data_manager.sync_in_background()
+        if self.data_manager.online:
+            self._poll_interval_ms = REMOTE_POLL_INTERVAL_MS
+        else:
+            self._poll_interval_ms = min(self._poll_interval_ms * 2, REMOTE_POLL_MAX_INTERVAL_MS)
+        self.after(self._poll_interval_ms, self._poll_server)
+    
+    def _poll_segments(self):
+        """Merges changes saved on other nodes; the open screen is notified through the listener."""
+        self.data_manager.poll_segments()
+        self.after(SEGMENT_POLL_INTERVAL_MS, self._poll_segments)
+    
+    def _deliver_changes(self):
+        """Passes changes merged on worker threads (e.g. by a background checkpoint) to the listeners."""
+        self.data_manager.deliver_changes()
+        self.after(CHANGE_DELIVERY_INTERVAL_MS, self._deliver_changes)
+    
+    @staticmethod
+    def _log_backup_result(result):
+        success, backup_name, message = result
         if success:
             print(f"Auto-backup created: {backup_name}")
+        else:
+            print(message)
+    
+    def on_close(self):
+        # Hide the window immediately; the rest happens out of sight
+        self.withdraw()
         
+        # Flush data first so the backup includes every change
         self.data_manager.save_all_data()
+        
+        # Auto-backup runs on the backup worker, which finishes before the process exits
+        if self.backup_manager:
+            self.backup_manager.create_backup_async(
+                self.data_manager.serialize_snapshot,
+                callback=self._log_backup_result,
+                log_seq=self.data_manager.snapshot_seq
+            )
         self.destroy()
@@ -1,66 +1,616 @@
 import os
 import json
 import shutil
-from datetime import datetime
+import hashlib
+import zlib
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import zipfile
+from datetime import datetime, timedelta
+from .change_log import ChangeLog, format_timestamp, index_records, apply_entries
+
+# Files larger than this are split into content-defined chunks so that an
+# edit in the middle of a big log only stores the chunks around the edit.
+CHUNK_THRESHOLD = 256 * 1024
+MIN_CHUNK_SIZE = 4 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+CHUNK_MASK = 0x7FF          # ~1 boundary every 2048 lines (~60 KB of indented JSON)
+CHUNK_WINDOW_LINES = 8      # Lines hashed together when looking for a boundary
+
+# Archive backups stream every file through this buffer size
+STREAM_CHUNK_SIZE = 1024 * 1024
+ARCHIVE_COMPRESSION = {
+    "deflate": zipfile.ZIP_DEFLATED,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+VALIDATION_WORKERS = 4
+
+# Grandfather-father-son retention: the newest backup of each period is kept
+# for this many periods. "last" keeps the most recent backups regardless.
+DEFAULT_RETENTION = {
+    "last": 7,
+    "hourly": 24,
+    "daily": 7,
+    "weekly": 4,
+    "monthly": 12,
+}
+RETENTION_PERIODS = {
+    "last": None,  # Every backup counts on its own, even two within a second
+    "hourly": lambda created: (created.date(), created.hour),
+    "daily": lambda created: created.date(),
+    "weekly": lambda created: created.isocalendar()[:2],
+    "monthly": lambda created: (created.year, created.month),
+    "yearly": lambda created: created.year,
+}
+
+
+def count_records(data):
+    """Returns the number of records in a parsed collection."""
+    return len(data) if isinstance(data, (list, dict)) else 1
+
+
+def split_chunks(data):
+    """Splits file contents into content-defined chunks on line boundaries.
+
+    A line ends a chunk when the hash of the last few lines matches the
+    boundary mask, so boundaries depend only on nearby content and stay put
+    when records are inserted or edited elsewhere in the file.
+
+    Args:
+        data: File contents as bytes
+
+    Returns:
+        list: Chunks (bytes) that concatenate back to ``data``
+    """
+    if len(data) < CHUNK_THRESHOLD:
+        return [data]
+
+    chunks = []
+    window = deque(maxlen=CHUNK_WINDOW_LINES)
+    chunk_start = 0
+    pos = 0
+    size = len(data)
+
+    while pos < size:
+        line_end = data.find(b"\n", pos)
+        line_end = size if line_end == -1 else line_end + 1
+        window.append(pos)
+
+        chunk_size = line_end - chunk_start
+        if chunk_size >= MAX_CHUNK_SIZE or (
+                chunk_size >= MIN_CHUNK_SIZE and
+                zlib.crc32(data[window[0]:line_end]) & CHUNK_MASK == 0):
+            chunks.append(data[chunk_start:line_end])
+            chunk_start = line_end
+        pos = line_end
+
+    if chunk_start < size:
+        chunks.append(data[chunk_start:])
+    return chunks
+
+
+def select_backups_to_keep(manifests, retention):
+    """Applies a grandfather-father-son retention policy.
+
+    Args:
+        manifests: Iterable of backup manifests (only name and created are read)
+        retention: Dict of tier -> number of periods to keep (see RETENTION_PERIODS)
+
+    Returns:
+        set: Names of the backups to keep
+    """
+    newest_first = sorted(manifests, key=lambda m: (m['created'], m['name']), reverse=True)
+    keep = set()
+    for tier, count in retention.items():
+        period_of = RETENTION_PERIODS[tier]
+        periods = set()
+        for manifest in newest_first:
+            if len(periods) >= count:
+                break
+            if period_of is None:
+                period = manifest['name']
+            else:
+                period = period_of(datetime.fromisoformat(manifest['created']))
+            if period not in periods:
+                periods.add(period)
+                keep.add(manifest['name'])
+    return keep
+
 
 class BackupManager:
-    """Handles data backups and restoration."""
-    
-    def __init__(self, data_dir="data"):
+    """Handles data backups and restoration.
+
+    Backups are stored content-addressed: every file (or chunk of a large
+    file) is written once to ``backups/objects`` under its SHA-256, and each
+    backup is a small manifest in ``backups/manifests`` listing the chunks of
+    every file. Unchanged data is shared between backups and objects are
+    garbage collected once no manifest references them.
+
+    In "archive" mode each backup is instead a single compressed zip in
+    ``backups/archives`` (plus its manifest), written and restored by
+    streaming so no file is ever held in memory twice.
+
+    Every manifest records each file's SHA-256, size and record count, so
+    listing only reads manifests and validation is a checksum comparison.
+
+    Each manifest also records the change log sequence number its data
+    reflects, which lets restore_to_point_in_time replay later changes on
+    top of the nearest backup.
+
+    Old backups are pruned with a tiered retention policy (see
+    DEFAULT_RETENTION) and an optional disk budget, on the backup worker.
+
+    Plain backup folders created by older versions are still listed,
+    validated, restored and deleted; they get a manifest the first time
+    they are listed.
+    """
+
+    def __init__(self, data_dir="data", node_id=None):
         self.data_dir = data_dir
         self.backup_dir = os.path.join(data_dir, "backups")
-        self.max_backups = 7  # Keep last 7 backups
-        
+        self.objects_dir = os.path.join(self.backup_dir, "objects")
+        self.manifests_dir = os.path.join(self.backup_dir, "manifests")
+        self.archives_dir = os.path.join(self.backup_dir, "archives")
+        self.retention = dict(DEFAULT_RETENTION)
+        self.max_disk_mb = 1024  # Oldest backups are pruned beyond this (None for no limit)
+        self.backup_mode = "incremental"  # or "archive"
+        self.archive_compression = "deflate"  # or "lzma"
+
+        # Change log written by DataManager, replayed for point-in-time restores
+        # (in node mode, that node's own log; see DataManager)
+        if node_id:
+            self.change_log = ChangeLog(os.path.join(data_dir, "changelog", node_id, "changes.jsonl"))
+        else:
+            self.change_log = ChangeLog(os.path.join(data_dir, "changelog", "changes.jsonl"))
+
+        # Scheduled backups: every interval while the gym is open
+        self.schedule_interval_minutes = 60
+        self.opening_hours = (6, 23)  # 6 AM to 11 PM
+        self.last_backup_time = None
+
+        # Backups run one at a time on a worker thread. Executor threads are
+        # joined at interpreter exit, so a backup queued while closing the app
+        # still completes after the window is gone.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+        self._progress_lock = threading.Lock()
+        self._progress = {"state": "idle", "done": 0, "total": 0, "message": ""}
+
+        # Objects stored by backups whose manifest is not written yet, which
+        # collect_garbage must not remove (deletes run on the UI thread)
+        self._store_lock = threading.Lock()
+        self._pending_objects = Counter()  # digest -> in-flight backups using it
+        self._in_flight = []               # Start times of in-flight backups
+
         self.ensure_backup_dir()
-    
+
     def ensure_backup_dir(self):
-        """Ensures the backup directory exists."""
-        if not os.path.exists(self.backup_dir):
-            os.makedirs(self.backup_dir)
-    
-    def create_backup(self):
+        """Ensures the backup directory and object store exist."""
+        for path in (self.backup_dir, self.objects_dir, self.manifests_dir, self.archives_dir):
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+    # ==================== Object Store ====================
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _manifest_path(self, backup_name):
+        return os.path.join(self.manifests_dir, f"{backup_name}.json")
+
+    def _archive_path(self, backup_name):
+        return os.path.join(self.archives_dir, f"{backup_name}.zip")
+
+    def _store_object(self, data, pending=None):
+        """Stores a blob unless an identical one already exists.
+
+        Args:
+            data: Blob contents
+            pending: List of digests stored by an in-flight backup. The
+                digest is added to it and kept from collect_garbage until
+                _release_objects(pending).
+
+        Returns:
+            tuple: (digest: str, bytes_written: int)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if pending is not None:
+            # Claimed before checking for it, so a collection can't remove it in between
+            with self._store_lock:
+                self._pending_objects[digest] += 1
+            pending.append(digest)
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return digest, len(data)
+
+    def _read_object(self, digest, verify=True):
+        """Reads a blob, optionally verifying it against its digest."""
+        with open(self._object_path(digest), 'rb') as f:
+            data = f.read()
+        if verify and hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Corrupted backup object: {digest}")
+        return data
+
+    def _load_manifest(self, backup_name):
+        with open(self._manifest_path(backup_name), 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        manifest_path = self._manifest_path(manifest['name'])
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(temp_path, manifest_path)
+
+    def _iter_backup_file(self, manifest, filename):
+        """Yields the contents of a backed-up file in blocks.
+
+        Chunk digests are only checked individually for manifests that
+        predate whole-file checksums; otherwise the caller verifies the file.
+        """
+        kind = manifest.get('kind', "incremental")
+        info = manifest['files'][filename]
+
+        if kind == "archive":
+            with zipfile.ZipFile(self._archive_path(manifest['name'])) as zf:
+                with zf.open(filename) as f:
+                    for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                        yield block
+        elif kind == "folder":
+            with open(os.path.join(self.backup_dir, manifest['name'], filename), 'rb') as f:
+                for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                    yield block
+        else:
+            verify_chunks = 'sha256' not in info
+            for digest in info['chunks']:
+                yield self._read_object(digest, verify=verify_chunks)
+
+    def _is_legacy_backup(self, backup_name):
+        path = os.path.join(self.backup_dir, backup_name)
+        return backup_name not in ("objects", "manifests", "archives") and os.path.isdir(path)
+
+    def _index_legacy_backup(self, backup_name):
+        """Writes a manifest for a plain backup folder so it is only scanned once."""
+        backup_path = os.path.join(self.backup_dir, backup_name)
+        try:
+            created = datetime.strptime(backup_name.replace("backup_", ""), "%Y-%m-%d_%H-%M-%S")
+        except ValueError:
+            created = datetime.fromtimestamp(os.path.getmtime(backup_path))
+
+        manifest = {
+            "name": backup_name,
+            "kind": "folder",
+            "created": created.isoformat(timespec="seconds"),
+            "files": {},
+            "stored_bytes": 0
+        }
+        for filename in sorted(os.listdir(backup_path)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(backup_path, filename), 'rb') as f:
+                data = f.read()
+            info = {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+            try:
+                info["records"] = count_records(json.loads(data))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                info["records"] = None
+            manifest['files'][filename] = info
+            manifest['stored_bytes'] += len(data)
+
+        self._write_manifest(manifest)
+        return manifest
+
+    def _reference_counts(self):
+        """Counts how many manifests reference each object."""
+        counts = Counter()
+        if not os.path.exists(self.manifests_dir):
+            return counts
+        for entry in os.listdir(self.manifests_dir):
+            if not entry.endswith('.json'):
+                continue
+            try:
+                manifest = self._load_manifest(entry[:-5])
+            except (json.JSONDecodeError, OSError):
+                continue
+            for file_info in manifest['files'].values():
+                counts.update(file_info.get('chunks', ()))
+        return counts
+
+    def _release_objects(self, pending):
+        """Lets collect_garbage see objects an in-flight backup stored (see _store_object)."""
+        with self._store_lock:
+            for digest in pending:
+                self._pending_objects[digest] -= 1
+                if self._pending_objects[digest] <= 0:
+                    del self._pending_objects[digest]
+
+    def collect_garbage(self):
+        """Deletes objects that are no longer referenced by any backup.
+
+        Objects an in-flight backup stored but has not listed in its
+        manifest yet are kept, as are partly written (.tmp) objects and,
+        in case they belong to a backup another process is taking, objects
+        written since the oldest in-flight backup began.
+
+        Returns:
+            int: Number of objects removed
+        """
+        removed = 0
+        with self._store_lock:
+            counts = self._reference_counts()
+            cutoff = min(self._in_flight, default=None)
+            pending_prefixes = {digest[:2] for digest in self._pending_objects}
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for digest in os.listdir(prefix_dir):
+                    if counts[digest] or digest in self._pending_objects or digest.endswith(".tmp"):
+                        continue
+                    path = os.path.join(prefix_dir, digest)
+                    if cutoff is not None and os.path.getmtime(path) >= cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                if not os.listdir(prefix_dir) and prefix not in pending_prefixes:
+                    os.rmdir(prefix_dir)
+        return removed
+
+    # ==================== Backup Operations ====================
+
+    def create_backup(self, snapshot=None, mode=None, log_seq=None):
         """Creates a timestamped backup of all JSON files.
-        
+
+        Args:
+            snapshot: Optional dict of filename -> JSON bytes (see
+                DataManager.serialize_snapshot). Files in the snapshot are
+                backed up from memory; any other JSON file is read from disk.
+            mode: "incremental" or "archive" (default: self.backup_mode)
+            log_seq: Change log sequence number the snapshot reflects. When
+                omitted, the oldest file checkpoint is read before any file.
+
         Returns:
             tuple: (success: bool, backup_name: str, message: str)
         """
+        mode = mode or self.backup_mode
+        snapshot = snapshot or {}
+        pending = []  # Objects stored so far, protected from collect_garbage
+        started = datetime.now().timestamp()
+        with self._store_lock:
+            self._in_flight.append(started)
+        if log_seq is None:
+            # Files on disk include at least every entry up to their checkpoint
+            checkpoints = self.change_log.read_checkpoints()
+            log_seq = min(checkpoints.values()) if checkpoints else self.change_log.read_last_seq()
         try:
-            # Generate backup folder name with timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            backup_name = f"backup_{timestamp}"
-            backup_path = os.path.join(self.backup_dir, backup_name)
-            
-            # Create backup folder
-            os.makedirs(backup_path)
-            
-            # Copy all JSON files from data directory
-            files_backed_up = 0
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith('.json'):
-                    source = os.path.join(self.data_dir, filename)
-                    destination = os.path.join(backup_path, filename)
-                    
-                    # Validate JSON before backing up
-                    if self.validate_json_file(source):
-                        shutil.copy2(source, destination)
-                        files_backed_up += 1
-                    else:
-                        print(f"Warning: Skipping invalid JSON file: {filename}")
-            
-            # Clean up old backups
-            self.auto_cleanup_old_backups()
-            
-            return True, backup_name, f"Backup created successfully: {files_backed_up} files backed up"
-        
+            # Generate backup name with timestamp; a second backup within the
+            # same second (e.g. a manual one and the one on close) gets a counter
+            now = datetime.now()
+            prefix = "archive" if mode == "archive" else "backup"
+            base_name = f"{prefix}_{now.strftime('%Y-%m-%d_%H-%M-%S')}"
+            backup_name = base_name
+            counter = 1
+            while os.path.exists(self._manifest_path(backup_name)) or os.path.exists(self._archive_path(backup_name)):
+                counter += 1
+                backup_name = f"{base_name}_{counter}"
+
+            manifest = {
+                "name": backup_name,
+                "kind": mode,
+                "created": now.isoformat(timespec="seconds"),
+                "files": {},
+                "stored_bytes": 0,
+                "log_seq": log_seq
+            }
+
+            filenames = set(snapshot)
+            filenames.update(f for f in os.listdir(self.data_dir) if f.endswith('.json'))
+            filenames = sorted(filenames)
+            self._set_progress("running", 0, len(filenames), f"Backing up to {backup_name}...")
+
+            if mode == "archive":
+                self._write_archive(manifest, filenames, snapshot)
+            else:
+                self._write_incremental(manifest, filenames, snapshot, pending)
+
+            # Manifest is written last so a crash never leaves a partial backup
+            self._write_manifest(manifest)
+            self.last_backup_time = now
+
+            files_backed_up = len(manifest['files'])
+            stored_kb = round(manifest['stored_bytes'] / 1024, 2)
+            if mode == "archive":
+                detail = f"{stored_kb} KB compressed"
+            else:
+                detail = f"{stored_kb} KB of new data"
+            message = f"Backup created successfully: {files_backed_up} files backed up ({detail})"
+            self._set_progress("done", len(filenames), len(filenames), message)
+            return True, backup_name, message
+
         except Exception as e:
+            self._set_progress("failed", 0, 0, f"Backup failed: {str(e)}")
             return False, "", f"Backup failed: {str(e)}"
-    
+        finally:
+            self._release_objects(pending)
+            with self._store_lock:
+                self._in_flight.remove(started)
+
+    def _write_incremental(self, manifest, filenames, snapshot, pending=None):
+        """Stores each file as deduplicated chunks in the object store."""
+        for index, filename in enumerate(filenames):
+            data = snapshot.get(filename)
+            if data is None:
+                with open(os.path.join(self.data_dir, filename), 'rb') as f:
+                    data = f.read()
+
+            # Validate JSON before backing up
+            try:
+                records = count_records(json.loads(data))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                print(f"Warning: Skipping invalid JSON file: {filename}")
+                continue
+
+            chunks = []
+            for chunk in split_chunks(data):
+                digest, written = self._store_object(chunk, pending)
+                chunks.append(digest)
+                manifest['stored_bytes'] += written
+            manifest['files'][filename] = {
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "records": records,
+                "chunks": chunks
+            }
+            self._set_progress("running", index + 1, len(filenames), f"Backed up {filename}")
+
+    def _write_archive(self, manifest, filenames, snapshot):
+        """Streams each file into a single compressed zip archive."""
+        archive_path = self._archive_path(manifest['name'])
+        temp_path = f"{archive_path}.tmp"
+        compression = ARCHIVE_COMPRESSION[self.archive_compression]
+
+        with zipfile.ZipFile(temp_path, 'w', compression=compression) as zf:
+            for index, filename in enumerate(filenames):
+                hasher = hashlib.sha256()
+                data = snapshot.get(filename)
+                if data is not None:
+                    try:
+                        records = count_records(json.loads(data))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        print(f"Warning: Skipping invalid JSON file: {filename}")
+                        continue
+                    hasher.update(data)
+                    view = memoryview(data)
+                    with zf.open(filename, 'w', force_zip64=True) as dest:
+                        for offset in range(0, len(view), STREAM_CHUNK_SIZE):
+                            dest.write(view[offset:offset + STREAM_CHUNK_SIZE])
+                else:
+                    source = os.path.join(self.data_dir, filename)
+                    try:
+                        with open(source, 'r') as f:
+                            records = count_records(json.load(f))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        print(f"Warning: Skipping invalid JSON file: {filename}")
+                        continue
+                    with open(source, 'rb') as src, zf.open(filename, 'w', force_zip64=True) as dest:
+                        for block in iter(lambda: src.read(STREAM_CHUNK_SIZE), b""):
+                            hasher.update(block)
+                            dest.write(block)
+
+                info = zf.getinfo(filename)
+                manifest['files'][filename] = {
+                    "size": info.file_size,
+                    "sha256": hasher.hexdigest(),
+                    "records": records,
+                    "compressed_size": info.compress_size
+                }
+                self._set_progress("running", index + 1, len(filenames), f"Compressed {filename}")
+
+        os.replace(temp_path, archive_path)
+        manifest['archive'] = os.path.basename(archive_path)
+        manifest['compression'] = self.archive_compression
+        manifest['stored_bytes'] = os.path.getsize(archive_path)
+
+    # ==================== Background Backups ====================
+
+    def create_backup_async(self, snapshot=None, callback=None, log_seq=None):
+        """Queues a backup on the background worker.
+
+        Args:
+            snapshot: Optional in-memory snapshot (see create_backup), or a
+                function returning one (e.g. DataManager.serialize_snapshot),
+                called on the worker so serializing never holds up the UI
+            log_seq: Change log sequence number the snapshot reflects
+            callback: Optional function called with the create_backup result.
+                It runs on the worker thread, so UI code should poll
+                get_progress() instead of touching widgets from it.
+
+        Returns:
+            Future: Resolves to the create_backup result tuple
+        """
+        self._set_progress("queued", 0, 0, "Backup queued...")
+
+        def run():
+            data = snapshot
+            if callable(snapshot):
+                try:
+                    data = snapshot()
+                except Exception as e:
+                    self._set_progress("failed", 0, 0, f"Backup failed: {str(e)}")
+                    result = (False, "", f"Backup failed: {str(e)}")
+                    if callback:
+                        callback(result)
+                    return result
+            result = self.create_backup(data, log_seq=log_seq)
+            if result[0]:
+                self.auto_cleanup_old_backups()
+            if callback:
+                callback(result)
+            return result
+
+        return self._executor.submit(run)
+
+    def prune_backups_async(self):
+        """Queues auto_cleanup_old_backups on the background worker.
+
+        Returns:
+            Future: Resolves to the list of deleted backup names
+        """
+        return self._executor.submit(self.auto_cleanup_old_backups)
+
+    def _set_progress(self, state, done, total, message):
+        with self._progress_lock:
+            self._progress = {"state": state, "done": done, "total": total, "message": message}
+
+    def get_progress(self):
+        """Returns the state of the current or last background backup.
+
+        Returns:
+            dict: state (idle/queued/running/done/failed), done, total, message
+        """
+        with self._progress_lock:
+            return dict(self._progress)
+
+    def is_backup_due(self, now=None):
+        """Checks whether a scheduled backup should run now.
+
+        Args:
+            now: Time to check against (default: current time)
+
+        Returns:
+            bool: True during opening hours once the interval has elapsed
+        """
+        if self.get_progress()['state'] in ("queued", "running"):
+            return False
+
+        now = now or datetime.now()
+        open_hour, close_hour = self.opening_hours
+        if not open_hour <= now.hour < close_hour:
+            return False
+
+        if self.last_backup_time is None:
+            backups = self.list_backups()
+            if backups and backups[0]['date'] != "Unknown":
+                self.last_backup_time = datetime.strptime(backups[0]['date'], "%Y-%m-%d %H:%M:%S")
+
+        if self.last_backup_time is None:
+            return True
+        return now - self.last_backup_time >= timedelta(minutes=self.schedule_interval_minutes)
+
     def validate_json_file(self, filepath):
         """Validates that a file contains valid JSON.
-        
+
         Args:
             filepath: Path to JSON file
-            
+
         Returns:
             bool: True if valid JSON, False otherwise
         """
@@ -70,148 +620,373 @@ class BackupManager:
             return True
         except (json.JSONDecodeError, FileNotFoundError):
             return False
-    
+
     def list_backups(self):
         """Lists all available backups with metadata.
-        
+
+        Only manifests are read; plain folder backups from older versions are
+        indexed into a manifest the first time they are seen.
+
         Returns:
-            list: List of dicts with backup info (name, date, size, file_count)
+            list: List of dicts with backup info (name, kind, date, size_kb,
+                stored_kb, file_count). ``size_kb`` is the original data size;
+                ``stored_kb`` is the compressed archive size, or the new data
+                an incremental backup added to the object store.
         """
         backups = []
-        
+
         if not os.path.exists(self.backup_dir):
             return backups
-        
-        for backup_name in os.listdir(self.backup_dir):
-            backup_path = os.path.join(self.backup_dir, backup_name)
-            
-            if os.path.isdir(backup_path):
-                # Get backup metadata
-                file_count = len([f for f in os.listdir(backup_path) if f.endswith('.json')])
-                
-                # Calculate total size
-                total_size = 0
-                for filename in os.listdir(backup_path):
-                    filepath = os.path.join(backup_path, filename)
-                    if os.path.isfile(filepath):
-                        total_size += os.path.getsize(filepath)
-                
-                # Extract date from backup name
-                try:
-                    date_str = backup_name.replace("backup_", "")
-                    backup_date = datetime.strptime(date_str, "%Y-%m-%d_%H-%M-%S")
-                    formatted_date = backup_date.strftime("%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    formatted_date = "Unknown"
-                
-                backups.append({
-                    "name": backup_name,
-                    "date": formatted_date,
-                    "size_kb": round(total_size / 1024, 2),
-                    "file_count": file_count,
-                    "path": backup_path
-                })
-        
+
+        for manifest in self._load_manifests().values():
+            total_size = sum(f['size'] for f in manifest['files'].values())
+            kind = manifest.get('kind', "incremental")
+            if kind == "archive":
+                path = self._archive_path(manifest['name'])
+            elif kind == "folder":
+                path = os.path.join(self.backup_dir, manifest['name'])
+            else:
+                path = self._manifest_path(manifest['name'])
+
+            backups.append({
+                "name": manifest['name'],
+                "kind": kind,
+                "date": manifest['created'].replace("T", " "),
+                "size_kb": round(total_size / 1024, 2),
+                "stored_kb": round(manifest.get('stored_bytes', 0) / 1024, 2),
+                "file_count": len(manifest['files']),
+                "path": path
+            })
+
         # Sort by date (newest first)
-        backups.sort(key=lambda x: x['date'], reverse=True)
+        backups.sort(key=lambda x: (x['date'], x['name']), reverse=True)
         return backups
-    
+
+    def _load_manifests(self):
+        """Loads every backup manifest, keyed by backup name."""
+        manifests = {}
+        for entry in os.listdir(self.manifests_dir):
+            if not entry.endswith('.json'):
+                continue
+            try:
+                manifest = self._load_manifest(entry[:-5])
+            except (json.JSONDecodeError, OSError):
+                continue
+            manifests[manifest['name']] = manifest
+
+        # Folder backups from older versions
+        for backup_name in os.listdir(self.backup_dir):
+            if backup_name not in manifests and self._is_legacy_backup(backup_name):
+                manifests[backup_name] = self._index_legacy_backup(backup_name)
+        return manifests
+
+    def _get_manifest(self, backup_name):
+        """Loads a backup's manifest, indexing old folder backups on demand.
+
+        Returns:
+            dict or None: The manifest, or None if the backup does not exist
+        """
+        if os.path.exists(self._manifest_path(backup_name)):
+            return self._load_manifest(backup_name)
+        if self._is_legacy_backup(backup_name):
+            return self._index_legacy_backup(backup_name)
+        return None
+
     def restore_backup(self, backup_name):
-        """Restores data from a backup folder.
-        
+        """Restores data from a backup.
+
+        Each file is streamed to a temp file next to its destination and
+        checked against the manifest's SHA-256 before any file is replaced.
+
         Args:
             backup_name: Name of the backup to restore
-            
+
         Returns:
             tuple: (success: bool, message: str)
         """
-        backup_path = os.path.join(self.backup_dir, backup_name)
-        
-        if not os.path.exists(backup_path):
-            return False, "Backup not found"
-        
-        if not os.path.isdir(backup_path):
-            return False, "Invalid backup (not a directory)"
-        
+        temp_paths = {}
         try:
-            # Validate all JSON files in backup before restoring
-            for filename in os.listdir(backup_path):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(backup_path, filename)
-                    if not self.validate_json_file(filepath):
-                        return False, f"Backup contains invalid JSON: {filename}"
-            
+            manifest = self._get_manifest(backup_name)
+            if manifest is None:
+                return False, "Backup not found"
+
+            # Extract every file before replacing any
+            for filename in manifest['files']:
+                temp_path = os.path.join(self.data_dir, f"{filename}.restore")
+                temp_paths[filename] = temp_path
+                error = self._extract_file(manifest, filename, temp_path)
+                if error:
+                    return False, error
+
             # Restore files
-            files_restored = 0
-            for filename in os.listdir(backup_path):
-                if filename.endswith('.json'):
-                    source = os.path.join(backup_path, filename)
-                    destination = os.path.join(self.data_dir, filename)
-                    shutil.copy2(source, destination)
-                    files_restored += 1
-            
+            for filename, temp_path in temp_paths.items():
+                os.replace(temp_path, os.path.join(self.data_dir, filename))
+            self._mark_restored(temp_paths)
+            files_restored = len(temp_paths)
+            temp_paths = {}
+
             return True, f"Backup restored successfully: {files_restored} files restored"
-        
+
         except Exception as e:
             return False, f"Restore failed: {str(e)}"
-    
-    def delete_backup(self, backup_name):
-        """Deletes a backup folder.
-        
+        finally:
+            for temp_path in temp_paths.values():
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _extract_file(self, manifest, filename, temp_path):
+        """Streams one backed-up file to temp_path and verifies it.
+
+        Returns:
+            str or None: Error message, or None if the file is intact
+        """
+        expected = manifest['files'][filename].get('sha256')
+        hasher = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as dest:
+                for block in self._iter_backup_file(manifest, filename):
+                    hasher.update(block)
+                    dest.write(block)
+        except FileNotFoundError:
+            return f"Missing backup data for: {filename}"
+        except (ValueError, zipfile.BadZipFile):
+            return f"Backup contains corrupted file: {filename}"
+
+        if expected:
+            if hasher.hexdigest() != expected:
+                return f"Backup contains corrupted file: {filename}"
+        elif not self.validate_json_file(temp_path):
+            # Manifests without checksums fall back to parsing the file
+            return f"Backup contains invalid JSON: {filename}"
+        return None
+
+    def _mark_restored(self, filenames):
+        """Stops journaled changes from being replayed over restored files on startup."""
+        last_seq = self.change_log.read_last_seq()
+        self.change_log.write_checkpoints({filename: last_seq for filename in filenames})
+
+    def restore_to_point_in_time(self, target):
+        """Restores data as it was at a given moment.
+
+        Loads the newest backup taken at or before ``target`` and replays the
+        change log from that backup's sequence number up to ``target``. The
+        log is streamed and every collection is written once at the end.
+
+        Args:
+            target: datetime (or ISO string) to restore to
+
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        if isinstance(target, str):
+            try:
+                target = datetime.fromisoformat(target.strip())
+            except ValueError:
+                return False, "Invalid date/time (use YYYY-MM-DD HH:MM:SS)"
+
+        candidates = [
+            m for m in self._load_manifests().values()
+            if m.get('log_seq') is not None and datetime.fromisoformat(m['created']) <= target
+        ]
+        if not candidates:
+            return False, f"No backup was taken before {target:%Y-%m-%d %H:%M:%S}"
+        base = max(candidates, key=lambda m: m['created'])
+
+        temp_paths = {}
+        try:
+            # Load the base backup into memory, verifying each file
+            collections = {}
+            for filename, info in base['files'].items():
+                data = b"".join(self._iter_backup_file(base, filename))
+                if info.get('sha256') and hashlib.sha256(data).hexdigest() != info['sha256']:
+                    return False, f"Backup contains corrupted file: {filename}"
+                collections[filename] = json.loads(data)
+
+            # Replay changes made after the backup, up to the target time
+            indexed = {f: index_records(f, data) for f, data in collections.items()}
+            entries = self.change_log.iter_entries(after_seq=base['log_seq'], until=format_timestamp(target))
+            replayed = apply_entries(indexed, entries)
+
+            for filename, records in indexed.items():
+                data = records if isinstance(collections[filename], dict) else list(records.values())
+                temp_path = os.path.join(self.data_dir, f"{filename}.restore")
+                temp_paths[filename] = temp_path
+                with open(temp_path, 'w') as f:
+                    json.dump(data, f, indent=4)
+
+            for filename, temp_path in temp_paths.items():
+                os.replace(temp_path, os.path.join(self.data_dir, filename))
+            self._mark_restored(temp_paths)
+            temp_paths = {}
+
+            return True, (f"Restored to {target:%Y-%m-%d %H:%M:%S} from {base['name']} "
+                          f"and {replayed} logged changes")
+
+        except Exception as e:
+            return False, f"Restore failed: {str(e)}"
+        finally:
+            for temp_path in temp_paths.values():
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def delete_backup(self, backup_name, collect=True):
+        """Deletes a backup.
+
         Args:
             backup_name: Name of the backup to delete
-            
+            collect: Remove objects no longer referenced by any backup (default: True)
+
         Returns:
             tuple: (success: bool, message: str)
         """
-        backup_path = os.path.join(self.backup_dir, backup_name)
-        
-        if not os.path.exists(backup_path):
-            return False, "Backup not found"
-        
         try:
-            shutil.rmtree(backup_path)
+            if self._is_legacy_backup(backup_name):
+                shutil.rmtree(os.path.join(self.backup_dir, backup_name))
+                if os.path.exists(self._manifest_path(backup_name)):
+                    os.remove(self._manifest_path(backup_name))
+                return True, "Backup deleted successfully"
+
+            manifest_path = self._manifest_path(backup_name)
+            if not os.path.exists(manifest_path):
+                return False, "Backup not found"
+
+            os.remove(manifest_path)
+            archive_path = self._archive_path(backup_name)
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            if collect:
+                self.collect_garbage()
             return True, "Backup deleted successfully"
         except Exception as e:
             return False, f"Delete failed: {str(e)}"
-    
+
+    def _disk_usage(self, manifests):
+        """Bytes on disk used by a set of backups, computed from their manifests.
+
+        Shared objects are counted once; only referenced objects are stat'ed.
+        """
+        total = 0
+        digests = set()
+        for manifest in manifests:
+            if manifest.get('kind') in ("archive", "folder"):
+                total += manifest.get('stored_bytes', 0)
+            for file_info in manifest['files'].values():
+                digests.update(file_info.get('chunks', ()))
+        for digest in digests:
+            try:
+                total += os.path.getsize(self._object_path(digest))
+            except OSError:
+                pass
+        return total
+
     def auto_cleanup_old_backups(self):
-        """Automatically deletes old backups, keeping only the last N backups."""
-        backups = self.list_backups()
-        
-        if len(backups) > self.max_backups:
-            # Delete oldest backups
-            backups_to_delete = backups[self.max_backups:]
-            for backup in backups_to_delete:
-                self.delete_backup(backup['name'])
-                print(f"Auto-deleted old backup: {backup['name']}")
-    
-    def validate_backup(self, backup_name):
-        """Validates that a backup contains valid JSON files.
-        
+        """Deletes backups outside the retention policy or the disk budget.
+
+        The newest backup of every retention period is kept (see
+        self.retention); if those still exceed self.max_disk_mb, the oldest
+        are dropped until they fit. The newest backup is always kept. Change
+        log entries older than every remaining backup are compacted away.
+
+        Returns:
+            list: Names of the deleted backups
+        """
+        manifests = self._load_manifests()
+        keep = select_backups_to_keep(manifests.values(), self.retention)
+
+        if self.max_disk_mb is not None:
+            kept = sorted((manifests[name] for name in keep), key=lambda m: m['created'])
+            budget = self.max_disk_mb * 1024 * 1024
+            while len(kept) > 1 and self._disk_usage(kept) > budget:
+                keep.discard(kept.pop(0)['name'])
+
+        deleted = []
+        for name in sorted(manifests):
+            if name not in keep:
+                # Sweep unshared objects once at the end
+                success, _ = self.delete_backup(name, collect=False)
+                if success:
+                    deleted.append(name)
+                    print(f"Auto-deleted old backup: {name}")
+
+        if deleted:
+            self.collect_garbage()
+            log_seqs = [manifests[name].get('log_seq') for name in keep]
+            if log_seqs and None not in log_seqs:
+                self.change_log.compact(min(log_seqs))
+        return deleted
+
+    def validate_backup(self, backup_name, deep=False, parallel=True):
+        """Validates a backup against its manifest.
+
+        The default check streams every file through SHA-256 and compares it
+        with the manifest. A deep check also parses each file as JSON and
+        compares its record count.
+
         Args:
             backup_name: Name of the backup to validate
-            
+            deep: Also parse every file (default: False)
+            parallel: Check files on several threads (default: True)
+
         Returns:
             tuple: (valid: bool, message: str)
         """
-        backup_path = os.path.join(self.backup_dir, backup_name)
-        
-        if not os.path.exists(backup_path):
+        try:
+            manifest = self._get_manifest(backup_name)
+        except (json.JSONDecodeError, OSError):
+            return False, "Backup manifest is unreadable"
+        if manifest is None:
             return False, "Backup not found"
-        
-        if not os.path.isdir(backup_path):
-            return False, "Invalid backup (not a directory)"
-        
-        json_files = [f for f in os.listdir(backup_path) if f.endswith('.json')]
-        
-        if not json_files:
+
+        filenames = list(manifest['files'])
+        if not filenames:
             return False, "Backup contains no JSON files"
-        
-        # Validate each JSON file
-        for filename in json_files:
-            filepath = os.path.join(backup_path, filename)
-            if not self.validate_json_file(filepath):
-                return False, f"Invalid JSON file: {filename}"
-        
-        return True, f"Backup is valid ({len(json_files)} files)"
+
+        def check(filename):
+            return self._verify_file(manifest, filename, deep)
+
+        if parallel and len(filenames) > 1:
+            with ThreadPoolExecutor(max_workers=min(VALIDATION_WORKERS, len(filenames))) as pool:
+                errors = list(pool.map(check, filenames))
+        else:
+            errors = [check(filename) for filename in filenames]
+
+        for error in errors:
+            if error:
+                return False, error
+
+        mode = "deep check" if deep else "checksums verified"
+        return True, f"Backup is valid ({len(filenames)} files, {mode})"
+
+    def _verify_file(self, manifest, filename, deep):
+        """Checks one backed-up file.
+
+        Returns:
+            str or None: Error message, or None if the file is intact
+        """
+        info = manifest['files'][filename]
+        expected = info.get('sha256')
+        parse = deep or not expected
+
+        hasher = hashlib.sha256()
+        blocks = []
+        try:
+            for block in self._iter_backup_file(manifest, filename):
+                hasher.update(block)
+                if parse:
+                    blocks.append(block)
+        except FileNotFoundError:
+            return f"Missing backup data for: {filename}"
+        except (ValueError, zipfile.BadZipFile):
+            return f"Corrupted backup data for: {filename}"
+
+        if expected and hasher.hexdigest() != expected:
+            return f"Checksum mismatch: {filename}"
+
+        if parse:
+            try:
+                records = count_records(json.loads(b"".join(blocks)))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return f"Invalid JSON file: {filename}"
+            if info.get('records') is not None and records != info['records']:
+                return f"Record count mismatch: {filename}"
+        return None
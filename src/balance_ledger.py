@@ -0,0 +1,279 @@
+import threading
+import weakref
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+PAYMENTS_FILE = "payments_log.json"
+
+# Aging buckets by days overdue: (name, first day, last day)
+AGING_BUCKETS = (("not_due", None, -1), ("0-30", 0, 30), ("31-60", 31, 60), ("60+", 61, None))
+
+
+def _cents(amount):
+    return int(round((amount or 0) * 100))
+
+
+def _due_day(payment):
+    try:
+        return date.fromisoformat(payment['due_date'][:10]).toordinal()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def outstanding_cents(payment):
+    """What is still owed on a payment, in cents (0 once marked paid)."""
+    if payment.get('status') != 'Unpaid':
+        return 0
+    return max(_cents(payment.get('amount_due')) - _cents(payment.get('amount_paid')), 0)
+
+
+def _queue_entry(payment):
+    """Which queue a payment is in and its sort key, "<date>\t<payment_id>".
+
+    Unpaid payments sort by due date, paid ones by payment date; ties go
+    by payment ID. Keys are plain strings because they sort several
+    times faster than tuples. Returns (None, None) for other statuses.
+    """
+    status = payment.get('status')
+    if status == 'Unpaid':
+        return "unpaid", f"{payment.get('due_date') or ''}\t{payment['payment_id']}"
+    if status == 'Paid':
+        return "paid", f"{payment.get('payment_date') or ''}\t{payment['payment_id']}"
+    return None, None
+
+
+def aging_bucket(days_overdue):
+    for name, first, last in AGING_BUCKETS:
+        if (first is None or days_overdue >= first) and (last is None or days_overdue <= last):
+            return name
+
+
+class BalanceLedger:
+    """Outstanding balances per member and gym-wide, with overdue aging.
+
+    Each payment owes ``amount_due - amount_paid`` while it is Unpaid.
+    Amounts are kept in integer cents, so balances updated one change at
+    a time never drift from a fresh sum. The ledger is built in one pass
+    over the payments log and then kept up to date from change events
+    (see DataManager.subscribe): creating a payment, editing its amount
+    or marking it paid or unpaid adjusts just that payment's member and
+    due day. Totals per due day let the aging buckets be summed without
+    looking at individual payments. When the log changes without events
+    (a reload or a restore), the ledger is rebuilt on the next query.
+
+    The ledger also keeps unpaid payments sorted by due date and paid ones
+    by payment date, so the Payments screen can show "unpaid first, then
+    most recently paid" a page at a time without sorting the log, and the
+    overdue count is a binary search.
+    """
+
+    def __init__(self):
+        self.payments_by_member = {}  # Member ID -> {payment_id: payment}
+        self._member_of = {}          # payment_id -> member ID
+        self._owed = {}               # payment_id -> (member ID, cents, due day ordinal), unpaid only
+        self._balances = {}           # Member ID -> outstanding cents
+        self._due_days = {}           # Due day ordinal -> [outstanding cents, unpaid payments]
+        self._queues = {"unpaid": [], "paid": []}  # Sorted keys; see _queue_entry
+        self.total_cents = 0
+        self.unpaid_count = 0
+        self._version = None
+        self._lock = threading.RLock()
+
+    # ==================== Maintenance ====================
+
+    def rebuild(self, payments_log, version=None):
+        with self._lock:
+            self.payments_by_member = {}
+            self._member_of = {}
+            self._owed = {}
+            self._balances = {}
+            self._due_days = {}
+            self._queues = {"unpaid": [], "paid": []}
+            self.total_cents = 0
+            self.unpaid_count = 0
+            for payment in payments_log:
+                self._add(payment['payment_id'], dict(payment), queue=False)
+            
+            # Sort each queue once instead of inserting one at a time
+            for payments in self.payments_by_member.values():
+                for payment in payments.values():
+                    name, entry = _queue_entry(payment)
+                    if name:
+                        self._queues[name].append(entry)
+            for queue in self._queues.values():
+                queue.sort()
+            self._version = version
+
+    def sync(self, data_source):
+        """Rebuilds the ledger if the payments log changed without events.
+
+        Sources without ``versions`` are rebuilt on every call.
+        """
+        versions = getattr(data_source, 'versions', None)
+        version = versions.get(PAYMENTS_FILE, 0) if versions is not None else None
+        with self._lock:
+            if version is None or version != self._version:
+                self.rebuild(data_source.payments_log, version)
+
+    def on_records_changed(self, events):
+        """Applies payment change events (subscribed by ledger_for).
+
+        Events already reflected by a rebuild are skipped; a gap in the
+        versions marks the ledger for a rebuild.
+        """
+        with self._lock:
+            for event in events:
+                if self._version is None or event.version <= self._version:
+                    continue
+                if event.version != self._version + 1:
+                    self._version = None
+                    return
+                self._version = event.version
+
+                self._remove(event.key)
+                if event.record is not None:
+                    self._add(event.key, event.record)
+
+    def _add(self, payment_id, payment, queue=True):
+        member_id = payment['member_id']
+        self.payments_by_member.setdefault(member_id, {})[payment_id] = payment
+        self._member_of[payment_id] = member_id
+        if queue:
+            name, entry = _queue_entry(payment)
+            if name:
+                insort(self._queues[name], entry)
+        if payment.get('status') != 'Unpaid':
+            return
+        cents = outstanding_cents(payment)
+        due = _due_day(payment)
+        self._owed[payment_id] = (member_id, cents, due)
+        self._balances[member_id] = self._balances.get(member_id, 0) + cents
+        totals = self._due_days.setdefault(due, [0, 0])
+        totals[0] += cents
+        totals[1] += 1
+        self.total_cents += cents
+        self.unpaid_count += 1
+
+    def _remove(self, payment_id):
+        member_id = self._member_of.pop(payment_id, None)
+        if member_id is not None:
+            name, entry = _queue_entry(self.payments_by_member[member_id].pop(payment_id))
+            if name:
+                queue = self._queues[name]
+                index = bisect_left(queue, entry)
+                if index < len(queue) and queue[index] == entry:
+                    del queue[index]
+        owed = self._owed.pop(payment_id, None)
+        if owed is not None:
+            member_id, cents, due = owed
+            self._balances[member_id] -= cents
+            if not self._balances[member_id]:
+                del self._balances[member_id]
+            totals = self._due_days[due]
+            totals[0] -= cents
+            totals[1] -= 1
+            if totals[1] == 0:
+                del self._due_days[due]
+            self.total_cents -= cents
+            self.unpaid_count -= 1
+
+    # ==================== Queries ====================
+
+    def balance(self, member_id):
+        """A member's outstanding balance."""
+        return self._balances.get(member_id, 0) / 100
+
+    def total_outstanding(self):
+        return self.total_cents / 100
+
+    def member_payments(self, member_id):
+        """A member's payments (paid and unpaid) as last saved."""
+        with self._lock:
+            return list(self.payments_by_member.get(member_id, {}).values())
+
+    def overdue_count(self, today=None):
+        """Number of unpaid payments due today or earlier (all but aging's "not_due")."""
+        tomorrow = ((today or date.today()) + timedelta(days=1)).isoformat()
+        with self._lock:
+            return bisect_left(self._queues["unpaid"], tomorrow)
+
+    def queue_length(self, unpaid_only=False):
+        """Number of payments payments_page pages through."""
+        with self._lock:
+            return len(self._queues["unpaid"]) + (0 if unpaid_only else len(self._queues["paid"]))
+
+    def payments_page(self, start, count, unpaid_only=False):
+        """One page of payments: unpaid by due date, then paid, most recent first.
+
+        Both queues are already sorted, so a page is a slice of each.
+
+        Args:
+            start: Position of the first payment in that order
+            count: Payments per page
+            unpaid_only: Leave out paid payments
+
+        Returns:
+            list: Payments as last saved
+        """
+        with self._lock:
+            unpaid = self._queues["unpaid"]
+            entries = unpaid[start:start + count]
+            if not unpaid_only and len(entries) < count:
+                paid = self._queues["paid"]
+                # Positions counted from the newest end of the paid queue
+                first = max(start - len(unpaid), 0)
+                last = first + count - len(entries)
+                entries += paid[max(len(paid) - last, 0):max(len(paid) - first, 0)][::-1]
+            payment_ids = [entry.partition("\t")[2] for entry in entries]
+            return [self.payments_by_member[self._member_of[payment_id]][payment_id] for payment_id in payment_ids]
+
+    def aging(self, today=None):
+        """Outstanding amounts and unpaid payment counts per aging bucket.
+
+        Buckets are by days past the due date: "not_due" (due in the
+        future), "0-30", "31-60" and "60+". Payments without a valid due
+        date count as "0-30".
+
+        Returns:
+            dict: Bucket name -> {"amount": ..., "count": ...}
+        """
+        today = (today or date.today()).toordinal()
+        cents = {name: [0, 0] for name, _, _ in AGING_BUCKETS}
+        with self._lock:
+            for due, (amount, count) in self._due_days.items():
+                totals = cents[aging_bucket(today - due if due is not None else 0)]
+                totals[0] += amount
+                totals[1] += count
+        return {name: {"amount": amount / 100, "count": count} for name, (amount, count) in cents.items()}
+
+    def member_aging(self, member_id, today=None):
+        """A member's outstanding amount per aging bucket (see aging)."""
+        today = (today or date.today()).toordinal()
+        cents = {name: 0 for name, _, _ in AGING_BUCKETS}
+        with self._lock:
+            for payment_id in self.payments_by_member.get(member_id, {}):
+                owed = self._owed.get(payment_id)
+                if owed is not None:
+                    _, amount, due = owed
+                    cents[aging_bucket(today - due if due is not None else 0)] += amount
+        return {name: amount / 100 for name, amount in cents.items()}
+
+
+_ledgers = weakref.WeakKeyDictionary()
+_ledgers_guard = threading.Lock()
+
+
+def ledger_for(data_source):
+    """Returns an up-to-date BalanceLedger for a data manager (or snapshot).
+
+    A ledger for a data manager is built once and then maintained from its
+    change events; a snapshot's is built once, since it never changes.
+    """
+    with _ledgers_guard:
+        ledger = _ledgers.get(data_source)
+        if ledger is None:
+            ledger = _ledgers[data_source] = BalanceLedger()
+            if hasattr(data_source, 'subscribe'):
+                data_source.subscribe(ledger.on_records_changed, {PAYMENTS_FILE})
+    ledger.sync(data_source)
+    return ledger
@@ -0,0 +1,1013 @@
+import argparse
+import asyncio
+import datetime
+import http.client
+import json
+import os
+import random
+import secrets
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .activity_bitmaps import ActivityBitmaps
+from .analytics import Analytics
+from .balance_ledger import BalanceLedger
+from .backup_manager import BackupManager
+from .change_log import index_records
+from .check_in_service import CheckInService
+from .change_events import ChangeEvent
+from .churn_risk import ATTENDANCE_FILE, PAYMENTS_FILE, RISK_FILES, ChurnRiskIndex
+from .data_manager import DataManager
+from .data_snapshot import DataSnapshot
+from .generate_mock_data import MockDataGenerator
+from .numpy_engine import numpy_available
+from .remote_data_manager import RemoteDataManager
+from .result_cache import ResultCache, cache_for
+from .server import GymServer
+from .session_stats import SessionDurationIndex
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _prepare_data_dir(work_dir, source_dir, members):
+    """Copies the source data (or generates mock data) into a scratch directory."""
+    data_dir = os.path.join(work_dir, "data")
+    if members:
+        generator = MockDataGenerator(data_dir)
+        generator.generate_plans()
+        generator.generate_trainers()
+        generator.generate_members_and_history(members)
+    else:
+        os.makedirs(data_dir)
+        for filename in os.listdir(source_dir):
+            if filename.endswith('.json'):
+                shutil.copy2(os.path.join(source_dir, filename), data_dir)
+    return data_dir
+
+
+def _folder_copy_backup(data_dir, backup_path):
+    """The original backup strategy: copy every JSON file into a folder."""
+    os.makedirs(backup_path)
+    for filename in os.listdir(data_dir):
+        if filename.endswith('.json'):
+            shutil.copy2(os.path.join(data_dir, filename), os.path.join(backup_path, filename))
+
+
+def bench_backups(source_dir="data", members=0, rounds=3):
+    """Compares time and bytes of folder copies, incremental and archive backups.
+
+    Args:
+        source_dir: Data directory to benchmark against (copied, never modified)
+        members: Generate mock data with this many members instead (default: 0)
+        rounds: Backups taken per strategy; later rounds show the idle-day cost
+    """
+    work_dir = tempfile.mkdtemp(prefix="gym_bench_")
+    try:
+        data_dir = _prepare_data_dir(work_dir, source_dir, members)
+        data_size = sum(os.path.getsize(os.path.join(data_dir, f))
+                        for f in os.listdir(data_dir) if f.endswith('.json'))
+        print(f"\nData: {data_size / 1024:.1f} KB across JSON files, {rounds} backups per strategy\n")
+        print(f"{'Strategy':<24}{'First (s)':>12}{'Repeat (s)':>12}{'Restore (s)':>13}{'Disk (KB)':>12}")
+
+        # Original folder copy
+        folder_dir = os.path.join(work_dir, "folders")
+        times = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            _folder_copy_backup(data_dir, os.path.join(folder_dir, f"backup_{i}"))
+            times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for filename in os.listdir(os.path.join(folder_dir, "backup_0")):
+            shutil.copy2(os.path.join(folder_dir, "backup_0", filename), os.path.join(data_dir, filename))
+        restore_time = time.perf_counter() - start
+        _print_row("folder copy", times, restore_time, _dir_size(folder_dir))
+
+        for mode, compression in (("incremental", None), ("archive", "deflate"), ("archive", "lzma")):
+            backup_manager = BackupManager(data_dir)
+            backup_manager.backup_mode = mode
+            if compression:
+                backup_manager.archive_compression = compression
+
+            times = []
+            names = []
+            for _ in range(rounds):
+                # Backup names have one-second resolution
+                time.sleep(max(0.0, 1.0 - (time.time() % 1.0)))
+                start = time.perf_counter()
+                success, name, message = backup_manager.create_backup()
+                times.append(time.perf_counter() - start)
+                if not success:
+                    raise RuntimeError(message)
+                names.append(name)
+
+            start = time.perf_counter()
+            success, message = backup_manager.restore_backup(names[0])
+            restore_time = time.perf_counter() - start
+            if not success:
+                raise RuntimeError(message)
+
+            label = mode if not compression else f"{mode} ({compression})"
+            _print_row(label, times, restore_time, _dir_size(backup_manager.backup_dir))
+            shutil.rmtree(backup_manager.backup_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_backup_restore(source_dir="data"):
+    """Checks that a backup includes edits so far only in the change log.
+
+    Records changed through update_record are journaled, not written to
+    their files, until the next checkpoint. A backup taken then must still
+    hold them, and restoring it must bring them back.
+
+    Args:
+        source_dir: Data directory to start from (copied, never modified)
+    """
+    work_dir = tempfile.mkdtemp(prefix="gym_restore_")
+    try:
+        data_dir = _prepare_data_dir(work_dir, source_dir, 0)
+        data_manager = DataManager(data_dir)
+        backup_manager = BackupManager(data_dir)
+        member_id = next(iter(data_manager.members_db))
+        payment = next(p for p in data_manager.payments_log if p['status'] == 'Unpaid')
+
+        data_manager.update_record("members.json", member_id, {"first_name": "EDITED"})
+        data_manager.update_record("payments_log.json", payment['payment_id'],
+                                   {"status": "Paid", "amount_paid": payment['amount_due']})
+        success, name, message = backup_manager.create_backup_async(
+            data_manager.serialize_snapshot, log_seq=data_manager.snapshot_seq
+        ).result()
+        if not success:
+            raise RuntimeError(message)
+
+        # Made after the backup, so the restore should undo it
+        data_manager.update_record("members.json", member_id, {"first_name": "LATER"})
+        data_manager.save_all_data()
+        success, message = backup_manager.restore_backup(name)
+        if not success:
+            raise RuntimeError(message)
+
+        restored = DataManager(data_dir)
+        restored_payment = restored.find_record("payments_log.json", payment['payment_id'])
+        print(f"Backup {name}: member name after restore {restored.members_db[member_id]['first_name']!r} "
+              f"(expected 'EDITED'), payment status {restored_payment['status']!r} (expected 'Paid')")
+        ok = restored.members_db[member_id]['first_name'] == "EDITED" and restored_payment['status'] == "Paid"
+        print("Journaled edits survive backup and restore:", ok)
+        return ok
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _print_row(label, times, restore_time, disk_bytes):
+    repeat = sum(times[1:]) / len(times[1:]) if len(times) > 1 else times[0]
+    print(f"{label:<24}{times[0]:>12.4f}{repeat:>12.4f}{restore_time:>13.4f}{disk_bytes / 1024:>12.1f}")
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+_SERVER_TOKEN = secrets.token_urlsafe(16)
+_AUTH_HEADERS = {"Authorization": f"Bearer {_SERVER_TOKEN}"}
+
+
+def _start_server(data_dir):
+    """Runs a GymServer on a free local port in a background thread.
+
+    Returns:
+        tuple: (port, stop function)
+    """
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    def on_ready(port):
+        state['port'] = port
+        ready.set()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        gym_server = GymServer(DataManager(data_dir), token=_SERVER_TOKEN)
+        state['task'] = loop.create_task(gym_server.serve("127.0.0.1", 0, ready=on_ready))
+        try:
+            loop.run_until_complete(state['task'])
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(state['task'].cancel)
+        thread.join()
+
+    return state['port'], stop
+
+
+class _Client:
+    """Keep-alive JSON client used by the load test, one per worker thread."""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def post(self, path, payload):
+        start = time.perf_counter()
+        self.connection.request("POST", path, body=json.dumps(payload),
+                                headers={"Content-Type": "application/json", **_AUTH_HEADERS})
+        response = self.connection.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - start
+
+
+def load_test_server(source_dir="data", members=0, clients=8, check_ins=400):
+    """Drives a local server with concurrent check-ins and check-outs.
+
+    Every client checks distinct members in and out, then all clients race
+    to check in the same member. Afterwards the data on disk is reloaded to
+    confirm no check-in was lost and the race produced exactly one session.
+
+    Args:
+        source_dir: Data directory to test against (copied, never modified)
+        members: Generate mock data with this many members instead (default: 0)
+        clients: Concurrent client connections
+        check_ins: Total check-ins (each followed by a check-out)
+    """
+    work_dir = tempfile.mkdtemp(prefix="gym_load_")
+    try:
+        data_dir = _prepare_data_dir(work_dir, source_dir, members)
+        baseline = DataManager(data_dir)
+        open_members = {log['member_id'] for log in baseline.attendance_log if log.get('check_out_time') is None}
+        member_ids = [mid for mid in baseline.members_db if mid not in open_members]
+        logs_before = len(baseline.attendance_log)
+        if not member_ids:
+            raise RuntimeError("No members available to check in")
+
+        port, stop = _start_server(data_dir)
+        local = threading.local()
+
+        def client():
+            if not hasattr(local, "client"):
+                local.client = _Client(port)
+            return local.client
+
+        def visit(i):
+            # Members are reused once every one has visited; a check-out always
+            # follows, so the next check-in of the same member is legal.
+            member_id = member_ids[i % len(member_ids)]
+            check_in = client().post("/api/checkins", {"member_id": member_id})
+            check_out = client().post("/api/checkouts", {"member_id": member_id})
+            return check_in, check_out
+
+        # Partition the visits by member so no two clients handle the same member at once
+        per_client = [[i for i in range(check_ins) if (i % len(member_ids)) % clients == c]
+                      for c in range(clients)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(lambda ids: [visit(i) for i in ids], per_client))
+        elapsed = time.perf_counter() - start
+        results = [r for batch in results for r in batch]
+
+        latencies = sorted(t for pair in results for _, t in pair)
+        failures = sum(1 for pair in results for status, _ in pair if status >= 300)
+
+        # Everyone races to check in the same member
+        racer = member_ids[0]
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            race = list(pool.map(lambda _: client().post("/api/checkins", {"member_id": racer})[0], range(clients * 4)))
+        stop()
+
+        reloaded = DataManager(data_dir)
+        new_logs = len(reloaded.attendance_log) - logs_before
+        racer_open = sum(1 for log in reloaded.attendance_log
+                         if log['member_id'] == racer and log.get('check_out_time') is None)
+
+        requests = len(latencies)
+        print(f"\n{clients} clients, {check_ins} check-ins + check-outs against {len(baseline.members_db)} members")
+        print(f"Throughput: {requests / elapsed:.0f} requests/s ({elapsed:.2f} s)")
+        print(f"Latency p50: {_percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p99: {_percentile(latencies, 99) * 1000:.1f} ms")
+        print(f"Failed requests: {failures}")
+        print(f"Race for one member: {race.count(201)} accepted, {race.count(409)} rejected as duplicates")
+        lost = check_ins + race.count(201) - new_logs
+        print(f"Sessions on disk: {new_logs} (lost updates: {lost}), open sessions for racer: {racer_open}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _legacy_check_in(data_manager, query):
+    """The original Attendance.check_in: name scan, open-session scan, full rewrite."""
+    member_id = query if query in data_manager.members_db else None
+    if member_id is None:
+        for mid, m in data_manager.members_db.items():
+            if query.lower() in f"{m['first_name']} {m['last_name']}".lower():
+                member_id = mid
+                break
+    for log in data_manager.attendance_log:
+        if log['member_id'] == member_id and log.get('check_out_time') is None:
+            return
+    data_manager.attendance_log.append({
+        "log_id": f"L{len(data_manager.attendance_log)}",
+        "member_id": member_id,
+        "check_in_time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "check_out_time": None,
+        "duration_minutes": None
+    })
+    data_manager.save_data("attendance_log.json")
+
+
+def bench_check_ins(source_dir="data", members=50000, per_minute=1000, seconds=60, clients=8):
+    """Simulates a kiosk burst against the server's check-in path.
+
+    Check-ins arrive at a fixed rate (open loop, like members walking in)
+    from several kiosks, alternating member ID and phone scans. Latency is
+    measured by the clients (request to durable response) and by the
+    server's own counters.
+
+    Args:
+        source_dir: Data directory to test against when members is 0
+        members: Generate a roster of this many members (default: 50,000)
+        per_minute: Arrival rate of check-ins
+        seconds: How long to keep the rate up
+        clients: Number of kiosks sending scans
+    """
+    work_dir = tempfile.mkdtemp(prefix="gym_checkins_")
+    try:
+        print(f"Preparing data ({members or 'copied'} members)...")
+        data_dir = _prepare_data_dir(work_dir, source_dir, members)
+        baseline = DataManager(data_dir)
+        open_members = {log['member_id'] for log in baseline.attendance_log if log.get('check_out_time') is None}
+        roster = [m for mid, m in baseline.members_db.items() if mid not in open_members]
+        total = min(len(roster) - 5, int(per_minute * seconds / 60))
+        scans = [m['member_id'] if i % 2 == 0 else m['contact'] for i, m in enumerate(roster[:total])]
+        logs_before = len(baseline.attendance_log)
+
+        # The original path, for comparison (a few scans are enough)
+        legacy_times = []
+        for member in roster[-5:]:
+            start = time.perf_counter()
+            _legacy_check_in(baseline, member['member_id'])
+            legacy_times.append(time.perf_counter() - start)
+        del baseline
+
+        port, stop = _start_server(data_dir)
+        interval = 60.0 / per_minute
+        local = threading.local()
+
+        def scan(i):
+            if not hasattr(local, "client"):
+                local.client = _Client(port)
+            time.sleep(max(0.0, start + i * interval - time.perf_counter()))
+            return local.client.post("/api/kiosk", {"scan": scans[i]})
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(scan, range(total)))
+        elapsed = time.perf_counter() - start
+
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("GET", "/api/checkins/stats", headers=_AUTH_HEADERS)
+        server_stats = json.loads(connection.getresponse().read())
+        connection.close()
+        stop()
+
+        latencies = sorted(t for _, t in results)
+        reloaded = DataManager(data_dir)
+        print(f"\n{total} check-ins at {per_minute}/min over {elapsed:.1f} s, "
+              f"{len(reloaded.members_db)} members, {clients} kiosks")
+        print(f"Original path (scan + rewrite): {sum(legacy_times) / len(legacy_times) * 1000:.1f} ms per check-in")
+        print(f"Client latency p50: {_percentile(latencies, 50) * 1000:.2f} ms, "
+              f"p99: {_percentile(latencies, 99) * 1000:.2f} ms")
+        print(f"Server latency p50: {server_stats['p50_ms']:.2f} ms, p99: {server_stats['p99_ms']:.2f} ms")
+        print(f"Failed scans: {sum(1 for status, _ in results if status != 200)}, "
+              f"sessions on disk: {len(reloaded.attendance_log) - logs_before - len(legacy_times)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _unused_port():
+    """Returns a local port nothing listens on, to stand in for an unreachable server."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def simulate_partition(source_dir="data", check_ins=20):
+    """Cuts one terminal off from the server, keeps working on both, then heals.
+
+    The server and each terminal get their own data directory (the
+    terminals' directories hold only their outboxes). While desk A is cut
+    off it checks members in and out and records a payment; desk B checks
+    in one of the same members on the server. After healing, desk A
+    reconciles, and the outbox is replayed a second time to show replay is
+    idempotent.
+
+    Args:
+        source_dir: Data directory to start from (copied, never modified)
+        check_ins: Check-ins desk A makes while offline
+    """
+    work_dir = tempfile.mkdtemp(prefix="gym_partition_")
+    try:
+        server_dir = _prepare_data_dir(work_dir, source_dir, 0)
+        port, stop = _start_server(server_dir)
+        url = f"http://127.0.0.1:{port}"
+        desk_a = RemoteDataManager(url, local_dir=os.path.join(work_dir, "desk_a"), token=_SERVER_TOKEN)
+        desk_b = RemoteDataManager(url, local_dir=os.path.join(work_dir, "desk_b"), token=_SERVER_TOKEN)
+        service_a = CheckInService(desk_a)
+        service_b = CheckInService(desk_b)
+
+        open_members = {log['member_id'] for log in desk_a.attendance_log if log.get('check_out_time') is None}
+        member_ids = [mid for mid in desk_a.members_db if mid not in open_members][:check_ins]
+        unpaid = next((p for p in desk_a.payments_log if p['status'] == 'Unpaid'), None)
+
+        # Partition: desk A's server becomes unreachable
+        desk_a.server_url = f"http://127.0.0.1:{_unused_port()}"
+        desk_a.reload_changed()
+        start = time.perf_counter()
+        offline_logs = []
+        for i, member_id in enumerate(member_ids):
+            _, _, log = service_a.check_in(member_id)
+            service_a.commit_now()
+            offline_logs.append(log['log_id'])
+            if i % 2:
+                service_a.check_out(member_id)
+                service_a.commit_now()
+        if unpaid:
+            unpaid['status'] = 'Paid'
+            unpaid['amount_paid'] = unpaid['amount_due']
+            desk_a.commit_records("payments_log.json", {unpaid['payment_id']: unpaid})
+        offline_time = time.perf_counter() - start
+        queued = len(desk_a.outbox.entries())
+
+        # Meanwhile desk B checks in a member desk A has open
+        time.sleep(0.01)
+        service_b.check_in(member_ids[0])
+        service_b.commit_now()
+        desk_b.wait_for_sync()  # Sent from the sync worker
+
+        # Heal, keeping a copy of the outbox to replay afterwards
+        with open(desk_a.outbox.path, 'rb') as f:
+            outbox_copy = f.read()
+        desk_a.server_url = url
+        report = desk_a.reconcile_outbox()
+        with open(desk_a.outbox.path, 'wb') as f:
+            f.write(outbox_copy)
+        before_replay = DataManager(server_dir).serialize_snapshot()
+        replay = desk_a.reconcile_outbox()
+        after_replay = DataManager(server_dir).serialize_snapshot()
+        desk_b.reload_changed()
+        stop()
+
+        server = DataManager(server_dir)
+        server_logs = {log['log_id']: log for log in server.attendance_log}
+        first_open = [log for log in server.attendance_log
+                      if log['member_id'] == member_ids[0] and log.get('check_out_time') is None]
+        missing = [log_id for log_id in offline_logs if log_id not in server_logs
+                   and log_id not in {removed for _, _, removed in report['duplicates']}]
+        payment_synced = unpaid is None or any(
+            p['payment_id'] == unpaid['payment_id'] and p['status'] == 'Paid' for p in server.payments_log)
+        in_sync = all(
+            index_records(f, getattr(desk_a, attr)) == index_records(f, getattr(desk_b, attr))
+            for f, attr in desk_a.files.items())
+
+        print(f"\nDesk A offline: {len(member_ids)} check-ins, {len(member_ids) // 2} check-outs"
+              f"{', 1 payment' if unpaid else ''} queued as {queued} outbox entries "
+              f"in {offline_time * 1000:.1f} ms")
+        print(f"Reconciled: {report['sent']} changes sent, duplicates: {report['duplicates']}")
+        print(f"Open sessions for the doubly checked-in member: {len(first_open)}")
+        print(f"Offline check-ins missing on the server: {len(missing)}, payment synced: {payment_synced}")
+        print(f"Replaying the outbox again changed the server: {before_replay != after_replay} "
+              f"(resent {replay['sent']})")
+        print(f"Desks agree after healing: {in_sync}, outbox empty: {not desk_a.outbox.has_pending()}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _dashboard_analytics(analytics):
+    """The analytics calls the dashboard makes when it opens."""
+    analytics.calculate_retention_rate()
+    analytics.get_at_risk_members(30)
+    analytics.predict_revenue(6)
+    analytics.calculate_confidence_interval()
+    analytics.get_retention_trend(6)
+    analytics.get_historical_revenue_trend(6)
+
+
+def bench_analytics(source_dir="data", members=0, visits=5):
+    """Times dashboard analytics on repeated visits, with and without the result cache.
+
+    Args:
+        source_dir: Data directory to benchmark against (copied, never modified)
+        members: Generate mock data with this many members instead (default: 0)
+        visits: Dashboard visits to time
+    """
+    work_dir = tempfile.mkdtemp(prefix="gym_analytics_")
+    try:
+        data_manager = DataManager(_prepare_data_dir(work_dir, source_dir, members))
+        print(f"\n{len(data_manager.members_db)} members, {len(data_manager.membership_history)} memberships, "
+              f"{len(data_manager.payments_log)} payments")
+
+        def time_visit(analytics):
+            start = time.perf_counter()
+            _dashboard_analytics(analytics)
+            return (time.perf_counter() - start) * 1000
+
+        uncached = [time_visit(Analytics(data_manager, cache=ResultCache(max_entries=0))) for _ in range(visits)]
+        cached = [time_visit(Analytics(data_manager)) for _ in range(visits)]
+        print(f"Uncached visit: {sum(uncached) / len(uncached):.2f} ms")
+        print(f"First cached visit: {cached[0]:.2f} ms, later visits: {sum(cached[1:]) / max(1, len(cached) - 1):.3f} ms")
+
+        # One payment only invalidates the revenue results
+        payment = next((p for p in data_manager.payments_log if p['status'] == 'Unpaid'), None)
+        if payment:
+            data_manager.update_record("payments_log.json", payment['payment_id'],
+                                       {"status": "Paid", "amount_paid": payment['amount_due']})
+            before = dict(cache_for(data_manager).stats())
+            after_payment = time_visit(Analytics(data_manager))
+            stats = cache_for(data_manager).stats()
+            print(f"Visit after one payment: {after_payment:.2f} ms "
+                  f"({stats['misses'] - before['misses']} of {stats['hits'] + stats['misses'] - before['hits'] - before['misses']} "
+                  f"results recomputed)")
+        print(f"Cache: {cache_for(data_manager).stats()}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# Analytics calls compared between engines
+ENGINE_CHECKS = [
+    ("calculate_churn_rate", ()),
+    ("calculate_churn_rate", (3, 2)),
+    ("get_retention_trend", (12,)),
+    ("get_at_risk_members", (30,)),
+    ("_calculate_average_monthly_revenue", (6,)),
+    ("get_historical_revenue_trend", (12,)),
+    ("calculate_confidence_interval", ()),
+    ("get_peak_hours", (7,)),
+]
+
+
+def compare_engines(source_dir="data", members=0, repeats=3):
+    """Checks the NumPy analytics engine returns exactly what the pure-Python one does, and times both.
+
+    Args:
+        source_dir: Data directory to compare against (copied, never modified)
+        members: Generate mock data with this many members instead (default: 0)
+        repeats: Timed runs per call (the NumPy engine converts once, then reuses its arrays)
+    """
+    if not numpy_available():
+        print("NumPy is not installed; nothing to compare.")
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="gym_engines_")
+    try:
+        data_manager = DataManager(_prepare_data_dir(work_dir, source_dir, members))
+        engines = {name: Analytics(data_manager, cache=ResultCache(max_entries=0), engine=name)
+                   for name in ("python", "numpy")}
+        print(f"\n{len(data_manager.membership_history)} memberships, {len(data_manager.payments_log)} payments, "
+              f"{len(data_manager.attendance_log)} check-ins")
+        print(f"{'Call':<45}{'Python ms':>12}{'NumPy ms':>12}  Identical")
+
+        mismatches = 0
+        for method, args in ENGINE_CHECKS:
+            results = {}
+            times = {}
+            for name, analytics in engines.items():
+                call = getattr(analytics, method)
+                results[name] = call(*args)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    call(*args)
+                times[name] = (time.perf_counter() - start) / repeats * 1000
+            identical = results['python'] == results['numpy']
+            mismatches += not identical
+            label = f"{method}{args if args else '()'}"
+            print(f"{label:<45}{times['python']:>12.2f}{times['numpy']:>12.2f}  {identical}")
+        print(f"\n{'All results identical' if not mismatches else f'{mismatches} calls differ'}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_forecast(active=100000, months_ahead=6):
+    """Times the schedule-based revenue forecast on synthetic active memberships.
+
+    Args:
+        active: Active memberships to forecast from
+        months_ahead: Forecast horizon in months
+    """
+    rng = random.Random(42)
+    today = datetime.date.today()
+    plans = {f"P{i}": {"plan_id": f"P{i}", "name": f"Plan {i}", "duration_months": months, "base_price": price}
+             for i, (months, price) in enumerate([(1, 50.0), (3, 135.0), (12, 500.0)])}
+    trainers = {f"T{i}": {"first_name": "T", "last_name": str(i), "fee": 20.0 + i} for i in range(20)}
+    memberships = []
+    for i in range(active):
+        plan_id = rng.choice(list(plans))
+        # One ended membership per member as history for the renewal rates
+        end = today + datetime.timedelta(days=rng.randint(-10, 365))
+        previous_end = end - datetime.timedelta(days=plans[plan_id]['duration_months'] * 30)
+        for status, start, stop in (("Expired", previous_end - datetime.timedelta(days=30), previous_end),
+                                    ("Active", previous_end if rng.random() < 0.7 else end, end)):
+            memberships.append({
+                "membership_id": f"MS{len(memberships)}", "member_id": f"M{i}", "plan_id": plan_id,
+                "assigned_trainer_id": rng.choice([None, None, f"T{rng.randrange(20)}"]),
+                "start_date": start.isoformat(), "end_date": stop.isoformat(), "status": status
+            })
+
+    collections = {"plans.json": plans, "trainers.json": trainers, "membership_history.json": memberships}
+    files = {"plans.json": "plans_db", "trainers.json": "trainers_db", "membership_history.json": "membership_history"}
+    analytics = Analytics(DataSnapshot(collections, files, 0, {}), cache=ResultCache())
+
+    start = time.perf_counter()
+    forecast = analytics.predict_revenue(months_ahead)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    again = analytics.predict_revenue(months_ahead)
+    warm = time.perf_counter() - start
+
+    print(f"\n{active} active memberships ({len(memberships)} in history)")
+    print(f"Forecast: {cold * 1000:.0f} ms, memoized: {warm * 1000:.3f} ms, repeatable: {forecast == again}")
+    for month, amount in zip(forecast['months'], forecast['predicted']):
+        print(f"  {month}: {amount:,.2f}")
+
+
+def bench_cohorts(members=100000, years=5):
+    """Times the cohort retention grid on synthetic members who joined over several years.
+
+    Args:
+        members: Members to generate
+        years: Span of join dates (one cohort per month)
+    """
+    rng = random.Random(7)
+    today = datetime.date.today()
+    span_days = years * 365
+    members_db = {}
+    memberships = []
+    for i in range(members):
+        member_id = f"M{i}"
+        start = today - datetime.timedelta(days=rng.randrange(span_days))
+        members_db[member_id] = {"first_name": "M", "last_name": str(i), "join_date": start.isoformat()}
+        # Renew a few times, each time with a chance of dropping out
+        while start <= today:
+            end = start + datetime.timedelta(days=rng.choice([1, 3, 12]) * 30)
+            memberships.append({
+                "membership_id": f"MS{len(memberships)}", "member_id": member_id, "plan_id": "P1",
+                "start_date": start.isoformat(), "end_date": end.isoformat(),
+                "status": "Active" if end >= today else "Expired"
+            })
+            if rng.random() < 0.3:
+                break
+            start = end + datetime.timedelta(days=rng.randrange(0, 20))
+
+    collections = {"members.json": members_db, "membership_history.json": memberships}
+    files = {"members.json": "members_db", "membership_history.json": "membership_history"}
+    analytics = Analytics(DataSnapshot(collections, files, 0, {}), cache=ResultCache())
+
+    start = time.perf_counter()
+    grid = analytics.get_cohort_retention(years * 12)
+    elapsed = time.perf_counter() - start
+    print(f"\n{members} members, {len(memberships)} memberships, {len(grid['cohorts'])} cohorts")
+    print(f"Cohort grid: {elapsed * 1000:.0f} ms")
+    for label, size, rates in list(zip(grid['cohorts'], grid['sizes'], grid['rates']))[-3:]:
+        print(f"  {label} ({size}): {[rate for rate in rates if rate is not None][:6]}")
+
+
+def bench_activity(members=20000, days=365, visit_rate=0.15):
+    """Times distinct-visitor queries on daily activity bitmaps against log scans.
+
+    Args:
+        members: Members to generate
+        days: Days of attendance history
+        visit_rate: Chance each member visits on a given day
+    """
+    rng = random.Random(11)
+    today = datetime.date.today()
+    attendance = []
+    for offset in range(days):
+        day = (today - datetime.timedelta(days=offset)).isoformat()
+        for i in rng.sample(range(members), int(members * visit_rate)):
+            attendance.append({"log_id": f"A{len(attendance)}", "member_id": f"M{i}",
+                               "check_in_time": f"{day} 18:00:00", "check_out_time": None})
+
+    def scan(first_day, last_day):
+        first, last = first_day.isoformat(), last_day.isoformat()
+        return len({log['member_id'] for log in attendance if first <= log['check_in_time'][:10] <= last})
+
+    start = time.perf_counter()
+    bitmaps = ActivityBitmaps()
+    bitmaps.rebuild(attendance)
+    build_time = time.perf_counter() - start
+
+    print(f"\n{members} members, {len(attendance)} check-ins over {days} days")
+    print(f"Bitmap build: {build_time * 1000:.0f} ms (once; then kept up to date per check-in)")
+    print(f"{'Period':<8}{'Members':>10}{'Scan':>12}{'Bitmaps':>12}")
+    for label, length in (("DAU", 1), ("WAU", 7), ("MAU", 30), ("Year", days)):
+        first_day = today - datetime.timedelta(days=length - 1)
+        start = time.perf_counter()
+        expected = scan(first_day, today)
+        scan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        count = bitmaps.count_active(first_day, today)
+        bitmap_time = time.perf_counter() - start
+        if count != expected:
+            print(f"MISMATCH for {label}: {count} != {expected}")
+        print(f"{label:<8}{count:>10}{scan_time * 1000:>10.1f}ms{bitmap_time * 1000:>10.2f}ms")
+
+    start = time.perf_counter()
+    lapsed_since = today - datetime.timedelta(days=20)
+    recent = set(bitmaps.members(bitmaps.active_bits(lapsed_since, today)))
+    lapsed = [f"M{i}" for i in range(members) if f"M{i}" not in recent]
+    last_visits = bitmaps.last_visits(lapsed, lapsed_since)
+    print(f"Lapsed 21 days: {len(lapsed)} members, last visits found in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms ({len(last_visits)} had visited before)")
+
+
+def bench_churn_risk(members=100000, days=60, check_ins=1000):
+    """Times churn risk scoring: a full build, then rescoring after single check-ins.
+
+    Args:
+        members: Members to generate
+        days: Days of attendance history
+        check_ins: Check-ins to apply one at a time after the build
+    """
+    rng = random.Random(13)
+    today = datetime.date.today()
+    members_db = {f"M{i}": {"first_name": "M", "last_name": str(i)} for i in range(members)}
+    attendance = []
+    for i in range(members):
+        # Regulars, occasional visitors and members who stopped coming
+        rate = rng.choice([0.4, 0.1, 0.0])
+        for offset in range(days):
+            if rng.random() < rate:
+                day = (today - datetime.timedelta(days=offset)).isoformat()
+                attendance.append({"log_id": f"A{len(attendance)}", "member_id": f"M{i}",
+                                   "check_in_time": f"{day} 18:00:00", "duration_minutes": rng.randrange(20, 120)})
+    payments = [{"payment_id": f"P{i}", "member_id": f"M{i}", "status": rng.choice(["Paid", "Paid", "Unpaid"]),
+                 "due_date": (today - datetime.timedelta(days=rng.randrange(-15, 15))).isoformat()}
+                for i in range(members)]
+    snapshot = DataSnapshot(
+        {"members.json": members_db, "attendance_log.json": attendance, "payments_log.json": payments},
+        {"members.json": "members_db", "attendance_log.json": "attendance_log", "payments_log.json": "payments_log"},
+        0, {}
+    )
+
+    start = time.perf_counter()
+    index = ChurnRiskIndex()
+    index.rebuild(snapshot, versions={filename: 0 for filename in RISK_FILES})
+    scores = index.scores()
+    build_time = time.perf_counter() - start
+    levels = {}
+    for details in scores.values():
+        levels[details['level']] = levels.get(details['level'], 0) + 1
+    print(f"\n{members} members, {len(attendance)} check-ins over {days} days")
+    print(f"Build and score everyone: {build_time * 1000:.0f} ms  {levels}")
+
+    # Check-ins arrive as change events, as from a DataManager
+    times = []
+    check_in_time = f"{today.isoformat()} 18:00:00"
+    for n in range(check_ins):
+        record = {"log_id": f"NEW{n}", "member_id": f"M{rng.randrange(members)}",
+                  "check_in_time": check_in_time, "duration_minutes": None}
+        event = ChangeEvent(ATTENDANCE_FILE, record['log_id'], json.dumps(record), None, version=n + 1)
+        start = time.perf_counter()
+        index.on_records_changed([event])
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(f"Per check-in event: p50 {_percentile(times, 50) * 1e6:.0f} us, p99 {_percentile(times, 99) * 1e6:.0f} us")
+
+    start = time.perf_counter()
+    scores = index.scores()
+    print(f"Rescore the {check_ins} members who checked in and copy all scores: "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def bench_session_stats(sessions=1000000, days=365):
+    """Times session-length stats from per-day sketches against sorting the history.
+
+    Args:
+        sessions: Finished sessions to generate
+        days: Days they are spread over
+    """
+    rng = random.Random(17)
+    today = datetime.date.today()
+    attendance = []
+    for n in range(sessions):
+        day = today - datetime.timedelta(days=rng.randrange(days))
+        attendance.append({"log_id": f"A{n}", "member_id": f"M{rng.randrange(20000)}",
+                           "check_in_time": f"{day.isoformat()} {rng.randrange(6, 23):02d}:00:00",
+                           "duration_minutes": max(5, int(rng.lognormvariate(4.1, 0.4)))})
+
+    start = time.perf_counter()
+    index = SessionDurationIndex()
+    index.rebuild(attendance)
+    print(f"\n{sessions} sessions over {days} days")
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.0f} ms (once; then one update per check-out)")
+
+    print(f"{'Period':<8}{'p50':>14}{'p90':>14}{'p99':>14}{'Sort':>10}{'Sketch':>10}")
+    for label, length in (("Week", 7), ("Month", 30), ("Year", days)):
+        first = (today - datetime.timedelta(days=length - 1)).isoformat()
+        start = time.perf_counter()
+        ordered = sorted(log['duration_minutes'] for log in attendance if log['check_in_time'][:10] >= first)
+        exact = [_percentile(ordered, p) for p in (50, 90, 99)]
+        sort_time = time.perf_counter() - start
+        start = time.perf_counter()
+        summary = index.period(today - datetime.timedelta(days=length - 1), today).summary()
+        sketch_time = time.perf_counter() - start
+        cells = "".join(f"{summary[field]:>7}/{value:<6}" for field, value in zip(("p50", "p90", "p99"), exact))
+        print(f"{label:<8}{cells}{sort_time * 1000:>8.0f}ms{sketch_time * 1000:>8.1f}ms")
+    print("(sketch/exact, minutes)")
+
+
+def bench_ledger(members=100000, payments=500000, updates=1000):
+    """Times balance and payment-queue queries on the ledger against scanning the payments log.
+
+    Args:
+        members: Members to generate
+        payments: Payments to generate
+        updates: Payments marked paid one at a time after the build
+    """
+    rng = random.Random(19)
+    today = datetime.date.today()
+    payments_log = []
+    for n in range(payments):
+        due = today - datetime.timedelta(days=rng.randrange(-10, 120))
+        paid = rng.random() >= 0.2
+        payments_log.append({
+            "payment_id": f"PAY{n}", "member_id": f"M{rng.randrange(members)}", "membership_id": None,
+            "amount_due": rng.choice([45.0, 67.5, 120.0]), "amount_paid": 0.0, "due_date": due.isoformat(),
+            "payment_date": f"{due.isoformat()}T{rng.randrange(6, 22):02d}:{rng.randrange(60):02d}:00" if paid else None,
+            "status": "Paid" if paid else "Unpaid",
+        })
+
+    start = time.perf_counter()
+    ledger = BalanceLedger()
+    ledger.rebuild(payments_log, version=0)
+    print(f"\n{members} members, {payments} payments")
+    print(f"Ledger build: {(time.perf_counter() - start) * 1000:.0f} ms (once)")
+
+    member_ids = [f"M{rng.randrange(members)}" for _ in range(100)]
+    start = time.perf_counter()
+    for member_id in member_ids:
+        sum(p['amount_due'] - p['amount_paid'] for p in payments_log
+            if p['member_id'] == member_id and p['status'] == 'Unpaid')
+    scan_time = (time.perf_counter() - start) / len(member_ids)
+    start = time.perf_counter()
+    for member_id in member_ids:
+        ledger.balance(member_id)
+    ledger_time = (time.perf_counter() - start) / len(member_ids)
+    print(f"Member balance: scan {scan_time * 1000:.1f} ms, ledger {ledger_time * 1e6:.2f} us")
+
+    start = time.perf_counter()
+    aging = ledger.aging()
+    print(f"Gym-wide aging: {(time.perf_counter() - start) * 1000:.2f} ms  "
+          f"{ {bucket: round(totals['amount']) for bucket, totals in aging.items()} }")
+
+    # The Payments screen: unpaid by due date, then paid, most recent first
+    page_size = 200
+    start = time.perf_counter()
+    unpaid = sorted((p for p in payments_log if p['status'] == 'Unpaid'), key=lambda p: p['due_date'])
+    paid = sorted((p for p in payments_log if p['status'] == 'Paid'),
+                  key=lambda p: p.get('payment_date') or '', reverse=True)
+    ordered = unpaid + paid
+    sort_time = time.perf_counter() - start
+    start = time.perf_counter()
+    page = ledger.payments_page(0, page_size)
+    page_time = time.perf_counter() - start
+    pages_match = all(
+        [(p['status'], p['due_date'] if p['status'] == 'Unpaid' else p['payment_date']) for p in ordered[offset:offset + page_size]]
+        == [(p['status'], p['due_date'] if p['status'] == 'Unpaid' else p['payment_date'])
+            for p in ledger.payments_page(offset, page_size)]
+        for offset in (0, len(unpaid) - page_size // 2, len(ordered) - page_size // 2))
+    print(f"Payments page of {len(page)}: split and sort {sort_time * 1000:.0f} ms, "
+          f"ledger {page_time * 1e6:.0f} us; same order: {pages_match}")
+    start = time.perf_counter()
+    overdue = ledger.overdue_count()
+    print(f"Overdue count: {overdue} in {(time.perf_counter() - start) * 1e6:.1f} us "
+          f"(aging says {sum(totals['count'] for bucket, totals in aging.items() if bucket != 'not_due')})")
+
+    # Payments marked paid arrive as change events, as from a DataManager
+    unpaid = [p for p in payments_log if p['status'] == 'Unpaid'][:updates]
+    times = []
+    for version, payment in enumerate(unpaid, start=1):
+        paid = dict(payment, status="Paid", amount_paid=payment['amount_due'])
+        event = ChangeEvent(PAYMENTS_FILE, payment['payment_id'], json.dumps(paid), json.dumps(payment), version)
+        start = time.perf_counter()
+        ledger.on_records_changed([event])
+        times.append(time.perf_counter() - start)
+    times.sort()
+    fresh = BalanceLedger()
+    marked = {p['payment_id'] for p in unpaid}
+    fresh.rebuild([dict(p, status="Paid", amount_paid=p['amount_due']) if p['payment_id'] in marked else p
+                   for p in payments_log])
+    print(f"Per payment marked paid: p50 {_percentile(times, 50) * 1e6:.0f} us, "
+          f"p99 {_percentile(times, 99) * 1e6:.0f} us; matches a rebuild: "
+          f"{fresh.total_cents == ledger.total_cents and fresh._queues == ledger._queues}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance benchmarks for Gym Management System")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    backups_parser = subparsers.add_parser("backups", help="Compare backup strategies")
+    backups_parser.add_argument("--data", default="data", help="Data directory to benchmark against")
+    backups_parser.add_argument("--members", type=int, default=0, help="Generate mock data with this many members")
+    backups_parser.add_argument("--rounds", type=int, default=3, help="Backups per strategy")
+
+    restore_parser = subparsers.add_parser("restore", help="Check a backup keeps edits not yet written to their files")
+    restore_parser.add_argument("--data", default="data", help="Data directory to start from")
+
+    server_parser = subparsers.add_parser("server", help="Load-test the API server with concurrent check-ins")
+    server_parser.add_argument("--data", default="data", help="Data directory to test against")
+    server_parser.add_argument("--members", type=int, default=0, help="Generate mock data with this many members")
+    server_parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    server_parser.add_argument("--check-ins", type=int, default=400, help="Total check-ins")
+
+    check_ins_parser = subparsers.add_parser("checkins", help="Kiosk check-in latency under burst load")
+    check_ins_parser.add_argument("--data", default="data", help="Data directory to test against")
+    check_ins_parser.add_argument("--members", type=int, default=50000, help="Roster size to generate (0 uses --data)")
+    check_ins_parser.add_argument("--rate", type=int, default=1000, help="Check-ins per minute")
+    check_ins_parser.add_argument("--seconds", type=int, default=60, help="Duration of the burst")
+    check_ins_parser.add_argument("--clients", type=int, default=8, help="Concurrent kiosks")
+
+    partition_parser = subparsers.add_parser("partition", help="Simulate a terminal losing the server and reconciling")
+    partition_parser.add_argument("--data", default="data", help="Data directory to start from")
+    partition_parser.add_argument("--check-ins", type=int, default=20, help="Check-ins made while offline")
+
+    analytics_parser = subparsers.add_parser("analytics", help="Dashboard analytics with and without the result cache")
+    analytics_parser.add_argument("--data", default="data", help="Data directory to benchmark against")
+    analytics_parser.add_argument("--members", type=int, default=0, help="Generate mock data with this many members")
+    analytics_parser.add_argument("--visits", type=int, default=5, help="Dashboard visits to time")
+
+    engines_parser = subparsers.add_parser("engines", help="Check the NumPy analytics engine against pure Python")
+    engines_parser.add_argument("--data", default="data", help="Data directory to compare against")
+    engines_parser.add_argument("--members", type=int, default=0, help="Generate mock data with this many members")
+    engines_parser.add_argument("--repeats", type=int, default=3, help="Timed runs per call")
+
+    forecast_parser = subparsers.add_parser("forecast", help="Time the revenue forecast on many active memberships")
+    forecast_parser.add_argument("--active", type=int, default=100000, help="Active memberships")
+    forecast_parser.add_argument("--months", type=int, default=6, help="Months to forecast")
+
+    cohorts_parser = subparsers.add_parser("cohorts", help="Time the cohort retention grid")
+    cohorts_parser.add_argument("--members", type=int, default=100000, help="Members to generate")
+    cohorts_parser.add_argument("--years", type=int, default=5, help="Years of join dates")
+
+    activity_parser = subparsers.add_parser("activity", help="Distinct-visitor queries: bitmaps vs log scans")
+    activity_parser.add_argument("--members", type=int, default=20000, help="Members to generate")
+    activity_parser.add_argument("--days", type=int, default=365, help="Days of attendance")
+    activity_parser.add_argument("--visit-rate", type=float, default=0.15, help="Daily visit chance per member")
+
+    risk_parser = subparsers.add_parser("risk", help="Churn risk scoring: full build and per check-in updates")
+    risk_parser.add_argument("--members", type=int, default=100000, help="Members to generate")
+    risk_parser.add_argument("--days", type=int, default=60, help="Days of attendance")
+    risk_parser.add_argument("--check-ins", type=int, default=1000, help="Check-ins applied after the build")
+
+    sessions_parser = subparsers.add_parser("sessions", help="Session-length stats: sketches vs sorting")
+    sessions_parser.add_argument("--sessions", type=int, default=1000000, help="Sessions to generate")
+    sessions_parser.add_argument("--days", type=int, default=365, help="Days of attendance")
+
+    ledger_parser = subparsers.add_parser("ledger", help="Outstanding balances and payment queues: ledger vs scanning payments")
+    ledger_parser.add_argument("--members", type=int, default=100000, help="Members to generate")
+    ledger_parser.add_argument("--payments", type=int, default=500000, help="Payments to generate")
+    ledger_parser.add_argument("--updates", type=int, default=1000, help="Payments marked paid after the build")
+
+    args = parser.parse_args()
+    if args.benchmark == "backups":
+        bench_backups(args.data, args.members, args.rounds)
+    elif args.benchmark == "restore":
+        check_backup_restore(args.data)
+    elif args.benchmark == "server":
+        load_test_server(args.data, args.members, args.clients, args.check_ins)
+    elif args.benchmark == "checkins":
+        bench_check_ins(args.data, args.members, args.rate, args.seconds, args.clients)
+    elif args.benchmark == "partition":
+        simulate_partition(args.data, args.check_ins)
+    elif args.benchmark == "analytics":
+        bench_analytics(args.data, args.members, args.visits)
+    elif args.benchmark == "engines":
+        compare_engines(args.data, args.members, args.repeats)
+    elif args.benchmark == "forecast":
+        bench_forecast(args.active, args.months)
+    elif args.benchmark == "cohorts":
+        bench_cohorts(args.members, args.years)
+    elif args.benchmark == "activity":
+        bench_activity(args.members, args.days, args.visit_rate)
+    elif args.benchmark == "risk":
+        bench_churn_risk(args.members, args.days, args.check_ins)
+    elif args.benchmark == "sessions":
+        bench_session_stats(args.sessions, args.days)
+    elif args.benchmark == "ledger":
+        bench_ledger(args.members, args.payments, args.updates)
@@ -0,0 +1,56 @@
+import json
+
+ADDED = "added"
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+class ChangeEvent:
+    """One record added, updated or deleted in a DataManager collection.
+
+    Subscribers (see DataManager.subscribe) receive these in batches, one
+    batch per operation, after the change is saved. ``record`` and
+    ``previous`` are decoded from the saved state on first access, so
+    subscribers that only look at ``collection``, ``op`` and ``key`` pay
+    nothing for them; both are copies, safe to keep.
+
+    Attributes:
+        collection: Data file the record belongs to (e.g. "payments_log.json")
+        op: ADDED, UPDATED or DELETED
+        key: Record ID
+        version: The collection's version (see DataManager.versions) once
+            this change was saved
+    """
+
+    __slots__ = ("collection", "op", "key", "version", "_text", "_previous_text", "_record", "_previous")
+
+    def __init__(self, collection, key, text, previous_text, version=None):
+        self.collection = collection
+        self.key = key
+        self.version = version
+        if previous_text is None:
+            self.op = ADDED
+        elif text is None:
+            self.op = DELETED
+        else:
+            self.op = UPDATED
+        self._text = text
+        self._previous_text = previous_text
+        self._record = self._previous = None
+
+    @property
+    def record(self):
+        """The record as saved (None when deleted)."""
+        if self._record is None and self._text is not None:
+            self._record = json.loads(self._text)
+        return self._record
+
+    @property
+    def previous(self):
+        """The record before the change (None when added)."""
+        if self._previous is None and self._previous_text is not None:
+            self._previous = json.loads(self._previous_text)
+        return self._previous
+
+    def __repr__(self):
+        return f"ChangeEvent({self.collection!r}, {self.op}, {self.key!r})"
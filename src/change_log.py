@@ -0,0 +1,305 @@
+import json
+import os
+from datetime import datetime
+
+from .file_lock import lock_for
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# Files holding a list of records and the field that identifies each record.
+# Dict-based files (members, trainers, plans) use the dict key.
+RECORD_KEYS = {
+    "membership_history.json": "membership_id",
+    "payments_log.json": "payment_id",
+    "attendance_log.json": "log_id",
+    "visitors_log.json": "visitor_id"
+}
+
+
+def format_timestamp(moment):
+    """Formats a datetime the way log entries store it (sortable as text)."""
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def record_key(filename, record, index):
+    """Returns the identifier of a list record, falling back to its position."""
+    key = record.get(RECORD_KEYS.get(filename)) if isinstance(record, dict) else None
+    return key if key is not None else f"#{index}"
+
+
+def index_records(filename, data):
+    """Maps record key -> record for a collection, preserving order."""
+    if isinstance(data, dict):
+        return dict(data)
+    return {record_key(filename, record, i): record for i, record in enumerate(data)}
+
+
+def apply_entries(collections, entries):
+    """Applies change log entries to collections indexed with index_records.
+
+    Entries set the full state of a record, so replaying an entry whose
+    effect is already present is harmless.
+
+    Args:
+        collections: Dict of filename -> {key: record}, modified in place
+        entries: Iterable of change log entries
+
+    Returns:
+        int: Number of entries applied
+    """
+    applied = 0
+    for entry in entries:
+        records = collections.get(entry['file'])
+        if records is None:
+            continue
+        if entry['op'] == "put":
+            records[entry['key']] = entry['record']
+        else:
+            records.pop(entry['key'], None)
+        applied += 1
+    return applied
+
+
+class ChangeLog:
+    """Append-only log of record-level changes, one JSON object per line.
+
+    Each entry looks like::
+
+        {"seq": 42, "ts": "2025-12-09T11:09:54.123456", "file": "payments_log.json",
+         "op": "put", "key": "PAY00001", "record": {...}}
+
+    ``put`` entries carry the full new state of a record and ``del`` entries
+    remove it, so the log can be replayed over any snapshot taken at or
+    before a given sequence number.
+
+    Several processes can share one log: appends, compaction and checkpoint
+    updates hold an advisory file lock (``lock``), and read_new() returns
+    the entries other processes appended since this instance last looked.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Shared by every ChangeLog on this path in this process and locked
+        # on disk, so appends from other instances and processes never interleave
+        self.lock = lock_for(path + ".lock")
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Sequence number each data file on disk is known to include. Entries
+        # after a file's checkpoint were journaled but not yet written to it.
+        self.checkpoint_path = os.path.join(directory, "checkpoints.json")
+
+        with self.lock:
+            self.last_seq = self.read_last_seq()
+            self._offset, self._inode = self._stat()
+        self._unread = []  # Other processes' entries seen while appending
+
+    def read_checkpoints(self):
+        """Returns filename -> sequence number each data file includes."""
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_checkpoints(self, updates):
+        """Records that data files now include every entry up to the given seqs.
+
+        Args:
+            updates: Dict of filename -> sequence number
+        """
+        with self.lock:
+            checkpoints = self.read_checkpoints()
+            checkpoints.update(updates)
+            temp_path = self.checkpoint_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(checkpoints, f)
+            os.replace(temp_path, self.checkpoint_path)
+
+    def read_last_seq(self):
+        """Reads the sequence number of the last entry on disk.
+
+        Only the tail of the file is read, so this is cheap on large logs.
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            block = 64 * 1024
+            while True:
+                start = max(0, size - block)
+                f.seek(start)
+                lines = f.read(size - start).splitlines()
+                complete = lines if start == 0 else lines[1:]
+                for line in reversed(complete):
+                    try:
+                        return json.loads(line)['seq']
+                    except (ValueError, KeyError):
+                        continue  # Torn last line from a crash
+                if start == 0:
+                    return 0
+                block *= 4
+
+    def append(self, changes, fsync=False):
+        """Appends changes to the log with a single write.
+
+        Args:
+            changes: List of (filename, op, key, record_json) tuples, where
+                record_json is the record already serialized (None for "del")
+            fsync: Force the write to disk before returning (default: False)
+
+        Returns:
+            int: Sequence number of the last entry written
+        """
+        if not changes:
+            return self.last_seq
+
+        with self.lock:
+            self._unread.extend(self._scan_new())  # Keeps last_seq ahead of other processes
+            ts = format_timestamp(datetime.now())
+            lines = []
+            for filename, op, key, record_json in changes:
+                self.last_seq += 1
+                header = json.dumps({"seq": self.last_seq, "ts": ts, "file": filename, "op": op, "key": key})
+                if record_json is None:
+                    lines.append(header + "\n")
+                else:
+                    # Splice the pre-serialized record in instead of encoding it twice
+                    lines.append(f'{header[:-1]}, "record": {record_json}}}\n')
+
+            with open(self.path, 'a') as f:
+                f.write("".join(lines))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._offset, self._inode = self._stat()
+            return self.last_seq
+
+    def sync(self):
+        """Forces entries appended without fsync to disk."""
+        with open(self.path, 'a') as f:
+            os.fsync(f.fileno())
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0, None
+        return stat.st_size, stat.st_ino
+
+    def _scan_new(self):
+        """Reads entries appended since this instance's last read or write (lock held).
+
+        Costs one stat when nothing was appended. If the log was rewritten
+        (compacted) meanwhile, it is scanned for entries after last_seq.
+        """
+        size, inode = self._stat()
+        if inode == self._inode and size == self._offset:
+            return []
+
+        if inode != self._inode or size < self._offset:
+            entries = list(self.iter_entries(after_seq=self.last_seq))
+            self._offset, self._inode = size, inode
+        else:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+            complete = data.rfind(b"\n") + 1
+            entries = []
+            for line in data[:complete].splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+            self._offset += complete
+
+        if entries:
+            self.last_seq = max(self.last_seq, entries[-1]['seq'])
+        return entries
+
+    def read_new(self):
+        """Returns entries other processes appended since this instance last looked.
+
+        Returns:
+            list: Log entries in seq order
+        """
+        with self.lock:
+            entries = self._unread + self._scan_new()
+            self._unread = []
+            return entries
+
+    def has_unread(self):
+        """Whether other processes appended entries read_new() has not returned yet."""
+        with self.lock:
+            self._unread.extend(self._scan_new())
+            return bool(self._unread)
+
+    def compact(self, up_to_seq):
+        """Drops entries no restore can need any more.
+
+        Entries not yet written to their data file (see checkpoints) are
+        always kept, and so is the last entry.
+
+        Args:
+            up_to_seq: Entries with this sequence number or lower are removed
+
+        Returns:
+            int: Number of entries removed
+        """
+        if not os.path.exists(self.path):
+            return 0
+        checkpoints = self.read_checkpoints()
+        if checkpoints:
+            up_to_seq = min(up_to_seq, *checkpoints.values())
+
+        with self.lock:
+            # The last entry always stays, so the next seq carries on from it after a restart
+            up_to_seq = min(up_to_seq, self.read_last_seq() - 1)
+            removed = 0
+            temp_path = self.path + ".tmp"
+            with open(self.path, 'r') as src, open(temp_path, 'w') as dst:
+                for line in src:
+                    try:
+                        seq = int(line[8:line.index(",")])
+                    except ValueError:
+                        seq = None
+                    if seq is not None and seq <= up_to_seq:
+                        removed += 1
+                    else:
+                        dst.write(line)
+            os.replace(temp_path, self.path)
+            return removed
+
+    def iter_entries(self, after_seq=0, until=None):
+        """Streams entries in order without loading the whole log.
+
+        Args:
+            after_seq: Only yield entries with a greater sequence number
+            until: Optional timestamp string; stop at the first later entry
+
+        Yields:
+            dict: Log entries
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                # Cheap skip on the sequence number before decoding the line
+                try:
+                    seq = int(line[8:line.index(",")])
+                except ValueError:
+                    continue
+                if seq <= after_seq:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from a crash
+                if until is not None and entry['ts'] > until:
+                    return
+                yield entry
@@ -0,0 +1,316 @@
+import asyncio
+import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .change_events import DELETED
+from .change_log import index_records
+from .utils import get_current_datetime_iso
+
+ATTENDANCE_FILE = "attendance_log.json"
+LATENCY_WINDOW = 10000  # Recent samples kept for percentiles
+
+
+def normalize_phone(contact):
+    """Reduces a phone number to its digits so '+92 300-1234567' matches '923001234567'."""
+    return "".join(ch for ch in str(contact or "") if ch.isdigit())
+
+
+class LatencyStats:
+    """Rolling latency percentiles over the most recent samples."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        """Returns count, p50, p99 and max latency in milliseconds."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        def percentile(percent):
+            index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+            return round(ordered[index] * 1000, 3)
+
+        return {
+            "count": self.count,
+            "p50_ms": percentile(50),
+            "p99_ms": percentile(99),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+
+class CheckInService:
+    """Fast check-in/check-out path for kiosks and the API server.
+
+    Members are found by ID or phone number and open sessions by member ID
+    through dict indexes, so a scan costs the same with 100 or 50,000
+    members. Check-ins update the attendance log in memory and are made
+    durable by appending them to the change log; concurrent scans share one
+    fsync (group commit). The attendance file itself is rewritten only by
+    checkpoint(), which callers run every so often.
+    """
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.latency = LatencyStats()
+
+        self._staged = {}       # log_id -> record waiting to be made durable
+        self._waiters = []      # Futures resolved once their check-ins are durable
+        self._flush_task = None
+        self._dirty = False     # Journaled changes not yet checkpointed
+        self._executor = None   # Worker for commit_in_background (created on first use)
+
+        self.rebuild_indexes()
+        data_manager.subscribe(self._on_records_changed, {"members.json", ATTENDANCE_FILE})
+
+    # ==================== Indexes ====================
+
+    def rebuild_indexes(self):
+        """Builds the phone, open-session and log ID indexes from the data manager."""
+        with self.data_manager.lock:
+            members_by_phone = {}
+            for member_id, member in self.data_manager.members_db.items():
+                phone = normalize_phone(member.get('contact'))
+                if phone:
+                    members_by_phone[phone] = member_id
+
+            open_sessions = {}
+            log_ids = set()
+            for log in self.data_manager.attendance_log:
+                log_ids.add(log['log_id'])
+                if log.get('check_out_time') is None:
+                    open_sessions[log['member_id']] = log
+            self.members_by_phone, self.open_sessions, self.log_ids = members_by_phone, open_sessions, log_ids
+
+    def _on_records_changed(self, events):
+        """Updates the indexes for just the records that changed."""
+        with self.data_manager.lock:
+            live_logs = None
+            for event in events:
+                if event.collection == "members.json":
+                    self._update_phone_index(event)
+                    continue
+                
+                if event.op == DELETED:
+                    self.log_ids.discard(event.key)
+                else:
+                    self.log_ids.add(event.key)
+                member_id = (event.record or event.previous)['member_id']
+                current = self.open_sessions.get(member_id)
+                indexed = current is not None and current['log_id'] == event.key
+                closed = event.op == DELETED or event.record.get('check_out_time') is not None
+                if closed and not indexed:
+                    continue  # e.g. our own check-out, already unindexed
+                if not closed and indexed and current == event.record:
+                    continue  # Our own check-in, already indexed
+                
+                # Changed elsewhere: index the member's open live record, if
+                # any (records may have been replaced since the event)
+                if live_logs is None:
+                    live_logs = index_records(ATTENDANCE_FILE, self.data_manager.attendance_log)
+                log = live_logs.get(event.key)
+                if log is None or log.get('check_out_time') is not None:
+                    log = next((log for log in reversed(list(live_logs.values()))
+                                if log['member_id'] == member_id and log.get('check_out_time') is None), None)
+                if log is not None:
+                    self.open_sessions[member_id] = log
+                else:
+                    self.open_sessions.pop(member_id, None)
+
+    def _update_phone_index(self, event):
+        old_phone = normalize_phone((event.previous or {}).get('contact'))
+        new_phone = normalize_phone((event.record or {}).get('contact'))
+        if old_phone and old_phone != new_phone and self.members_by_phone.get(old_phone) == event.key:
+            del self.members_by_phone[old_phone]
+        if new_phone:
+            self.members_by_phone[new_phone] = event.key
+
+    def find_member(self, scan):
+        """Finds a member ID from a scanned/typed member ID or phone number.
+
+        Returns:
+            str or None: Member ID
+        """
+        scan = str(scan or "").strip()
+        if scan in self.data_manager.members_db:
+            return scan
+        phone = normalize_phone(scan)
+        return self.members_by_phone.get(phone) if phone else None
+
+    # ==================== Check-in / Check-out ====================
+
+    def check_in(self, scan):
+        """Checks a member in, in memory. Call commit() to make it durable.
+
+        Args:
+            scan: Member ID or phone number
+
+        Returns:
+            tuple: (result, member_id, log) where result is "checked_in",
+                "already_checked_in" or "not_found"
+        """
+        member_id = self.find_member(scan)
+        if member_id is None:
+            return "not_found", None, None
+
+        with self.data_manager.lock:
+            if member_id in self.open_sessions:
+                return "already_checked_in", member_id, self.open_sessions[member_id]
+
+            log = {
+                "log_id": self.data_manager.new_key(ATTENDANCE_FILE, "A", taken=self.log_ids),
+                "member_id": member_id,
+                "check_in_time": get_current_datetime_iso(),
+                "check_out_time": None,
+                "duration_minutes": None
+            }
+            self.data_manager.attendance_log.append(log)
+            self.open_sessions[member_id] = log
+            self.log_ids.add(log['log_id'])
+            self._staged[log['log_id']] = log
+        return "checked_in", member_id, log
+
+    def check_out(self, scan):
+        """Checks a member out, in memory. Call commit() to make it durable.
+
+        Returns:
+            tuple: (result, member_id, log) where result is "checked_out",
+                "not_checked_in" or "not_found"
+        """
+        member_id = self.find_member(scan)
+        if member_id is None:
+            return "not_found", None, None
+
+        with self.data_manager.lock:
+            log = self.open_sessions.pop(member_id, None)
+            if log is None:
+                return "not_checked_in", member_id, None
+
+            check_out_time = get_current_datetime_iso()
+            start = datetime.datetime.fromisoformat(log['check_in_time'])
+            end = datetime.datetime.fromisoformat(check_out_time)
+            log['check_out_time'] = check_out_time
+            log['duration_minutes'] = int((end - start).total_seconds() / 60)
+            self._staged[log['log_id']] = log
+        return "checked_out", member_id, log
+
+    async def process_scan(self, scan, action="check_in"):
+        """Checks a member in or out and waits until the change is durable.
+
+        Callers record latency in self.latency from when the scan arrived
+        (the server does, from reading the request to sending the reply).
+        """
+        if action == "check_out":
+            result = self.check_out(scan)
+        else:
+            result = self.check_in(scan)
+        if result[0] in ("checked_in", "checked_out"):
+            await self.commit()
+        return result
+
+    # ==================== Persistence ====================
+
+    def _take_staged_changes(self):
+        with self.data_manager.lock:
+            staged, self._staged = self._staged, {}
+            return self.data_manager.stage_records(ATTENDANCE_FILE, staged)
+
+    async def commit(self):
+        """Waits until every staged check-in is in the change log on disk.
+
+        Scans arriving while an fsync is in progress are batched into the
+        next one, so throughput is not limited by one fsync per scan.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append(future)
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_loop())
+        await future
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._waiters:
+                await asyncio.sleep(0)  # Let scans that are already queued join this batch
+                waiters, self._waiters = self._waiters, []
+                changes = self._take_staged_changes()
+                try:
+                    await loop.run_in_executor(None, self.data_manager.journal, changes, True)
+                except Exception as e:
+                    for waiter in waiters:
+                        waiter.set_exception(e)
+                    continue
+                self._dirty = self._dirty or bool(changes)
+                for waiter in waiters:
+                    waiter.set_result(None)
+        finally:
+            self._flush_task = None
+
+    def commit_now(self):
+        """Makes staged check-ins durable right away (for callers without an event loop)."""
+        with self.data_manager.lock:
+            staged, self._staged = self._staged, {}
+        if staged:
+            self.data_manager.commit_records(ATTENDANCE_FILE, staged)
+            self._dirty = True
+
+    def commit_in_background(self, callback=None):
+        """Makes staged check-ins durable on a worker thread (for the Tk UI).
+
+        Commits run one at a time in order; checkpoint_in_background queues
+        behind them.
+
+        Args:
+            callback: Optional function called with an exception, or None on
+                success. It runs on the worker thread.
+
+        Returns:
+            Future
+        """
+        with self.data_manager.lock:
+            staged, self._staged = self._staged, {}
+        self._dirty = self._dirty or bool(staged)
+
+        def run():
+            try:
+                if staged:
+                    self.data_manager.commit_records(ATTENDANCE_FILE, staged)
+            except Exception as e:
+                if callback:
+                    callback(e)
+                raise
+            if callback:
+                callback(None)
+
+        return self._worker().submit(run)
+
+    def _worker(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="check-in")
+        return self._executor
+
+    def checkpoint(self):
+        """Rewrites the attendance file if check-ins were journaled since the last one.
+
+        The file is written from a snapshot, so check-ins on other threads
+        carry on while it is serialized. On a worker thread, change events
+        wait for DataManager.deliver_changes on the owning thread.
+        """
+        if self._dirty or self._staged:
+            self.commit_now()
+            self._dirty = False
+            if not self.data_manager.checkpoint(ATTENDANCE_FILE):
+                self._dirty = True  # Other instances' changes to merge first; retry next time
+
+    def checkpoint_in_background(self):
+        """Queues checkpoint() on the worker thread, after any pending commits."""
+        if self._dirty or self._staged:
+            return self._worker().submit(self.checkpoint)
+        return None
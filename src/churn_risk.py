@@ -0,0 +1,256 @@
+import threading
+import weakref
+from datetime import date
+
+MEMBERS_FILE = "members.json"
+PAYMENTS_FILE = "payments_log.json"
+ATTENDANCE_FILE = "attendance_log.json"
+RISK_FILES = (MEMBERS_FILE, PAYMENTS_FILE, ATTENDANCE_FILE)
+
+WINDOW_DAYS = 30            # Frequency and duration look at the last 30 days
+RECENCY_LIMIT_DAYS = 30     # Days since the last visit at which recency risk is full
+TARGET_VISITS = 8           # Visits per window counted as fully engaged (about twice a week)
+TARGET_MINUTES = 60         # Average session length counted as fully engaged
+WEIGHTS = {"recency": 0.4, "frequency": 0.3, "duration": 0.1, "payment": 0.2}
+HIGH_RISK = 60
+MEDIUM_RISK = 35
+
+
+def _day(value):
+    """Day ordinal of an ISO date or datetime string, or None."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def risk_level(score):
+    if score >= HIGH_RISK:
+        return "High"
+    if score >= MEDIUM_RISK:
+        return "Medium"
+    return "Low"
+
+
+class ChurnRiskIndex:
+    """RFM-style churn risk score (0-100) for every member.
+
+    Combines how long ago a member last checked in (recency), how often
+    (frequency) and how long (session duration) they trained in the last
+    WINDOW_DAYS, and whether they have unpaid payments, weighted by
+    WEIGHTS. Higher is riskier.
+
+    The per-member figures are gathered in one pass over attendance and
+    payments and then kept up to date from change events (see
+    DataManager.subscribe), so a check-in only rescores that member.
+    Everyone is rescored once a day, as recency depends on today. When a
+    collection changes without events (a reload or a restore), the index
+    is rebuilt on the next query.
+    """
+
+    def __init__(self):
+        self.members = set()
+        self.last_visit = {}        # Member ID -> day ordinal of latest check-in
+        self.recent_visits = {}     # Member ID -> {log_id: (day ordinal, minutes or None)} within the window
+        self.unpaid = {}            # Member ID -> {payment_id: due day ordinal}
+        self._visit_members = {}    # log_id -> member ID, for check-ins in recent_visits
+        self._window_start = None   # Day ordinal recent_visits starts at
+        self._scores = {}           # Member ID -> score details
+        self._dirty = set()         # Members to rescore
+        self._scored_on = None      # Day the scores are relative to
+        self._versions = None       # Collection versions the index matches
+        self._lock = threading.RLock()
+
+    # ==================== Maintenance ====================
+
+    def rebuild(self, data_source, versions=None, today=None):
+        """Gathers every member's figures from the collections."""
+        today = (today or date.today()).toordinal()
+        with self._lock:
+            self.members = set(data_source.members_db)
+            self.last_visit = {}
+            self.recent_visits = {}
+            self.unpaid = {}
+            self._visit_members = {}
+            self._window_start = today - WINDOW_DAYS + 1
+            days_of = {}  # Date string -> day ordinal; dates repeat a lot
+            for log in data_source.attendance_log:
+                check_in = log.get('check_in_time')
+                if not check_in:
+                    continue
+                day = days_of.get(check_in[:10], False)
+                if day is False:
+                    day = days_of[check_in[:10]] = _day(check_in)
+                if day is not None:
+                    self._add_visit(log['log_id'], log['member_id'], day, log.get('duration_minutes'))
+            for payment in data_source.payments_log:
+                self._set_payment(payment['payment_id'], payment)
+            self._scores = {}
+            self._dirty = set(self.members)
+            self._scored_on = today
+            self._versions = versions
+
+    def sync(self, data_source):
+        """Rebuilds the index if a collection changed without events.
+
+        Sources without ``versions`` are rebuilt on every call.
+        """
+        versions = getattr(data_source, 'versions', None)
+        current = {filename: versions.get(filename, 0) for filename in RISK_FILES} if versions is not None else None
+        with self._lock:
+            if current is None or current != self._versions:
+                self.rebuild(data_source, current)
+
+    def on_records_changed(self, events):
+        """Applies member, payment and attendance change events (subscribed by risk_index_for).
+
+        Events already reflected by a rebuild are skipped; a gap in a
+        collection's versions marks the index for a rebuild.
+        """
+        with self._lock:
+            for event in events:
+                if self._versions is None or event.version <= self._versions[event.collection]:
+                    continue
+                if event.version != self._versions[event.collection] + 1:
+                    self._versions = None
+                    return
+                self._versions[event.collection] = event.version
+
+                if event.collection == MEMBERS_FILE:
+                    if event.record is None:
+                        self.members.discard(event.key)
+                        self._scores.pop(event.key, None)
+                        self._dirty.discard(event.key)
+                    else:
+                        self.members.add(event.key)
+                        self._dirty.add(event.key)
+                elif event.collection == PAYMENTS_FILE:
+                    self._set_payment(event.key, event.record, event.previous)
+                elif self._update_visit(event) is False:
+                    self._versions = None  # Lost the latest visit; recount it
+                    return
+
+    def _add_visit(self, log_id, member_id, day, minutes):
+        if day > self.last_visit.get(member_id, day - 1):
+            self.last_visit[member_id] = day
+        if day >= self._window_start:
+            self.recent_visits.setdefault(member_id, {})[log_id] = (day, minutes)
+            self._visit_members[log_id] = member_id
+        self._dirty.add(member_id)
+
+    def _update_visit(self, event):
+        """Applies one attendance event; False if the index must be rebuilt."""
+        member_id = self._visit_members.pop(event.key, None)
+        if member_id is not None:
+            self.recent_visits[member_id].pop(event.key, None)
+            self._dirty.add(member_id)
+        if event.record is not None:
+            day = _day(event.record.get('check_in_time'))
+            if day is not None:
+                self._add_visit(event.key, event.record['member_id'], day, event.record.get('duration_minutes'))
+
+        # A deleted or moved check-in may have been the member's latest
+        previous = event.previous
+        if previous is not None:
+            member_id = previous['member_id']
+            day = _day(previous.get('check_in_time'))
+            if day is not None and day == self.last_visit.get(member_id):
+                days = [visit_day for visit_day, _ in self.recent_visits.get(member_id, {}).values()]
+                if days:
+                    self.last_visit[member_id] = max(days)
+                elif not (event.record and event.record['member_id'] == member_id
+                          and _day(event.record.get('check_in_time')) == day):
+                    return False  # Their latest visit is now before the window
+        return True
+
+    def _set_payment(self, payment_id, payment, previous=None):
+        if previous is not None:
+            self.unpaid.get(previous['member_id'], {}).pop(payment_id, None)
+            self._dirty.add(previous['member_id'])
+        if payment is not None and payment.get('status') == 'Unpaid':
+            due = _day(payment.get('due_date'))
+            self.unpaid.setdefault(payment['member_id'], {})[payment_id] = due
+            self._dirty.add(payment['member_id'])
+
+    # ==================== Scoring ====================
+
+    def scores(self, today=None):
+        """Returns member ID -> score details, rescoring only members that changed.
+
+        Details are a dict with 'score' (0-100), 'level' ("High", "Medium"
+        or "Low"), 'days_since_visit' (None if never), 'visits' and
+        'avg_minutes' in the window, and 'overdue' and 'unpaid' payment
+        counts. The returned dict is a copy.
+        """
+        today = (today or date.today()).toordinal()
+        with self._lock:
+            if today != self._scored_on:
+                self._start_day(today)
+            for member_id in self._dirty:
+                if member_id in self.members:
+                    self._scores[member_id] = self._score(member_id, today)
+            self._dirty = set()
+            return dict(self._scores)
+
+    def _start_day(self, today):
+        """Moves the window to end today and marks everyone for rescoring."""
+        self._window_start = today - WINDOW_DAYS + 1
+        for member_id, visits in self.recent_visits.items():
+            for log_id in [log_id for log_id, (day, _) in visits.items() if day < self._window_start]:
+                del visits[log_id]
+                del self._visit_members[log_id]
+        self._dirty = set(self.members)
+        self._scored_on = today
+
+    def _score(self, member_id, today):
+        last_visit = self.last_visit.get(member_id)
+        days_since = today - last_visit if last_visit is not None else None
+        recency = 1.0 if days_since is None else min(max(days_since, 0) / RECENCY_LIMIT_DAYS, 1.0)
+
+        visits = [visit for visit in self.recent_visits.get(member_id, {}).values() if visit[0] <= today]
+        frequency = 1.0 - min(len(visits) / TARGET_VISITS, 1.0)
+
+        minutes = [m for _, m in visits if m is not None]
+        avg_minutes = sum(minutes) / len(minutes) if minutes else None
+        if avg_minutes is not None:
+            duration = 1.0 - min(avg_minutes / TARGET_MINUTES, 1.0)
+        else:
+            duration = 0.5 if visits else 1.0  # Never checked out: no signal either way
+
+        dues = self.unpaid.get(member_id, {}).values()
+        overdue = sum(1 for due in dues if due is not None and due < today)
+        payment = 1.0 if overdue else (0.5 if dues else 0.0)
+
+        score = round(100 * (WEIGHTS['recency'] * recency + WEIGHTS['frequency'] * frequency
+                             + WEIGHTS['duration'] * duration + WEIGHTS['payment'] * payment), 1)
+        return {
+            'score': score,
+            'level': risk_level(score),
+            'days_since_visit': days_since,
+            'visits': len(visits),
+            'avg_minutes': round(avg_minutes) if avg_minutes is not None else None,
+            'overdue': overdue,
+            'unpaid': len(dues),
+        }
+
+
+_indexes = weakref.WeakKeyDictionary()
+_indexes_guard = threading.Lock()
+
+
+def risk_index_for(data_source):
+    """Returns an up-to-date ChurnRiskIndex for a data manager (or snapshot).
+
+    An index for a data manager is built once and then maintained from its
+    change events; a snapshot's is built once, since it never changes.
+    """
+    with _indexes_guard:
+        index = _indexes.get(data_source)
+        if index is None:
+            index = _indexes[data_source] = ChurnRiskIndex()
+            if hasattr(data_source, 'subscribe'):
+                data_source.subscribe(index.on_records_changed, set(RISK_FILES))
+    index.sync(data_source)
+    return index
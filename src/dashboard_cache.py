@@ -0,0 +1,123 @@
+import json
+import os
+from datetime import date
+
+from .analytics import (Analytics, ATTENDANCE_FILE, MEMBERS_FILE, MEMBERSHIPS_FILE, PAYMENTS_FILE,
+                        PLANS_FILE, TRAINERS_FILE)
+from .result_cache import cache_for
+
+CACHE_FORMAT = 1
+
+# Series shown on the dashboard: name -> (collections it is computed from, function)
+DASHBOARD_SERIES = {
+    "retention_rate": ((MEMBERSHIPS_FILE,), lambda analytics: analytics.calculate_retention_rate()),
+    "at_risk_members": ((MEMBERSHIPS_FILE, MEMBERS_FILE), lambda analytics: analytics.get_at_risk_members(30)),
+    "revenue_forecast": ((MEMBERSHIPS_FILE, PLANS_FILE, TRAINERS_FILE), lambda analytics: analytics.predict_revenue(6)),
+    "confidence": ((PAYMENTS_FILE, MEMBERSHIPS_FILE), lambda analytics: analytics.calculate_confidence_interval()),
+    "retention_trend": ((MEMBERSHIPS_FILE,), lambda analytics: analytics.get_retention_trend(6)),
+    "historical_revenue": ((PAYMENTS_FILE,), lambda analytics: analytics.get_historical_revenue_trend(6)),
+    "peak_hours": ((ATTENDANCE_FILE,), lambda analytics: analytics.get_peak_hours(7)),
+    "cohort_retention": ((MEMBERS_FILE, MEMBERSHIPS_FILE), lambda analytics: analytics.get_cohort_retention(12)),
+}
+
+
+class DashboardCache:
+    """The dashboard's last computed metrics and chart series, kept on disk.
+
+    Each series is stamped with the date it was computed and the
+    fingerprints (see DataManager.fingerprint) of the collections it is
+    computed from. At launch the dashboard shows the stored values right
+    away and recomputes, in the background, only the series whose stamp
+    no longer matches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.series = {}  # name -> {"stamp": {...}, "value": ...}
+        self.load()
+
+    @classmethod
+    def for_data_manager(cls, data_manager):
+        """Returns the cache kept in the data manager's directory."""
+        data_dir = getattr(data_manager, 'data_dir', 'data')
+        return cls(os.path.join(data_dir, "cache", "dashboard.json"))
+
+    def load(self):
+        """Reads the cache file; a missing or unreadable file gives an empty cache."""
+        self.series = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print(f"Ignoring unreadable dashboard cache {self.path}")
+            return
+        if data.get('format') == CACHE_FORMAT:
+            self.series = data.get('series', {})
+
+    def save(self):
+        """Writes the cache atomically."""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"format": CACHE_FORMAT, "series": self.series}, f)
+        os.replace(temp_path, self.path)
+
+    def values(self):
+        """Returns the last-known value of every stored series."""
+        return {name: entry['value'] for name, entry in self.series.items()}
+
+    def stale_series(self, stamps):
+        """Returns the names of series missing from the cache or computed from older data.
+
+        Args:
+            stamps: Series name -> current stamp (see current_stamps)
+        """
+        return [name for name, stamp in stamps.items()
+                if self.series.get(name, {}).get('stamp') != stamp]
+
+    @staticmethod
+    def current_stamps(data_manager):
+        """Stamps every series with today's date and its collections' fingerprints.
+
+        Take these under ``data_manager.lock`` together with the snapshot
+        the series will be computed from, so stamps and data match.
+        """
+        today = date.today().isoformat()
+        fingerprints = {}
+        stamps = {}
+        for name, (filenames, _) in DASHBOARD_SERIES.items():
+            stamp = {"date": today}
+            for filename in filenames:
+                if filename not in fingerprints:
+                    fingerprints[filename] = data_manager.fingerprint(filename)
+                stamp[filename] = fingerprints[filename]
+            stamps[name] = stamp
+        return stamps
+
+    def refresh(self, data_manager, snapshot, stamps, names):
+        """Recomputes some series from a snapshot and saves the cache.
+
+        Runs on a worker thread: it only reads the snapshot.
+
+        Args:
+            data_manager: Data manager the snapshot was taken from (for its
+                in-memory result cache)
+            snapshot: DataSnapshot taken together with the stamps
+            stamps: Series name -> stamp (see current_stamps)
+            names: Series to recompute
+
+        Returns:
+            dict: Series name -> new value
+        """
+        analytics = Analytics(snapshot, cache=cache_for(data_manager))
+        fresh = {}
+        for name in names:
+            _, compute = DASHBOARD_SERIES[name]
+            fresh[name] = compute(analytics)
+            self.series[name] = {"stamp": stamps[name], "value": fresh[name]}
+        self.save()
+        return fresh
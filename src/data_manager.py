@@ -1,10 +1,53 @@
+import hashlib
 import json
 import os
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Any
+from .change_events import ChangeEvent
+from .change_log import ChangeLog, record_key
+from .data_snapshot import DataSnapshot
+from .file_lock import lock_for
+from .segments import SegmentStore, entry_stamp
+from .utils import generate_unique_id
+
+
+def _record_hash(key, text):
+    """64-bit hash of one saved record; XOR-ed together into a fingerprint."""
+    if text is None:
+        return 0
+    digest = hashlib.blake2b(f"{key}\0{text}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
 
 class DataManager:
-    def __init__(self, data_dir="data"):
+    """Loads, saves and journals the gym's collections.
+    
+    Change records through add_record / update_record / delete_record:
+    they journal just that record, without rewriting the file, and tell
+    subscribers exactly what changed (see subscribe). Mutating a
+    collection directly and calling save_data still works, but costs a
+    diff of the whole collection.
+    
+    Concurrency: the live collections belong to the thread that created
+    the DataManager (the Tk thread, or the server's event loop). Mutations
+    made through DataManager methods hold ``lock``; worker threads read
+    through snapshot() instead of touching the live collections, and
+    listeners are always called on the owning thread (see deliver_changes).
+    Never call save_data while holding ``lock``: writing takes the file
+    lock first.
+    """
+    
+    def __init__(self, data_dir="data", node_id=None):
+        """
+        Args:
+            data_dir: Folder holding the JSON files
+            node_id: Run as one of several nodes sharing data_dir (e.g. a
+                synced folder). Saves then go to this node's own segment
+                instead of rewriting the shared files; see poll_segments.
+        """
         self.data_dir = data_dir
+        self.node_id = node_id
         self.members_db: Dict[str, Dict] = {}
         self.trainers_db: Dict[str, Dict] = {}
         self.plans_db: Dict[str, Dict] = {}
@@ -13,6 +56,24 @@ class DataManager:
         self.attendance_log: List[Dict] = []
         self.visitors_log: List[Dict] = []
         
+        # Bytes of each file as last read or written, used for cheap snapshots
+        self._saved_bytes: Dict[str, bytes] = {}
+        
+        # Serialized form of every record as last saved, used to log what changed
+        self._saved_records: Dict[str, Dict[str, str]] = {}
+        self._init_concurrency()
+        
+        # Nodes keep a private change log; the segments are what they share
+        self.segments = None
+        self._versions = {}  # (filename, key) -> entry_stamp of the winning segment entry
+        if node_id:
+            self.segments = SegmentStore(os.path.join(data_dir, "segments"), node_id)
+            self.change_log = ChangeLog(os.path.join(data_dir, "changelog", node_id, "changes.jsonl"))
+        else:
+            self.change_log = ChangeLog(os.path.join(data_dir, "changelog", "changes.jsonl"))
+        
+        self._recovered = False
+        
         self.files = {
             "members.json": "members_db",
             "trainers.json": "trainers_db",
@@ -26,26 +87,106 @@ class DataManager:
         self.ensure_data_dir()
         self.load_all_data()
 
+    def _init_concurrency(self):
+        """Sets up the writer lock, snapshot copies and change listeners."""
+        # Writer lock held by every mutation made through DataManager
+        self.lock = threading.RLock()
+        self._owner_thread = threading.current_thread()
+        
+        # Copy-on-write copies of the saved records handed out by snapshot().
+        # Published collections are never modified; changes saved since the
+        # last publish wait in _frozen_pending as serialized text.
+        self._frozen = {}          # filename -> published dict or list
+        self._frozen_records = {}  # filename -> {key: record} behind it
+        self._frozen_pending = {}  # filename -> {key: text, or None if deleted}
+        self._frozen_source = {}   # filename -> file bytes to build the first copy from
+        self.version = 0           # Bumped on every saved change
+        self.versions = {}         # filename -> version of that collection
+        self._fingerprints = {}    # filename -> content hash, computed on first use
+        self._unwritten = set()    # Files with saved changes not yet written to them
+        
+        # Callbacks told which records changed when files are reloaded from disk
+        self._listeners = []
+        self._deferred_changes = {}  # Changes made on worker threads, for deliver_changes
+        
+        # Typed change events for every saved change (see subscribe)
+        self._subscribers = []
+        self._pending_events = []
+        self._deferred_events = []
+        
+        # Open batch() of mutations: depth, staged change tuples and previous texts
+        self._batch_depth = 0
+        self._batch_changes = []
+        self._batch_previous = {}
+
     def ensure_data_dir(self):
         """Ensures the data directory exists."""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
     def load_all_data(self):
-        """Loads all data from JSON files."""
+        """Loads all data from JSON files.
+        
+        When reloading (e.g. after a restore), differences from the previously
+        saved state are written to the change log like any other edit.
+        """
+        with self.lock:
+            self._load_files()
+        
+        # Nodes get their journaled changes back from the segments instead
+        if not self._recovered and not self.segments:
+            self._recovered = True
+            self._recover_journaled_changes()
+        
+        if self.segments:
+            self.poll_segments(notify=False)
+
+    def _load_files(self):
         for filename, attr_name in self.files.items():
             filepath = os.path.join(self.data_dir, filename)
             if os.path.exists(filepath):
                 try:
-                    with open(filepath, 'r') as f:
-                        setattr(self, attr_name, json.load(f))
-                except json.JSONDecodeError:
+                    with open(filepath, 'rb') as f:
+                        raw = f.read()
+                    data = json.loads(raw)
+                    setattr(self, attr_name, data)
+                    self._saved_bytes[filename] = raw
+                    if filename in self._saved_records:
+                        self._log_changes(filename, data)
+                        self.change_log.write_checkpoints({filename: self.change_log.last_seq})
+                    else:
+                        self._reset_saved(filename, self._serialize_records(filename, data), source=raw)
+                    self._unwritten.discard(filename)
+                except (json.JSONDecodeError, UnicodeDecodeError):
                     print(f"Error decoding {filename}, initializing empty.")
                     self._initialize_empty(attr_name)
             else:
                 self._initialize_empty(attr_name)
                 self.save_data(filename) # Create the file
 
+    def _recover_journaled_changes(self):
+        """Replays changes that were journaled but never written to their file.
+        
+        commit_records and the mutation methods log changes without
+        rewriting the file; if the app stopped before the next save, the
+        change log still has them.
+        """
+        # A file with no checkpoint yet has none of its logged changes
+        checkpoints = self.change_log.read_checkpoints()
+        after_seq = min(checkpoints.get(filename, 0) for filename in self.files)
+        
+        pending = [
+            entry for entry in self.change_log.iter_entries(after_seq=after_seq)
+            if entry['file'] in self.files and entry['seq'] > checkpoints.get(entry['file'], 0)
+        ]
+        touched = self.apply_record_changes(pending, save=False)
+        for filename in touched:
+            data = getattr(self, self.files[filename])
+            self._reset_saved(filename, self._serialize_records(filename, data))
+            self.save_data(filename)
+        if touched:
+            print(f"Recovered {len(pending)} unsaved changes from the change log.")
+
     def _initialize_empty(self, attr_name):
         """Initializes the attribute with an empty list or dict based on type."""
         if attr_name in ["members_db", "trainers_db", "plans_db"]:
@@ -59,19 +200,806 @@ class DataManager:
             self.save_data(filename)
 
     def save_data(self, filename):
-        """Saves a specific data structure to its JSON file."""
-        attr_name = self.files[filename]
-        data = getattr(self, attr_name)
+        """Saves a specific data structure to its JSON file.
+        
+        Records that changed since the last save are appended to the change
+        log first, so every saved state can be reconstructed later.
+        
+        Other app instances may share the data directory: changes they
+        logged are merged in first (see catch_up), and the file is replaced
+        atomically under a lock, so no instance overwrites another's records.
+        
+        In node mode only the changes are written, to this node's segment;
+        the shared file is left alone so nodes never overwrite each other.
+        """
+        with self.lock:
+            if not self.segments:
+                self.catch_up()
+            self._log_changes(filename, getattr(self, self.files[filename]))
+        if not self.segments:
+            self.checkpoint(filename)
+        self._dispatch_events()
+
+    def checkpoint(self, filename):
+        """Rewrites a file with its saved records, without diffing the live collection.
+        
+        Use this when every change is already journaled (e.g. by
+        commit_records). The file is serialized from a snapshot outside the
+        writer lock, so it can run on a worker thread without holding up
+        the UI.
+        
+        Only the owning thread merges what other instances logged (see
+        catch_up), as that changes the live collections. On a worker
+        thread, the file is left for the next save when there is anything
+        to merge, so it never goes backwards.
+        
+        Returns:
+            bool: Whether the file was written
+        """
         filepath = os.path.join(self.data_dir, filename)
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=4)
+        with lock_for(os.path.join(self.data_dir, "locks", filename + ".lock")):
+            with self.lock:
+                if threading.current_thread() is self._owner_thread:
+                    # Anything logged since is written too, so the file never goes backwards
+                    self.catch_up()
+                elif self.change_log.has_unread():
+                    return False
+                collection = self._publish(filename)
+                seq = self.change_log.last_seq
+                self._unwritten.discard(filename)
+            raw = json.dumps(collection, indent=4).encode()
+            temp_path = filepath + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(raw)
+            os.replace(temp_path, filepath)
+            self.change_log.write_checkpoints({filename: seq})
+        self._saved_bytes[filename] = raw
+        return True
+
+    def checkpoint_unwritten(self):
+        """Checkpoints every file with saved changes not yet written to it.
+        
+        Returns:
+            set: Filenames written
+        """
+        with self.lock:
+            filenames = set(self._unwritten)
+        return {filename for filename in filenames if self.checkpoint(filename)}
+
+    def catch_up(self, notify=True):
+        """Merges records other app instances sharing the data directory changed.
+        
+        They log every change to the shared change log, so this reads only
+        what was appended since the last look; when nothing was, it costs a
+        single stat. A record this instance changed but has not saved yet
+        keeps the local edit, which is then logged after (and so wins over)
+        the other instance's.
+        
+        Args:
+            notify: Tell listeners what changed (as reload_changed does)
+        
+        Returns:
+            dict: Filename -> set of changed record keys
+        """
+        with self.lock:
+            merged = self._merge_logged(self.change_log.read_new())
+        if merged and notify:
+            self._notify(merged)
+        return merged
+
+    def _merge_logged(self, entries):
+        latest = {}
+        for entry in entries:
+            if entry['file'] in self.files:
+                latest[(entry['file'], entry['key'])] = entry
+        
+        live_by_file = {}
+        apply = []
+        merged = {}
+        for (filename, key), entry in latest.items():
+            saved = self._saved_records.setdefault(filename, {})
+            text = json.dumps(entry['record'], sort_keys=True) if entry['op'] == "put" else None
+            if saved.get(key) == text:
+                continue  # Already have it
+            if filename not in live_by_file:
+                live_by_file[filename] = self._index(filename, getattr(self, self.files[filename]))
+            live = live_by_file[filename].get(key)
+            local_edit = (json.dumps(live, sort_keys=True) if live is not None else None) != saved.get(key)
+            
+            self._set_saved(filename, key, text)
+            if not local_edit:
+                apply.append(entry)
+                merged.setdefault(filename, set()).add(key)
+        
+        self.apply_record_changes(apply, save=False, notify=False)
+        return merged
+
+    def stage_records(self, filename, records):
+        """Marks changed records as saved and returns their change log entries.
+        
+        The change log is append-only, so this costs the same however large
+        the collection is. The file catches up on the next save_data; until
+        then the entries are replayed on startup if needed. Callers that
+        batch several operations should stage them together and let
+        ``journal(changes, fsync=True)`` make the batch durable.
+        
+        Args:
+            filename: Data file the records belong to
+            records: Dict of record key -> record (already updated in the
+                live collection)
+        
+        Returns:
+            list: Change tuples for ChangeLog.append
+        """
+        with self.lock:
+            saved = self._saved_records.setdefault(filename, {})
+            changes = []
+            for key, record in records.items():
+                text = json.dumps(record, sort_keys=True)
+                if saved.get(key) != text:
+                    self._set_saved(filename, key, text)
+                    changes.append((filename, "put", key, text))
+            self._dispatch_events()
+            return changes
+
+    def commit_records(self, filename, records):
+        """Makes changed records durable through the change log, without rewriting the file.
+        
+        Args:
+            filename: Data file the records belong to
+            records: Dict of record key -> record (see stage_records)
+        """
+        changes = self.stage_records(filename, records)
+        self.journal(changes, fsync=True)
+        self._dispatch_events()
+
+    def journal(self, changes, fsync=False):
+        """Appends changes to the change log and, in node mode, to this node's segment.
+        
+        Args:
+            changes: List of (filename, op, key, record_json) tuples
+            fsync: Force the write to disk before returning
+        """
+        self.change_log.append(changes, fsync=fsync)
+        if self.segments:
+            for entry in self.segments.append(changes, fsync=fsync):
+                self._versions[(entry['file'], entry['key'])] = entry_stamp(entry)
+
+    def sync_journal(self):
+        """Forces changes journaled without fsync to disk.
+        
+        Lets the owning thread journal in order and leave the slow fsync
+        to a worker.
+        """
+        self.change_log.sync()
+        if self.segments:
+            self.segments.sync()
+
+    def poll_segments(self, notify=True):
+        """Merges changes other nodes appended to their segments since the last poll.
+        
+        Each record takes the value of its newest entry (by timestamp, then
+        node ID and seq), whichever node wrote it and whatever order the
+        segments are read in, so every node ends up with the same records.
+        Only the new bytes of each segment are read, so polling often is cheap.
+        
+        Args:
+            notify: Tell listeners what changed (as reload_changed does)
+        
+        Returns:
+            dict: Filename -> set of changed record keys
+        """
+        if self.segments is None:
+            return {}
+        
+        with self.lock:
+            merged = self._merge_segment_entries(self.segments.poll())
+        if merged and notify:
+            self._notify(merged)
+        return merged
+
+    def _merge_segment_entries(self, entries):
+        winners = {}
+        for entry in entries:
+            if entry['file'] not in self.files:
+                continue
+            version_key = (entry['file'], entry['key'])
+            stamp = entry_stamp(entry)
+            if stamp <= self._versions.get(version_key, ()):
+                continue  # Older than what we have (or our own change)
+            self._versions[version_key] = stamp
+            winners[version_key] = entry
+        if not winners:
+            return {}
+        
+        self.apply_record_changes(winners.values(), save=False, notify=False)
+        merged = {}
+        changes = []
+        for (filename, key), entry in winners.items():
+            text = json.dumps(entry['record'], sort_keys=True) if entry['op'] == "put" else None
+            self._set_saved(filename, key, text)
+            changes.append((filename, entry['op'], key, text))
+            merged.setdefault(filename, set()).add(key)
+        # Keep this node's change log a complete history for point-in-time restores
+        self.change_log.append(changes)
+        return merged
+
+    @property
+    def snapshot_seq(self):
+        """Change log seq that serialize_snapshot() is guaranteed to include.
+        
+        Pass this as ``log_seq`` when backing up a snapshot. Replaying from it
+        may re-apply a few entries a file already has, which is harmless.
+        """
+        if self.segments:
+            return self.change_log.last_seq
+        checkpoints = self.change_log.read_checkpoints()
+        seqs = [checkpoints.get(filename, 0) for filename in self._saved_bytes]
+        return min(seqs) if seqs else self.change_log.last_seq
+
+    def _serialize_records(self, filename, data):
+        """Serializes each record of a collection, keyed by record ID.
+        
+        Records sharing an ID are dropped from the live collection first
+        (see _drop_duplicate_keys), as the file can only hold one of them.
+        """
+        self._drop_duplicate_keys(filename, data)
+        if isinstance(data, dict):
+            items = data.items()
+        else:
+            items = ((record_key(filename, record, i), record) for i, record in enumerate(data))
+        return {key: json.dumps(record, sort_keys=True) for key, record in items}
+
+    def _drop_duplicate_keys(self, filename, data):
+        """Keeps one record per ID in a list collection, in place.
+        
+        Files are written from records keyed by ID, so a second record with
+        the same ID would be lost from disk while staying in memory. The
+        last one is kept, at the first one's position, as the file has it.
+        """
+        if isinstance(data, dict):
+            return
+        records = self._index(filename, data)
+        if len(records) == len(data):
+            return
+        print(f"Dropped {len(data) - len(records)} records with a duplicate ID from {filename}.")
+        data[:] = list(records.values())
+
+    def _log_changes(self, filename, data):
+        """Diffs a collection against its last saved state and logs the changes."""
+        current = self._serialize_records(filename, data)
+        previous = self._saved_records.get(filename, {})
+        
+        changes = [(filename, "put", key, text) for key, text in current.items() if previous.get(key) != text]
+        changes.extend((filename, "del", key, None) for key in previous if key not in current)
+        
+        self.journal(changes)
+        for _, _, key, text in changes:
+            self._set_saved(filename, key, text)
+
+    def add_listener(self, callback):
+        """Registers a callback for reload_changed and apply_record_changes.
+        
+        The callback receives a dict of filename -> set of changed record keys.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def reload_changed(self):
+        """Reloads only what changed on disk since the last save (e.g. after a restore).
+        
+        Files whose bytes are unchanged since this instance wrote or read
+        them are not parsed at all, unless records were changed since
+        without rewriting the file (see add_record). For the rest,
+        only records that differ are swapped into the live collections;
+        untouched records stay the same objects, so anything holding them
+        stays valid. Listeners are then told exactly what changed.
+        
+        Returns:
+            dict: Filename -> set of changed (added, modified or removed) record keys
+        """
+        reloaded = {}
+        for filename, attr_name in self.files.items():
+            filepath = os.path.join(self.data_dir, filename)
+            if not os.path.exists(filepath):
+                continue
+            
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+            if raw == self._saved_bytes.get(filename) and filename not in self._unwritten:
+                continue
+            
+            try:
+                data = json.loads(raw)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                print(f"Error decoding {filename}, keeping loaded data.")
+                continue
+            self._drop_duplicate_keys(filename, data)
+            
+            with self.lock:
+                changed, removed = self._diff_live(filename, attr_name, data)
+                self._log_record_changes(filename, data, changed, removed)
+                self._apply_changes(filename, attr_name, data, changed)
+                self._saved_bytes[filename] = raw
+                self._unwritten.discard(filename)
+            self.change_log.write_checkpoints({filename: self.change_log.last_seq})
+            
+            if changed or removed:
+                reloaded[filename] = changed | removed
+        
+        if reloaded:
+            self._notify(reloaded)
+        return reloaded
+
+    def _diff_live(self, filename, attr_name, data):
+        """Compares freshly loaded records with the live ones (which match the last save).
+        
+        Returns:
+            tuple: (changed: set of keys added or modified, removed: set of keys)
+        """
+        live = self._index(filename, getattr(self, attr_name))
+        loaded = self._index(filename, data)
+        changed = {key for key, record in loaded.items() if live.get(key) != record}
+        removed = {key for key in live if key not in loaded}
+        return changed, removed
+
+    def _index(self, filename, data):
+        if isinstance(data, dict):
+            return data
+        return {record_key(filename, record, i): record for i, record in enumerate(data)}
+
+    def _log_record_changes(self, filename, data, changed, removed):
+        """Logs already-diffed changes, serializing only the changed records."""
+        loaded = self._index(filename, data)
+        changes = []
+        for key in changed:
+            text = json.dumps(loaded[key], sort_keys=True)
+            self._set_saved(filename, key, text)
+            changes.append((filename, "put", key, text))
+        for key in removed:
+            self._set_saved(filename, key, None)
+            changes.append((filename, "del", key, None))
+        self.journal(changes)
+
+    def _apply_changes(self, filename, attr_name, data, changed):
+        """Swaps changed records from freshly loaded data into a live collection."""
+        live = getattr(self, attr_name)
+        if isinstance(data, dict) and isinstance(live, dict):
+            for key in [key for key in live if key not in data]:
+                del live[key]
+            for key in changed:
+                live[key] = data[key]
+        elif isinstance(data, list) and isinstance(live, list):
+            existing = {record_key(filename, record, i): record for i, record in enumerate(live)}
+            merged = []
+            for i, record in enumerate(data):
+                key = record_key(filename, record, i)
+                merged.append(record if key in changed or key not in existing else existing[key])
+            live[:] = merged
+        else:
+            setattr(self, attr_name, data)
+
+    def apply_record_changes(self, entries, save=True, notify=True):
+        """Applies record-level changes (e.g. sent by a remote client).
+        
+        Each entry replaces or removes one record, so changes to different
+        records from different clients never overwrite each other. Listeners
+        are notified as for reload_changed.
+        
+        Args:
+            entries: Iterable of dicts with file, op ("put"/"del"), key and record
+            save: Save the touched files afterwards (default: True)
+            notify: Tell listeners what changed (default: True)
+        
+        Returns:
+            set: Filenames that were changed
+        """
+        with self.lock:
+            touched = self._apply_entries(entries)
+        
+        if save:
+            for filename in touched:
+                self.save_data(filename)
+        if touched and notify:
+            self._notify(touched)
+        return set(touched)
+
+    def stage_record_changes(self, entries):
+        """Applies record-level changes in memory and marks them saved, writing nothing.
+        
+        Nothing is rewritten, so this costs the same however large the
+        collections are; ``journal`` the returned changes to make them
+        durable and let checkpoint() bring the files up to date later.
+        Listeners are notified as for apply_record_changes.
+        
+        Args:
+            entries: Iterable of dicts with file, op ("put"/"del"), key and record
+        
+        Returns:
+            list: Change tuples for ChangeLog.append
+        """
+        entries = [entry for entry in entries if entry['file'] in self.files]
+        with self.lock:
+            touched = self._apply_entries(entries)
+            changes = []
+            for entry in entries:
+                text = json.dumps(entry['record'], sort_keys=True) if entry['op'] == "put" else None
+                if self._saved_records.get(entry['file'], {}).get(entry['key']) != text:
+                    self._set_saved(entry['file'], entry['key'], text)
+                    changes.append((entry['file'], entry['op'], entry['key'], text))
+        if touched:
+            self._notify(touched)
+        return changes
+
+    def _apply_entries(self, entries):
+        touched = {}
+        positions = {}
+        for entry in entries:
+            filename = entry['file']
+            if filename not in self.files:
+                continue
+            collection = getattr(self, self.files[filename])
+            key = entry['key']
+            
+            if isinstance(collection, dict):
+                if entry['op'] == "put":
+                    collection[key] = entry['record']
+                else:
+                    collection.pop(key, None)
+            else:
+                if filename not in positions:
+                    positions[filename] = {record_key(filename, record, i): i for i, record in enumerate(collection)}
+                index = positions[filename]
+                if entry['op'] == "put":
+                    if key in index:
+                        collection[index[key]] = entry['record']
+                    else:
+                        index[key] = len(collection)
+                        collection.append(entry['record'])
+                elif key in index:
+                    del collection[index.pop(key)]
+                    positions.pop(filename)  # Positions shifted; rebuild on next use
+            touched.setdefault(filename, set()).add(key)
+        return touched
+
+    def serialize_snapshot(self):
+        """Returns the serialized contents of every collection as last saved.
+        
+        The collections come from snapshot(), so the bytes can be built on a
+        background worker while the UI keeps mutating the live collections.
+        They include changes only journaled so far (add_record,
+        commit_records, ...), which the files on disk lack until their next
+        checkpoint; in node mode the files also lag behind the segments.
+        
+        Every change in the snapshot is already in the change log, so
+        ``snapshot_seq`` read at the same time marks where replay should
+        start when restoring from it.
+        
+        Returns:
+            dict: Filename -> JSON bytes
+        """
+        snapshot = self.snapshot()
+        return {filename: json.dumps(getattr(snapshot, attr_name), indent=4).encode()
+                for filename, attr_name in self.files.items()}
+
+    # ==================== Snapshots ====================
+
+    def snapshot(self):
+        """Returns a read-only DataSnapshot of every collection as last saved.
+        
+        Collections are copied on write: a collection with no saved changes
+        since the previous snapshot is shared with it, so taking a snapshot
+        costs almost nothing when little changed. Safe to call from any
+        thread; changes not yet saved are not included.
+        """
+        with self.lock:
+            collections = {filename: self._publish(filename) for filename in self.files}
+            return DataSnapshot(collections, self.files, self.version, dict(self.versions))
+
+    def _publish(self, filename):
+        """Returns the current frozen copy of a collection (lock held)."""
+        pending = self._frozen_pending.pop(filename, None)
+        if filename in self._frozen and not pending:
+            return self._frozen[filename]
+        
+        records = self._frozen_records.get(filename)
+        if records is not None:
+            records = dict(records)
+        elif self._frozen_source.get(filename) is not None:
+            records = dict(self._index(filename, json.loads(self._frozen_source.pop(filename))))
+        else:
+            records = {key: json.loads(text) for key, text in self._saved_records.get(filename, {}).items()}
+        for key, text in (pending or {}).items():
+            if text is None:
+                records.pop(key, None)
+            else:
+                records[key] = json.loads(text)
+        
+        self._frozen_records[filename] = records
+        is_dict = isinstance(getattr(self, self.files[filename]), dict)
+        self._frozen[filename] = records if is_dict else list(records.values())
+        return self._frozen[filename]
+
+    def _set_saved(self, filename, key, text):
+        """Records the saved state of one record (text None when deleted)."""
+        saved = self._saved_records.setdefault(filename, {})
+        previous = saved.get(key)
+        if previous == text:
+            return
+        if text is None:
+            saved.pop(key, None)
+        else:
+            saved[key] = text
+        if filename in self._fingerprints:
+            self._fingerprints[filename] ^= _record_hash(key, previous) ^ _record_hash(key, text)
+        self._frozen_pending.setdefault(filename, {})[key] = text
+        self._unwritten.add(filename)
+        self.version += 1
+        self.versions[filename] = self.versions.get(filename, 0) + 1
+        if self._subscribers:
+            self._pending_events.append(ChangeEvent(filename, key, text, previous, self.versions[filename]))
+
+    def fingerprint(self, filename):
+        """Returns a hash of a collection's saved records, stable across restarts.
+        
+        Unlike ``versions``, which restart at 0 every launch, the
+        fingerprint only depends on the records, so it can stamp results
+        persisted to disk. It is computed once and then kept up to date as
+        records are saved, at O(1) per change.
+        """
+        with self.lock:
+            if filename not in self._fingerprints:
+                value = 0
+                for key, text in self._saved_records.get(filename, {}).items():
+                    value ^= _record_hash(key, text)
+                self._fingerprints[filename] = value
+            return format(self._fingerprints[filename], "016x")
+
+    def _reset_saved(self, filename, texts, source=None):
+        """Replaces the saved state of a whole collection.
+        
+        Args:
+            texts: Dict of record key -> serialized record
+            source: File bytes the texts came from, to build snapshots from
+        """
+        self._saved_records[filename] = texts
+        for cache in (self._frozen, self._frozen_records, self._frozen_pending, self._fingerprints):
+            cache.pop(filename, None)
+        self._frozen_source[filename] = source
+        self.version += 1
+        self.versions[filename] = self.versions.get(filename, 0) + 1
+
+    # ==================== Change notification ====================
+
+    def _notify(self, changes):
+        """Tells listeners what changed, on the thread that owns the collections.
+        
+        Changes made on other threads are queued until deliver_changes().
+        """
+        self._dispatch_events()
+        if threading.current_thread() is self._owner_thread:
+            for callback in list(self._listeners):
+                callback(changes)
+            return
+        with self.lock:
+            for filename, keys in changes.items():
+                self._deferred_changes.setdefault(filename, set()).update(keys)
+
+    def deliver_changes(self):
+        """Notifies listeners and subscribers of changes queued by worker threads.
+        
+        Call on the owning thread.
+        """
+        with self.lock:
+            changes, self._deferred_changes = self._deferred_changes, {}
+            events, self._deferred_events = self._deferred_events, []
+        if events:
+            self._send_events(events)
+        if changes:
+            self._notify(changes)
+        return changes
+
+    def subscribe(self, callback, collections=None):
+        """Registers a callback for typed change events.
+        
+        The callback receives a list of ChangeEvents, one batch per
+        operation, for every saved change: mutations, save_data, check-ins,
+        and changes merged from other instances, nodes or a restore. It is
+        called on the thread that owns the collections, so indexes and
+        views can update just the records named instead of rebuilding.
+        
+        Args:
+            callback: Function taking a list of ChangeEvents
+            collections: Optional set of filenames to receive events for
+        """
+        self._subscribers.append((callback, set(collections) if collections else None))
+
+    def unsubscribe(self, callback):
+        self._subscribers = [(cb, files) for cb, files in self._subscribers if cb != callback]
+
+    def _dispatch_events(self):
+        """Sends pending events now (on the owning thread) or queues them."""
+        with self.lock:
+            events, self._pending_events = self._pending_events, []
+            if events and threading.current_thread() is not self._owner_thread:
+                self._deferred_events.extend(events)
+                return
+        if events:
+            self._send_events(events)
+
+    def _send_events(self, events):
+        for callback, collections in list(self._subscribers):
+            if collections is not None:
+                selected = [event for event in events if event.collection in collections]
+            else:
+                selected = events
+            if selected:
+                callback(selected)
+
+    # ==================== Mutations ====================
+
+    def find_record(self, filename, key):
+        """Returns the live record with the given key, or None."""
+        collection = getattr(self, self.files[filename])
+        if isinstance(collection, dict):
+            return collection.get(key)
+        for i, record in enumerate(collection):
+            if record_key(filename, record, i) == key:
+                return record
+        return None
+
+    def new_key(self, filename, prefix, taken=()):
+        """Returns a new record ID with the given prefix that no record uses yet.
+        
+        generate_unique_id has only 24 random bits, so in a large
+        collection a fresh ID can collide with an existing one; this keeps
+        drawing until it finds a free one.
+        
+        Args:
+            filename: Data file of the collection
+            prefix: ID prefix (e.g. "A" for attendance)
+            taken: More keys to avoid, e.g. records not saved yet
+        
+        Returns:
+            str: Record ID
+        """
+        with self.lock:
+            saved = self._saved_records.get(filename, {})
+            collection = getattr(self, self.files[filename])
+            while True:
+                key = generate_unique_id(prefix)
+                if key not in saved and key not in taken and not (isinstance(collection, dict) and key in collection):
+                    return key
+
+    def add_record(self, filename, record, key=None):
+        """Adds a record and makes it durable.
+        
+        Args:
+            filename: Data file of the collection (e.g. "payments_log.json")
+            record: The new record
+            key: Record ID; required for members, trainers and plans, taken
+                from the record's ID field for the other collections. Use
+                new_key to get an unused one.
+        
+        Returns:
+            str: The record's key
+        
+        Raises:
+            ValueError: If the key is missing or another record already has it
+        """
+        with self.lock:
+            collection = getattr(self, self.files[filename])
+            if isinstance(collection, dict):
+                if key is None:
+                    raise ValueError(f"A key is required to add to {filename}")
+            else:
+                key = record_key(filename, record, len(collection))
+            if key in self._saved_records.get(filename, {}) or (isinstance(collection, dict) and key in collection):
+                raise ValueError(f"{filename} already has a record {key}")
+            if isinstance(collection, dict):
+                collection[key] = record
+            else:
+                collection.append(record)
+            self._stage_change(filename, key, record)
+        self._commit_mutations()
+        return key
+
+    def update_record(self, filename, key, fields=None):
+        """Updates a record in place and makes the change durable.
+        
+        Args:
+            filename: Data file of the collection
+            key: Record ID
+            fields: Dict of fields to set; omit if the record was already
+                changed in place and only needs saving
+        
+        Returns:
+            dict or None: The updated record, or None if there is no such record
+        """
+        with self.lock:
+            record = self.find_record(filename, key)
+            if record is None:
+                return None
+            if fields:
+                record.update(fields)
+            self._stage_change(filename, key, record)
+        self._commit_mutations()
+        return record
+
+    def delete_record(self, filename, key):
+        """Removes a record and makes the deletion durable.
+        
+        Returns:
+            dict or None: The removed record, or None if there is no such record
+        """
+        with self.lock:
+            collection = getattr(self, self.files[filename])
+            if isinstance(collection, dict):
+                record = collection.pop(key, None)
+            else:
+                record = self.find_record(filename, key)
+                if record is not None:
+                    collection.remove(record)
+            if record is None:
+                return None
+            self._stage_change(filename, key, None)
+        self._commit_mutations()
+        return record
+
+    @contextmanager
+    def batch(self):
+        """Groups several mutations into one journal write, made at the end.
+        
+        Subscribers get one batch of events for the whole group.
+        """
+        with self.lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self._batch_depth -= 1
+            self._commit_mutations()
+
+    def _stage_change(self, filename, key, record):
+        """Marks one mutated record as saved and queues its change (lock held)."""
+        text = json.dumps(record, sort_keys=True) if record is not None else None
+        previous = self._saved_records.get(filename, {}).get(key)
+        if previous == text:
+            return
+        self._batch_previous.setdefault((filename, key), previous)
+        self._set_saved(filename, key, text)
+        self._batch_changes.append((filename, "put" if text is not None else "del", key, text))
+
+    def _commit_mutations(self):
+        """Persists staged mutations unless a batch is still open."""
+        with self.lock:
+            if self._batch_depth:
+                return
+            changes, self._batch_changes = self._batch_changes, []
+            previous, self._batch_previous = self._batch_previous, {}
+        if changes:
+            self._persist_changes(changes, previous)
+        self._dispatch_events()
+
+    def _persist_changes(self, changes, previous):
+        """Makes mutated records durable through the change log (as commit_records does).
+        
+        Args:
+            changes: Change tuples (see ChangeLog.append)
+            previous: (filename, key) -> serialized record before the
+                mutations, for subclasses that may need to roll back
+        """
+        self.journal(changes, fsync=True)
 
     def get_member(self, member_id):
         return self.members_db.get(member_id)
 
     def add_member(self, member_id, member_data):
-        self.members_db[member_id] = member_data
-        self.save_data("members.json")
+        self.add_record("members.json", member_data, key=member_id)
     
     def get_plan(self, plan_id):
         return self.plans_db.get(plan_id)
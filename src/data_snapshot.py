@@ -0,0 +1,29 @@
+class DataSnapshot:
+    """Read-only view of every collection as of one moment.
+
+    Has the same collection attributes as DataManager (members_db,
+    payments_log, ...), so anything that only reads them, like Analytics,
+    can be given a snapshot instead and run on a worker thread while the
+    UI keeps changing the live data. Collections and records in a
+    snapshot are never modified afterwards; treat them as read-only.
+
+    Attributes:
+        version: DataManager.version the snapshot was taken at
+        versions: Filename -> version of that collection
+    """
+
+    def __init__(self, collections, files, version, versions):
+        self.files = files
+        self.version = version
+        self.versions = versions
+        for filename, attr_name in files.items():
+            setattr(self, attr_name, collections[filename])
+
+    def get_member(self, member_id):
+        return self.members_db.get(member_id)
+
+    def get_plan(self, plan_id):
+        return self.plans_db.get(plan_id)
+
+    def get_trainer(self, trainer_id):
+        return self.trainers_db.get(trainer_id)
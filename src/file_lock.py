@@ -0,0 +1,67 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only coordinate threads of one process
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock shared by the threads of this process and, through an
+    advisory fcntl lock on a lock file, by other processes.
+
+    The lock is re-entrant: a thread already holding it can take it again
+    (the lock file is only locked once). Use lock_for() so every user of a
+    path in this process shares one FileLock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth > 1 or fcntl is None:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._depth -= 1
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def lock_for(path):
+    """Returns the FileLock for a lock file path, shared within this process."""
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), FileLock(path))
@@ -1,9 +1,19 @@
+import argparse
+import os
 import customtkinter as ctk
 from src.app import App
 from src.auth_manager import AuthManager
 from src.ui.login import show_login_dialog
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gym Management System")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--server", help="Run as a thin client against a server, e.g. http://192.168.1.10:8765")
+    mode.add_argument("--node", help="Run as a named node sharing the data folder with other nodes (e.g. through a synced folder)")
+    parser.add_argument("--token", default=os.environ.get("GYM_SERVER_TOKEN"),
+                        help="API token the server prints on first start (default: $GYM_SERVER_TOKEN)")
+    args = parser.parse_args()
+    
     # Set appearance mode
     ctk.set_appearance_mode("dark")
     ctk.set_default_color_theme("blue")
@@ -24,7 +34,7 @@ if __name__ == "__main__":
         
         if login_success:
             # Create and run main app
-            app = App(auth_manager)
+            app = App(auth_manager, server_url=args.server, node_id=args.node, token=args.token)
             app.mainloop()
             
             # After app closes, check if we should exit or loop back
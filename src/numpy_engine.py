@@ -0,0 +1,252 @@
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # Optional: Analytics falls back to the pure-Python path
+    np = None
+
+MEMBERS_FILE = "members.json"
+MEMBERSHIPS_FILE = "membership_history.json"
+PAYMENTS_FILE = "payments_log.json"
+ATTENDANCE_FILE = "attendance_log.json"
+
+DAY_US = 86400 * 1000000
+NO_TIME = -(2 ** 63)  # Below any timestamp
+
+
+def numpy_available():
+    return np is not None
+
+
+def _to_us(moment):
+    """Microseconds since 0001-01-01 for a naive datetime (exact, unlike floats)."""
+    return (moment.toordinal() * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second) \
+        * 1000000 + moment.microsecond
+
+
+def _month_label(code):
+    return datetime(code // 12, code % 12 + 1, 1).strftime("%b %Y")
+
+
+class NumpyEngine:
+    """Vectorized versions of the Analytics computations.
+
+    Memberships, payments and attendance are converted once into NumPy
+    arrays: dates as int64 microseconds (exact, so boundary comparisons
+    match the pure-Python path), amounts as float64, and member and
+    status values as int codes. The arrays are rebuilt only when the
+    collection's version changes (every call, for sources without
+    ``versions``). Each method returns exactly what the matching
+    Analytics method returns; ``python -m src.benchmark engines`` checks
+    this.
+
+    Dates are parsed with datetime.fromisoformat, record by record, as the
+    pure-Python path does, so both accept and reject the same values.
+    """
+
+    def __init__(self, data_manager):
+        if np is None:
+            raise ImportError("NumpyEngine requires numpy")
+        self.data_manager = data_manager
+        self._arrays = {}  # filename -> (stamp, arrays)
+
+    # ==================== Conversion ====================
+
+    def _cached_arrays(self, filename, build):
+        collection = getattr(self.data_manager, self.data_manager.files[filename]) \
+            if hasattr(self.data_manager, 'files') else None
+        versions = getattr(self.data_manager, 'versions', None)
+        stamp = (id(collection), versions.get(filename, 0)) if versions is not None else None
+        cached = self._arrays.get(filename)
+        if stamp is not None and cached is not None and cached[0] == stamp:
+            return cached[1]
+        arrays = build()
+        self._arrays[filename] = (stamp, arrays)
+        return arrays
+
+    def _memberships(self):
+        def build():
+            memberships = self.data_manager.membership_history
+            member_codes = {}
+            return {
+                'records': memberships,
+                'member': np.array([member_codes.setdefault(m['member_id'], len(member_codes))
+                                    for m in memberships], dtype=np.int64),
+                'member_count': len(member_codes),
+                'start': np.array([_to_us(datetime.fromisoformat(m['start_date'])) for m in memberships],
+                                  dtype=np.int64),
+                'end': np.array([_to_us(datetime.fromisoformat(m['end_date'])) for m in memberships],
+                                dtype=np.int64),
+                'active': np.array([m['status'] == 'Active' for m in memberships], dtype=bool),
+            }
+        return self._cached_arrays(MEMBERSHIPS_FILE, build)
+
+    def _payments(self):
+        def build():
+            paid = [p for p in self.data_manager.payments_log
+                    if p['status'] == 'Paid' and p.get('payment_date')]
+            dates = [datetime.fromisoformat(p['payment_date'][:10]) for p in paid]
+            return {
+                'paid_count': sum(1 for p in self.data_manager.payments_log if p['status'] == 'Paid'),
+                'date': np.array([_to_us(d) for d in dates], dtype=np.int64),
+                'month': np.array([d.year * 12 + d.month - 1 for d in dates], dtype=np.int64),
+                'amount': np.array([p['amount_paid'] for p in paid], dtype=np.float64),
+            }
+        return self._cached_arrays(PAYMENTS_FILE, build)
+
+    def _attendance(self):
+        def build():
+            times = []
+            for log in self.data_manager.attendance_log:
+                check_in = log.get('check_in_time')
+                if not check_in:
+                    continue
+                try:
+                    times.append(datetime.fromisoformat(check_in.replace(' ', 'T')))
+                except ValueError:
+                    continue
+            return {
+                'date': np.array([_to_us(datetime(t.year, t.month, t.day)) for t in times], dtype=np.int64),
+                'hour': np.array([t.hour for t in times], dtype=np.int64),
+            }
+        return self._cached_arrays(ATTENDANCE_FILE, build)
+
+    def _renewed(self, arrays):
+        """For each membership: does the member have another one starting on or after its end?
+
+        Only the latest and second-latest start per member are needed: the
+        best "other" membership is the latest, unless it is this one.
+        """
+        if 'renewed' in arrays:
+            return arrays['renewed']
+        member, start, end = arrays['member'], arrays['start'], arrays['end']
+        count = len(member)
+        if count == 0:
+            arrays['renewed'] = np.zeros(0, dtype=bool)
+            return arrays['renewed']
+
+        order = np.lexsort((start, member))
+        sorted_member = member[order]
+        sorted_start = start[order]
+        is_last = np.ones(count, dtype=bool)
+        is_last[:-1] = sorted_member[:-1] != sorted_member[1:]
+        last = np.nonzero(is_last)[0]
+        groups = sorted_member[last]
+
+        latest = np.full(arrays['member_count'], NO_TIME, dtype=np.int64)
+        latest[groups] = sorted_start[last]
+        latest_index = np.full(arrays['member_count'], -1, dtype=np.int64)
+        latest_index[groups] = order[last]
+
+        second = last - 1
+        has_second = second >= 0
+        has_second[has_second] = sorted_member[second[has_second]] == groups[has_second]
+        second_latest = np.full(arrays['member_count'], NO_TIME, dtype=np.int64)
+        second_latest[groups[has_second]] = sorted_start[second[has_second]]
+
+        is_latest = np.arange(count) == latest_index[member]
+        best_other = np.where(is_latest, second_latest[member], latest[member])
+        arrays['renewed'] = best_other >= end
+        return arrays['renewed']
+
+    # ==================== Retention ====================
+
+    def churn_rate(self, period_months=1, month_offset=0, today=None):
+        today = today or datetime.now()
+        period_end = today - timedelta(days=month_offset * 30)
+        period_start = period_end - timedelta(days=period_months * 30)
+
+        arrays = self._memberships()
+        end = arrays['end']
+        in_period = (end >= _to_us(period_start)) & (end <= _to_us(period_end))
+        total_expired = int(np.count_nonzero(in_period))
+        if total_expired == 0:
+            return 0.0
+        expired = int(np.count_nonzero(in_period & ~self._renewed(arrays)))
+        return round((expired / total_expired) * 100, 2)
+
+    def retention_trend(self, months=6):
+        today = datetime.now()
+        trends = {'months': [], 'rates': []}
+        for i in range(months, 0, -1):
+            month_date = today - timedelta(days=i * 30)
+            trends['months'].append(month_date.strftime("%b %Y"))
+            churn = self.churn_rate(1, month_offset=i, today=today)
+            trends['rates'].append(round(100 - churn, 2))
+        return trends
+
+    def at_risk_members(self, days_threshold=30):
+        today = datetime.now()
+        today_us = _to_us(today)
+        threshold_us = _to_us(today + timedelta(days=days_threshold))
+
+        arrays = self._memberships()
+        end = arrays['end']
+        selected = np.nonzero(arrays['active'] & (end > today_us) & (end <= threshold_us))[0]
+        days_remaining = (end[selected] - today_us) // DAY_US
+
+        at_risk = []
+        for index, days in zip(selected.tolist(), days_remaining.tolist()):
+            membership = arrays['records'][index]
+            member = self.data_manager.get_member(membership['member_id'])
+            if member:
+                at_risk.append({
+                    'member_id': membership['member_id'],
+                    'member_name': f"{member['first_name']} {member['last_name']}",
+                    'contact': member.get('contact', ''),
+                    'expiry_date': membership['end_date'],
+                    'days_remaining': days
+                })
+        at_risk.sort(key=lambda x: x['days_remaining'])
+        return at_risk
+
+    # ==================== Revenue ====================
+
+    def _monthly_revenue(self, months):
+        """Revenue per month since months*30 days ago, months in first-payment order.
+
+        Totals are summed payment by payment in log order (as bincount
+        does), so they are bit-for-bit the pure-Python sums.
+        """
+        start_us = _to_us(datetime.now() - timedelta(days=months * 30))
+        arrays = self._payments()
+        recent = arrays['date'] >= start_us
+        month = arrays['month'][recent]
+        if len(month) == 0:
+            return [], []
+        codes, first_seen, positions = np.unique(month, return_index=True, return_inverse=True)
+        totals = np.bincount(positions, weights=arrays['amount'][recent], minlength=len(codes))
+        order = np.argsort(first_seen, kind='stable')
+        return codes[order].tolist(), totals[order].tolist()
+
+    def average_monthly_revenue(self, months=6):
+        _, totals = self._monthly_revenue(months)
+        if not totals:
+            return 0.0
+        return round(sum(totals) / len(totals), 2)
+
+    def historical_revenue_trend(self, months=12):
+        codes, totals = self._monthly_revenue(months)
+        by_month = sorted(zip(codes, totals))
+        return {
+            'months': [_month_label(code) for code, _ in by_month],
+            'revenue': [round(total, 2) for _, total in by_month]
+        }
+
+    def confidence_counts(self):
+        """Returns (paid payments, active memberships) for calculate_confidence_interval."""
+        return self._payments()['paid_count'], int(np.count_nonzero(self._memberships()['active']))
+
+    # ==================== Attendance ====================
+
+    def peak_hours(self, days=7, first_hour=6, last_hour=22):
+        today = datetime.now().date()
+        since = today - timedelta(days=days)
+        arrays = self._attendance()
+        recent = arrays['date'] >= _to_us(datetime(since.year, since.month, since.day))
+        counts = np.bincount(arrays['hour'][recent], minlength=24)
+        hours = list(range(first_hour, last_hour + 1))
+        return {
+            'hours': hours,
+            'counts': [int(counts[h]) if h < len(counts) else 0 for h in hours]
+        }
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from .change_log import format_timestamp
+
+
+class Outbox:
+    """Durable queue of record changes waiting to reach the server.
+
+    Each change is one fsynced JSON line appended to a local file, so
+    queueing costs the same however much is already waiting and survives
+    a crash. Entries carry the full record keyed by its ID, so sending one
+    twice (e.g. after a crash between sending and acknowledging) is
+    harmless.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.last_id = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        for entry in self.entries():
+            self.last_id = entry['id']
+
+    def append(self, changes):
+        """Queues changes.
+
+        Args:
+            changes: List of dicts with file, op ("put"/"del"), key and record
+        """
+        if not changes:
+            return
+        with self._lock:
+            ts = format_timestamp(datetime.now())
+            lines = []
+            for change in changes:
+                self.last_id += 1
+                lines.append(json.dumps(dict(change, id=self.last_id, ts=ts)) + "\n")
+            with open(self.path, 'a') as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def entries(self):
+        """Returns the queued entries, oldest first."""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # Torn last line from a crash mid-append
+        return entries
+
+    def has_pending(self):
+        """Whether anything is queued (without reading the queue)."""
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def acknowledge(self, up_to_id):
+        """Removes entries up to and including up_to_id (they reached the server).
+
+        Entries queued meanwhile by another thread are kept.
+        """
+        with self._lock:
+            remaining = [entry for entry in self.entries() if entry['id'] > up_to_id]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in remaining))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
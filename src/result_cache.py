@@ -0,0 +1,101 @@
+import functools
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import date
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+class ResultCache:
+    """Least-recently-used cache of computed results, with hit/miss counts.
+
+    Keys are built by the caller (see cached), so the cache itself knows
+    nothing about what it stores. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached result for key, computing and storing it on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = compute()
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns hits, misses, evictions, current size and hit rate (%)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            }
+
+
+_caches = weakref.WeakKeyDictionary()
+_caches_guard = threading.Lock()
+
+
+def cache_for(data_source):
+    """Returns the ResultCache shared by everything analysing one data manager."""
+    with _caches_guard:
+        cache = _caches.get(data_source)
+        if cache is None:
+            cache = _caches[data_source] = ResultCache()
+        return cache
+
+
+def cached(*filenames):
+    """Caches a method's result until one of the collections it reads changes.
+
+    The method's object needs ``data_manager`` and ``cache`` attributes.
+    Results are keyed by the method, its arguments, today's date (results
+    are relative to today) and the version of each named collection in
+    ``data_manager.versions``, so a saved change to one collection only
+    misses for methods that read it; stale entries age out of the LRU.
+    Data sources without ``versions`` are not cached.
+
+    Cached results are shared between callers; treat them as read-only.
+
+    Args:
+        filenames: Data files the method reads (e.g. "payments_log.json")
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            versions = getattr(self.data_manager, 'versions', None)
+            if self.cache is None or versions is None:
+                return method(self, *args, **kwargs)
+            key = (
+                method.__name__, args, tuple(sorted(kwargs.items())), date.today(),
+                tuple(versions.get(filename, 0) for filename in filenames)
+            )
+            return self.cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
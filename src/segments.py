@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from .change_log import format_timestamp
+
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def entry_stamp(entry):
+    """Orders entries for conflict resolution: newest timestamp wins, ties broken by node and seq.
+
+    Every node computes the same order from the same entries, so all nodes
+    converge on the same state whatever order they read the segments in.
+    """
+    return (entry['ts'], entry['node'], entry['seq'])
+
+
+class SegmentStore:
+    """Per-node append-only change segments in a shared (synced) folder.
+
+    Each node appends its changes to ``<directory>/<node_id>.jsonl`` and
+    never touches another node's segment, so nodes never overwrite each
+    other's writes. Entries look like change log entries plus the writing
+    node::
+
+        {"node": "desk-1", "seq": 7, "ts": "2025-12-09T18:02:11.123456",
+         "file": "attendance_log.json", "op": "put", "key": "A1B2C3", "record": {...}}
+
+    poll() returns entries added to any segment since the last poll, reading
+    only the new bytes of each file.
+    """
+
+    def __init__(self, directory, node_id):
+        if not node_id or os.sep in node_id or node_id.startswith("."):
+            raise ValueError(f"Invalid node ID: {node_id!r}")
+        self.directory = directory
+        self.node_id = node_id
+        self.path = os.path.join(directory, node_id + SEGMENT_SUFFIX)
+        self._lock = threading.Lock()
+        self._offsets = {}  # Segment filename -> bytes already read
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.last_seq = self._read_last_seq()
+
+    def _read_last_seq(self):
+        if not os.path.exists(self.path):
+            return 0
+        last_seq = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    last_seq = json.loads(line)['seq']
+                except (ValueError, KeyError):
+                    continue
+        return last_seq
+
+    def append(self, changes, fsync=False):
+        """Appends changes to this node's segment.
+
+        Args:
+            changes: List of (filename, op, key, record_json) tuples (see ChangeLog.append)
+            fsync: Force the write to disk before returning
+
+        Returns:
+            list: The entries written, as dicts
+        """
+        if not changes:
+            return []
+
+        with self._lock:
+            ts = format_timestamp(datetime.now())
+            entries = []
+            lines = []
+            for filename, op, key, record_json in changes:
+                self.last_seq += 1
+                entry = {"node": self.node_id, "seq": self.last_seq, "ts": ts, "file": filename, "op": op, "key": key}
+                header = json.dumps(entry)
+                if record_json is None:
+                    lines.append(header + "\n")
+                else:
+                    lines.append(f'{header[:-1]}, "record": {record_json}}}\n')
+                    entry["record"] = json.loads(record_json)
+                entries.append(entry)
+
+            with open(self.path, 'a') as f:
+                f.write("".join(lines))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            return entries
+
+    def sync(self):
+        """Forces entries appended without fsync to disk."""
+        with open(self.path, 'a') as f:
+            os.fsync(f.fileno())
+
+    def poll(self):
+        """Reads entries added to any node's segment since the last poll.
+
+        A line still being written (or synced) is left for the next poll.
+
+        Returns:
+            list: New entries, sorted by entry_stamp
+        """
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            offset = self._offsets.get(name, 0)
+            try:
+                if os.path.getsize(path) <= offset:
+                    continue
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+            except OSError:
+                continue
+
+            complete = data.rfind(b"\n") + 1
+            for line in data[:complete].splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+            self._offsets[name] = offset + complete
+
+        entries.sort(key=entry_stamp)
+        return entries
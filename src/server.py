@@ -0,0 +1,494 @@
+import argparse
+import asyncio
+import datetime
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from .data_manager import DataManager
+from .backup_manager import BackupManager
+from .analytics import Analytics
+from .balance_ledger import ledger_for
+from .check_in_service import CheckInService
+from .session_stats import session_stats_for
+from .utils import get_current_datetime_iso
+
+DEFAULT_HOST = "127.0.0.1"  # Pass --host 0.0.0.0 to serve other machines
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 16 * 1024 * 1024
+BACKUP_CHECK_INTERVAL_SECONDS = 60
+CHECKPOINT_INTERVAL_SECONDS = 30  # How often journaled check-ins are written to attendance_log.json
+TOKEN_ENV_VAR = "GYM_SERVER_TOKEN"
+TOKEN_FILENAME = "server_token"  # Not a .json file, so it is never synced or backed up
+
+# Requests timed in the check-in latency stats
+SCAN_PATHS = {"/api/checkins", "/api/checkouts", "/api/kiosk"}
+
+# HTTP status for each check-in service result
+SCAN_STATUS = {
+    "checked_in": HTTPStatus.CREATED,
+    "checked_out": HTTPStatus.OK,
+    "already_checked_in": HTTPStatus.CONFLICT,
+    "not_checked_in": HTTPStatus.CONFLICT,
+    "not_found": HTTPStatus.NOT_FOUND,
+}
+
+
+class ApiError(Exception):
+    """Raised by request handlers to send an error response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def load_server_token(data_dir):
+    """Returns the API token kept in the data directory, creating one on first run.
+
+    Returns:
+        tuple: (token, created) where created is True for a new token
+    """
+    path = os.path.join(data_dir, TOKEN_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            token = f.read().strip()
+        if token:
+            return token, False
+    except FileNotFoundError:
+        pass
+
+    token = secrets.token_urlsafe(32)
+    os.makedirs(data_dir, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token + "\n")
+    return token, True
+
+
+class GymServer:
+    """Headless HTTP/JSON API over a single DataManager.
+
+    Several front-desk terminals can share one data directory by running the
+    App as a thin client against this server (see RemoteDataManager).
+
+    Requests are handled on a single asyncio event loop and every handler
+    changes data without yielding, so each read-modify-write is atomic:
+    concurrent check-ins never lose updates and a member can only be checked
+    in once. Check-ins go through CheckInService, which only waits (with
+    other scans) for a change log fsync, and changes clients post are only
+    journaled; files are rewritten every CHECKPOINT_INTERVAL_SECONDS.
+
+    Every request must carry the shared token as "Authorization: Bearer
+    <token>"; anything else gets 401. Without a token one is generated (see
+    self.token).
+
+    Endpoints (all JSON):
+        GET  /api/health
+        GET  /api/data                    every collection plus the change log seq
+        GET  /api/changes?after=SEQ       change log entries after SEQ (410 once compacted)
+        POST /api/changes                 {"changes": [{file, op, key, record}, ...]}
+        GET  /api/members[?q=name]
+        GET  /api/members/<member_id>
+        GET  /api/members/<member_id>/balance
+        POST /api/checkins                {"member_id": ...} (ID or phone)
+        POST /api/checkouts               {"member_id": ...}
+        POST /api/kiosk                   {"scan": ...} check-in result for a kiosk display
+        GET  /api/checkins/stats          p50/p99 latency from reading a scan request to replying
+        GET  /api/attendance?date=YYYY-MM-DD
+        GET  /api/payments[?status=Unpaid]
+        POST /api/payments/<payment_id>/pay
+        POST /api/payments/<payment_id>/unpay
+        GET  /api/analytics
+        GET  /api/sessions/stats?days=N   session lengths, with a mergeable sketch
+    """
+
+    def __init__(self, data_manager, backup_manager=None, token=None):
+        self.data_manager = data_manager
+        self.token = token or secrets.token_urlsafe(32)
+        self.backup_manager = backup_manager
+        self.analytics = Analytics(data_manager)
+        self.check_ins = CheckInService(data_manager)
+        self.routes = [
+            ("GET", r"/api/health", self.get_health),
+            ("GET", r"/api/data", self.get_data),
+            ("GET", r"/api/changes", self.get_changes),
+            ("POST", r"/api/changes", self.post_changes),
+            ("GET", r"/api/members", self.get_members),
+            ("GET", r"/api/members/(?P<member_id>[^/]+)", self.get_member),
+            ("GET", r"/api/members/(?P<member_id>[^/]+)/balance", self.get_member_balance),
+            ("POST", r"/api/checkins", self.post_check_in),
+            ("POST", r"/api/checkouts", self.post_check_out),
+            ("POST", r"/api/kiosk", self.post_kiosk_scan),
+            ("GET", r"/api/checkins/stats", self.get_check_in_stats),
+            ("GET", r"/api/attendance", self.get_attendance),
+            ("GET", r"/api/payments", self.get_payments),
+            ("POST", r"/api/payments/(?P<payment_id>[^/]+)/pay", self.post_mark_paid),
+            ("POST", r"/api/payments/(?P<payment_id>[^/]+)/unpay", self.post_mark_unpaid),
+            ("GET", r"/api/analytics", self.get_analytics),
+            ("GET", r"/api/sessions/stats", self.get_session_stats),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in self.routes]
+
+    # ==================== HTTP ====================
+
+    async def handle_connection(self, reader, writer):
+        """Serves requests on one connection (keep-alive) until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                received = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+                authorized = self._authorized(headers)
+                if authorized:
+                    status, payload = await self.dispatch(method, target, body)
+                else:
+                    status, payload = HTTPStatus.UNAUTHORIZED, {"error": "Missing or wrong API token"}
+                await self._send(writer, status, payload, keep_alive)
+                if authorized and method == "POST" and urlsplit(target).path in SCAN_PATHS:
+                    # Includes time queued behind other requests, not just the handler
+                    self.check_ins.latency.record(time.perf_counter() - received)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _authorized(self, headers):
+        expected = f"Bearer {self.token}".encode()
+        return hmac.compare_digest(headers.get("authorization", "").encode(), expected)
+
+    async def _send(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        """Routes a request to its handler (plain or async).
+
+        Returns:
+            tuple: (HTTPStatus, JSON-serializable payload)
+        """
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path_matched = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method != method:
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                result = handler(data=data, query=query, **match.groupdict())
+                if asyncio.iscoroutine(result):
+                    result = await result
+                return result
+            except ApiError as e:
+                return e.status, {"error": e.message}
+            except json.JSONDecodeError:
+                return HTTPStatus.BAD_REQUEST, {"error": "Body is not valid JSON"}
+            except Exception as e:
+                print(f"Error handling {method} {url.path}: {e}")
+                return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+
+        if path_matched:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} not allowed on {url.path}"}
+        return HTTPStatus.NOT_FOUND, {"error": f"No such endpoint: {url.path}"}
+
+    # ==================== Data Sync ====================
+
+    def get_health(self, data, query):
+        return HTTPStatus.OK, {"status": "ok", "seq": self.data_manager.change_log.last_seq}
+
+    def get_data(self, data, query):
+        collections = {filename: getattr(self.data_manager, attr_name)
+                       for filename, attr_name in self.data_manager.files.items()}
+        return HTTPStatus.OK, {"seq": self.data_manager.change_log.last_seq, "collections": collections}
+
+    def get_changes(self, data, query):
+        """Change log entries after a seq.
+
+        Answers 410 if entries the caller needs were compacted away, or the
+        log was started over (a seq past the end); the caller then reloads
+        everything from /api/data.
+        """
+        try:
+            after = int(query.get("after", 0))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "after must be a number")
+        change_log = self.data_manager.change_log
+        last_seq = change_log.last_seq
+        entries = [entry for entry in change_log.iter_entries(after_seq=after) if entry['seq'] <= last_seq]
+        # Checked on what was read, as a backup may compact the log meanwhile
+        missing = after < last_seq and (not entries or entries[0]['seq'] != after + 1)
+        if missing or after > last_seq:
+            raise ApiError(HTTPStatus.GONE, f"Changes after {after} are no longer in the change log")
+        return HTTPStatus.OK, {"seq": last_seq, "changes": entries}
+
+    async def post_changes(self, data, query):
+        """Applies a client's record changes and waits until they are durable.
+
+        The changes are journaled in order on the event loop, and only the
+        fsync runs in an executor; files are rewritten by _checkpoint_loop.
+        """
+        changes = data.get("changes")
+        if not isinstance(changes, list):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Expected a list of changes")
+        for change in changes:
+            if change.get("file") not in self.data_manager.files or change.get("op") not in ("put", "del"):
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid change: {change}")
+        staged = self.data_manager.stage_record_changes(changes)
+        self.data_manager.journal(staged)
+        seq = self.data_manager.change_log.last_seq
+        if staged:
+            await asyncio.get_running_loop().run_in_executor(None, self.data_manager.sync_journal)
+        return HTTPStatus.OK, {"seq": seq, "files": sorted({change['file'] for change in changes})}
+
+    # ==================== Members & Attendance ====================
+
+    def get_members(self, data, query):
+        members = self.data_manager.members_db.values()
+        name = query.get("q", "").lower()
+        if name:
+            members = [m for m in members if name in f"{m['first_name']} {m['last_name']}".lower()]
+        return HTTPStatus.OK, {"members": list(members)}
+
+    def get_member(self, data, query, member_id):
+        member = self.data_manager.get_member(member_id)
+        if not member:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Member not found")
+        return HTTPStatus.OK, member
+
+    def get_member_balance(self, data, query, member_id):
+        if not self.data_manager.get_member(member_id):
+            raise ApiError(HTTPStatus.NOT_FOUND, "Member not found")
+        ledger = ledger_for(self.data_manager)
+        return HTTPStatus.OK, {
+            "member_id": member_id,
+            "balance": ledger.balance(member_id),
+            "aging": ledger.member_aging(member_id),
+        }
+
+    async def post_check_in(self, data, query):
+        result, member_id, log = await self.check_ins.process_scan(data.get("member_id"), "check_in")
+        if result != "checked_in":
+            raise ApiError(SCAN_STATUS[result], result.replace("_", " ").capitalize())
+        return HTTPStatus.CREATED, log
+
+    async def post_check_out(self, data, query):
+        result, member_id, log = await self.check_ins.process_scan(data.get("member_id"), "check_out")
+        if result != "checked_out":
+            raise ApiError(SCAN_STATUS[result], result.replace("_", " ").capitalize())
+        return HTTPStatus.OK, log
+
+    async def post_kiosk_scan(self, data, query):
+        result, member_id, log = await self.check_ins.process_scan(data.get("scan"), "check_in")
+        member = self.data_manager.get_member(member_id) if member_id else None
+        return HTTPStatus.OK, {
+            "result": result,
+            "member_id": member_id,
+            "member_name": f"{member['first_name']} {member['last_name']}" if member else None,
+            "log": log
+        }
+
+    def get_check_in_stats(self, data, query):
+        return HTTPStatus.OK, self.check_ins.latency.summary()
+
+    def get_attendance(self, data, query):
+        date = query.get("date")
+        logs = self.data_manager.attendance_log
+        if date:
+            logs = [log for log in logs if log['check_in_time'][:10] == date]
+        return HTTPStatus.OK, {"attendance": logs}
+
+    # ==================== Payments ====================
+
+    def get_payments(self, data, query):
+        payments = self.data_manager.payments_log
+        status = query.get("status")
+        if status:
+            payments = [p for p in payments if p['status'] == status]
+        return HTTPStatus.OK, {"payments": payments}
+
+    def _find_payment(self, payment_id):
+        for payment in self.data_manager.payments_log:
+            if payment['payment_id'] == payment_id:
+                return payment
+        raise ApiError(HTTPStatus.NOT_FOUND, "Payment not found")
+
+    def post_mark_paid(self, data, query, payment_id):
+        payment = self._find_payment(payment_id)
+        if payment['status'] != 'Paid':
+            payment['status'] = 'Paid'
+            payment['amount_paid'] = payment['amount_due']
+            payment['payment_date'] = get_current_datetime_iso()
+            self.data_manager.update_record("payments_log.json", payment_id)
+        return HTTPStatus.OK, payment
+
+    def post_mark_unpaid(self, data, query, payment_id):
+        payment = self._find_payment(payment_id)
+        if payment['status'] != 'Unpaid':
+            payment['status'] = 'Unpaid'
+            payment['amount_paid'] = 0.0
+            payment['payment_date'] = None
+            self.data_manager.update_record("payments_log.json", payment_id)
+        return HTTPStatus.OK, payment
+
+    # ==================== Analytics ====================
+
+    async def get_analytics(self, data, query):
+        """Dashboard analytics, computed from a snapshot in an executor.
+
+        Results are cached per collection version (shared with
+        self.analytics), so check-ins keep being served while they are
+        computed and repeat requests are cheap.
+        """
+        snapshot = self.data_manager.snapshot()
+        result = await asyncio.get_running_loop().run_in_executor(None, self._compute_analytics, snapshot)
+        return HTTPStatus.OK, result
+
+    def _compute_analytics(self, snapshot):
+        analytics = Analytics(snapshot, cache=self.analytics.cache)
+        return {
+            "total_members": len(snapshot.members_db),
+            "retention_rate": analytics.calculate_retention_rate(),
+            "churn_rate": analytics.calculate_churn_rate(),
+            "at_risk_members": analytics.get_at_risk_members(30),
+            "retention_trend": analytics.get_retention_trend(),
+            "revenue_forecast": analytics.predict_revenue(),
+            "historical_revenue": analytics.get_historical_revenue_trend(),
+            "active_members": analytics.get_active_member_counts(),
+            "session_durations": analytics.get_session_duration_stats(),
+            "outstanding": analytics.get_outstanding_balances(),
+            "cache": analytics.cache.stats(),
+        }
+
+    def get_session_stats(self, data, query):
+        """Session lengths over the last N days (default 30).
+        
+        Also returns the merged stats and sketch (SessionStats.to_dict), so
+        a caller can merge them with other nodes' into gym-wide figures.
+        """
+        try:
+            days = int(query.get("days", 30))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "days must be a number")
+        today = datetime.date.today()
+        stats = session_stats_for(self.data_manager).period(today - datetime.timedelta(days=days - 1), today)
+        return HTTPStatus.OK, {"days": days, "summary": stats.summary(), "stats": stats.to_dict()}
+
+    # ==================== Lifecycle ====================
+
+    async def _backup_loop(self):
+        """Takes scheduled backups in the background while the server runs."""
+        while True:
+            await asyncio.sleep(BACKUP_CHECK_INTERVAL_SECONDS)
+            if self.backup_manager.is_backup_due():
+                self.backup_manager.create_backup_async(
+                    self.data_manager.serialize_snapshot,
+                    log_seq=self.data_manager.snapshot_seq
+                )
+
+    async def _checkpoint_loop(self):
+        """Writes journaled changes to their files now and then.
+
+        Check-ins are written on the check-in worker thread, and changes
+        clients posted in an executor, so requests keep being served while
+        the files are serialized.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL_SECONDS)
+            try:
+                future = self.check_ins.checkpoint_in_background()
+                if future is not None:
+                    await asyncio.wrap_future(future)
+                await loop.run_in_executor(None, self.data_manager.checkpoint_unwritten)
+            except Exception as e:
+                print(f"Error writing checkpoint: {e}")
+            self.data_manager.deliver_changes()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """Runs the server until cancelled.
+
+        Args:
+            host: Interface to listen on
+            port: TCP port (0 picks a free one)
+            ready: Optional callback called with the bound port once listening
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        bound_port = server.sockets[0].getsockname()[1]
+        tasks = [asyncio.ensure_future(self._checkpoint_loop())]
+        if self.backup_manager:
+            tasks.append(asyncio.ensure_future(self._backup_loop()))
+        if ready:
+            ready(bound_port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.data_manager.save_all_data()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gym Management System API server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--data", default="data", help="Data directory")
+    parser.add_argument("--no-backups", action="store_true", help="Disable scheduled backups")
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV_VAR),
+                        help=f"API token clients must send (default: ${TOKEN_ENV_VAR}, else {TOKEN_FILENAME} in the data directory)")
+    args = parser.parse_args()
+
+    token = args.token
+    if not token:
+        token, created = load_server_token(args.data)
+        if created:
+            print(f"Generated API token {token} (saved in {os.path.join(args.data, TOKEN_FILENAME)})")
+        else:
+            print(f"Using the API token in {os.path.join(args.data, TOKEN_FILENAME)}")
+
+    data_manager = DataManager(args.data)
+    backup_manager = None if args.no_backups else BackupManager(args.data)
+    gym_server = GymServer(data_manager, backup_manager, token=token)
+    try:
+        asyncio.run(gym_server.serve(args.host, args.port,
+                                     ready=lambda port: print(f"Serving {args.data} on http://{args.host}:{port}")))
+    except KeyboardInterrupt:
+        print("Server stopped")
@@ -0,0 +1,392 @@
+import math
+import threading
+import weakref
+from array import array
+from collections import Counter
+from datetime import datetime
+
+ATTENDANCE_FILE = "attendance_log.json"
+
+DEFAULT_ACCURACY = 0.01     # Quantiles within 1% of the true value
+MEMBER_ACCURACY = 0.05      # Coarser per member: there are many members and few sessions each
+
+
+class RunningStats:
+    """Count, mean and variance of a stream of values (Welford's method).
+
+    Values can also be removed (e.g. a check-out corrected later), and two
+    RunningStats merge into the stats of both streams combined.
+    """
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared differences from the mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def add_many(self, values):
+        """Adds a batch of values at once (much faster than one add per value)."""
+        batch = RunningStats()
+        batch.count = len(values)
+        if batch.count == 0:
+            return
+        batch.mean = math.fsum(values) / batch.count
+        batch._m2 = math.fsum((value - batch.mean) ** 2 for value in values)
+        self.merge(batch)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self._m2 = 0, 0.0, 0.0
+            return
+        mean = (self.mean * self.count - value) / (self.count - 1)
+        self._m2 = max(self._m2 - (value - mean) * (value - self.mean), 0.0)
+        self.mean = mean
+        self.count -= 1
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        """Sample variance (0 for fewer than two values)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self._m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count, stats.mean, stats._m2 = data['count'], data['mean'], data['m2']
+        return stats
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Positive values go into logarithmic buckets; bucket i holds values in
+    (gamma^(i-1), gamma^i], with gamma = (1 + accuracy) / (1 - accuracy),
+    so every quantile is returned within ``accuracy`` of a true value
+    (e.g. 1%: a 60-minute p90 is reported as 59.4 to 60.6). Values of 0 or
+    less are counted separately. Bucket counts are kept in a dense array
+    from the lowest to the highest bucket used, a few dozen for session
+    lengths. Sketches with the same accuracy merge by adding counts, so
+    per-day or per-node sketches combine exactly into one, and values can
+    be removed again.
+    """
+
+    __slots__ = ("accuracy", "_log_gamma", "_offset", "_counts", "zero_count", "count")
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY):
+        self.accuracy = accuracy
+        self._log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        self._offset = 0           # Bucket index of _counts[0]
+        self._counts = array('q')
+        self.zero_count = 0
+        self.count = 0
+
+    def _bucket(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _add_to_bucket(self, bucket, weight):
+        if not self._counts:
+            self._offset = bucket
+            self._counts.append(0)
+        elif bucket < self._offset:
+            self._counts[0:0] = array('q', bytes(8 * (self._offset - bucket)))
+            self._offset = bucket
+        elif bucket >= self._offset + len(self._counts):
+            self._counts.extend(array('q', bytes(8 * (bucket - self._offset - len(self._counts) + 1))))
+        self._counts[bucket - self._offset] += weight
+
+    def add(self, value, weight=1):
+        if value <= 0:
+            self.zero_count += weight
+        else:
+            self._add_to_bucket(self._bucket(value), weight)
+        self.count += weight
+
+    def add_many(self, values):
+        """Adds a batch of values; each distinct value is bucketed once."""
+        for value, count in Counter(values).items():
+            self.add(value, count)
+
+    def remove(self, value):
+        """Removes a value added before."""
+        self.add(value, -1)
+
+    def merge(self, other):
+        """Adds another sketch's values to this one (same accuracy required)."""
+        if other.accuracy != self.accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in enumerate(other._counts):
+            if count:
+                self._add_to_bucket(other._offset + index, count)
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """Returns the approximate q-quantile (0 <= q <= 1), or None if empty."""
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        gamma = math.exp(self._log_gamma)
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen > rank:
+                return 2 * gamma ** (self._offset + index) / (gamma + 1)
+        return 2 * gamma ** (self._offset + len(self._counts) - 1) / (gamma + 1)
+
+    def to_dict(self):
+        return {"accuracy": self.accuracy, "offset": self._offset, "counts": self._counts.tolist(),
+                "zero_count": self.zero_count}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['accuracy'])
+        sketch._offset = data['offset']
+        sketch._counts = array('q', data['counts'])
+        sketch.zero_count = data['zero_count']
+        sketch.count = sketch.zero_count + sum(sketch._counts)
+        return sketch
+
+
+class SessionStats:
+    """Running stats and a quantile sketch of session lengths (minutes)."""
+
+    __slots__ = ("stats", "sketch")
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(accuracy)
+
+    def add(self, minutes):
+        self.stats.add(minutes)
+        self.sketch.add(minutes)
+
+    def add_many(self, minutes):
+        self.stats.add_many(minutes)
+        self.sketch.add_many(minutes)
+
+    def remove(self, minutes):
+        self.stats.remove(minutes)
+        self.sketch.remove(minutes)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def summary(self):
+        """Returns count, mean, stdev and approximate p50/p90/p99, in minutes."""
+        if self.stats.count == 0:
+            return {"count": 0, "mean": None, "stdev": None, "p50": None, "p90": None, "p99": None}
+        return {
+            "count": self.stats.count,
+            "mean": round(self.stats.mean, 1),
+            "stdev": round(math.sqrt(self.stats.variance), 1),
+            "p50": round(self.sketch.quantile(0.5), 1),
+            "p90": round(self.sketch.quantile(0.9), 1),
+            "p99": round(self.sketch.quantile(0.99), 1),
+        }
+
+    def to_dict(self):
+        return {"stats": self.stats.to_dict(), "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        session_stats = cls(data['sketch']['accuracy'])
+        session_stats.stats = RunningStats.from_dict(data['stats'])
+        session_stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return session_stats
+
+
+def _session(log, days=None):
+    """(day, hour, member ID, minutes) of a finished session, or None.
+
+    Args:
+        days: Optional dict caching check-in date string -> validated ISO
+            date (or None), for passes over many logs
+    """
+    minutes = log.get('duration_minutes') if log else None
+    check_in = log.get('check_in_time') if log else None
+    if minutes is None or not check_in:
+        return None
+    day = days.get(check_in[:10], False) if days is not None else False
+    if day is False:
+        try:
+            day = datetime.fromisoformat(check_in[:10]).date().isoformat()
+        except ValueError:
+            day = None
+        if days is not None:
+            days[check_in[:10]] = day
+    hour = check_in[11:13]
+    if day is None or not hour.isdigit():
+        return None
+    return day, int(hour), log['member_id'], minutes
+
+
+class SessionDurationIndex:
+    """Session-length statistics per day, per member and per hour of day.
+
+    Each finished session (one with ``duration_minutes``) is added to the
+    SessionStats of its check-in day, its member and its check-in hour.
+    Built in one pass over the attendance log, then kept up to date from
+    change events (see DataManager.subscribe): a check-out adds one
+    session, an edit or deletion takes the old one out again. Stats for
+    a period are merged from its days, so nothing is ever sorted. When
+    the log changes without events (a reload or a restore), the index is
+    rebuilt on the next query.
+    """
+
+    def __init__(self):
+        self.by_day = {}     # ISO date -> SessionStats
+        self.by_member = {}  # Member ID -> SessionStats
+        self.by_hour = {}    # Hour of day -> SessionStats
+        self._version = None
+        self._lock = threading.RLock()
+
+    # ==================== Maintenance ====================
+
+    def rebuild(self, attendance_log, version=None):
+        with self._lock:
+            # Collect each group's lengths, then add them in one batch per group
+            minutes_by = ({}, {}, {})  # Day, hour, member -> list of minutes
+            days = {}
+            for log in attendance_log:
+                session = _session(log, days)
+                if session:
+                    minutes = session[3]
+                    for groups, key in zip(minutes_by, session):
+                        group = groups.get(key)
+                        if group is None:
+                            group = groups[key] = []
+                        group.append(minutes)
+            
+            self.by_day, self.by_hour, self.by_member = (
+                {key: self._batch(values, accuracy) for key, values in groups.items()}
+                for groups, accuracy in zip(minutes_by, (DEFAULT_ACCURACY, DEFAULT_ACCURACY, MEMBER_ACCURACY))
+            )
+            self._version = version
+
+    @staticmethod
+    def _batch(minutes, accuracy):
+        stats = SessionStats(accuracy)
+        stats.add_many(minutes)
+        return stats
+
+    def sync(self, data_source):
+        """Rebuilds the index if the attendance log changed without events.
+
+        Sources without ``versions`` are rebuilt on every call.
+        """
+        versions = getattr(data_source, 'versions', None)
+        version = versions.get(ATTENDANCE_FILE, 0) if versions is not None else None
+        with self._lock:
+            if version is None or version != self._version:
+                self.rebuild(data_source.attendance_log, version)
+
+    def on_records_changed(self, events):
+        """Applies attendance change events (subscribed by session_stats_for).
+
+        Events already reflected by a rebuild are skipped; a gap in the
+        versions marks the index for a rebuild.
+        """
+        with self._lock:
+            for event in events:
+                if self._version is None or event.version <= self._version:
+                    continue
+                if event.version != self._version + 1:
+                    self._version = None
+                    return
+                self._version = event.version
+
+                previous, current = _session(event.previous), _session(event.record)
+                if previous != current:  # e.g. a check-in has no session yet
+                    if previous:
+                        self._remove(*previous)
+                    if current:
+                        self._add(*current)
+
+    def _add(self, day, hour, member_id, minutes):
+        for stats_by, key, accuracy in ((self.by_day, day, DEFAULT_ACCURACY),
+                                        (self.by_member, member_id, MEMBER_ACCURACY),
+                                        (self.by_hour, hour, DEFAULT_ACCURACY)):
+            stats = stats_by.get(key)
+            if stats is None:
+                stats = stats_by[key] = SessionStats(accuracy)
+            stats.add(minutes)
+
+    def _remove(self, day, hour, member_id, minutes):
+        for stats_by, key in ((self.by_day, day), (self.by_member, member_id), (self.by_hour, hour)):
+            stats = stats_by.get(key)
+            if stats is not None:
+                stats.remove(minutes)
+                if stats.stats.count == 0:
+                    del stats_by[key]
+
+    # ==================== Queries ====================
+
+    def period(self, first_day, last_day):
+        """Merged SessionStats of the sessions between two dates (inclusive)."""
+        first, last = first_day.isoformat(), last_day.isoformat()
+        merged = SessionStats()
+        with self._lock:
+            for day, stats in self.by_day.items():
+                if first <= day <= last:
+                    merged.merge(stats)
+        return merged
+
+    def day(self, day):
+        """SessionStats of one day's sessions (empty if none)."""
+        with self._lock:
+            stats = self.by_day.get(day.isoformat())
+            return SessionStats().merge(stats) if stats else SessionStats()
+
+    def member(self, member_id):
+        """SessionStats of one member's sessions (empty if none)."""
+        with self._lock:
+            stats = self.by_member.get(member_id)
+            return SessionStats(MEMBER_ACCURACY).merge(stats) if stats else SessionStats(MEMBER_ACCURACY)
+
+    def hour(self, hour):
+        """SessionStats of the sessions that started in one hour of the day."""
+        with self._lock:
+            stats = self.by_hour.get(hour)
+            return SessionStats().merge(stats) if stats else SessionStats()
+
+
+_indexes = weakref.WeakKeyDictionary()
+_indexes_guard = threading.Lock()
+
+
+def session_stats_for(data_source):
+    """Returns an up-to-date SessionDurationIndex for a data manager (or snapshot).
+
+    An index for a data manager is built once and then maintained from its
+    change events; a snapshot's is built once, since it never changes.
+    """
+    with _indexes_guard:
+        index = _indexes.get(data_source)
+        if index is None:
+            index = _indexes[data_source] = SessionDurationIndex()
+            if hasattr(data_source, 'subscribe'):
+                data_source.subscribe(index.on_records_changed, {ATTENDANCE_FILE})
+    index.sync(data_source)
+    return index
@@ -2,14 +2,24 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-import datetime
 from ..styles import *
 from ..utils import *
+from ..check_in_service import CheckInService
+
+SCAN_FEEDBACK_MS = 3000  # How long scanner feedback stays visible
+SCAN_COMMIT_POLL_MS = 500  # How often background saves are checked for errors
+SCANNER_IDLE_CHECKPOINT_MS = 30 * 1000  # Rewrite the attendance file after this long without scans
 
 class Attendance:
-    def __init__(self, parent_frame, data_manager):
+    def __init__(self, parent_frame, data_manager, check_in_service=None):
         self.parent_frame = parent_frame
         self.data_manager = data_manager
+        self.check_in_service = check_in_service or CheckInService(data_manager)
+        
+        # Scanner mode state
+        self._pending_commits = []
+        self._feedback_after_id = None
+        self._checkpoint_after_id = None
         
         self.setup_ui()
         self.populate_table()
@@ -58,6 +68,11 @@ class Attendance:
 
         self.delete_btn = ctk.CTkButton(self.action_frame, text="Delete Log", command=self.delete_log, fg_color=DANGER_COLOR)
         self.delete_btn.pack(side="left", padx=(0, 10))
+        
+        # Scanner mode: each Enter-terminated scan toggles check-in/check-out
+        self.scanner_var = ctk.BooleanVar(value=False)
+        self.scanner_switch = ctk.CTkSwitch(self.action_frame, text="Scanner Mode", variable=self.scanner_var, command=self.toggle_scanner_mode)
+        self.scanner_switch.pack(side="left", padx=(0, 10))
 
         # Date Selection
         ctk.CTkLabel(self.action_frame, text="View Date:").pack(side="left", padx=(10, 5))
@@ -73,6 +88,10 @@ class Attendance:
         self.log_label = ctk.CTkLabel(self.log_frame, text="Today's Activity", font=ctk.CTkFont(size=16, weight="bold"))
         self.log_label.pack(anchor="w", pady=(0, 10))
         
+        # Non-modal feedback for scanner mode
+        self.scan_feedback_label = ctk.CTkLabel(self.log_frame, text="", font=ctk.CTkFont(size=18, weight="bold"))
+        self.scan_feedback_label.pack(anchor="w", pady=(0, 10))
+        
         columns = ("check_in", "check_out", "member_id", "name", "status", "duration")
         self.tree = ttk.Treeview(self.log_frame, columns=columns, show="headings", selectmode="browse")
         
@@ -95,6 +114,9 @@ class Attendance:
         
         self.tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
+        
+        # Write out check-ins journaled while this screen was open
+        self.tree.bind("<Destroy>", lambda event: self.check_in_service.checkpoint_in_background())
 
     def update_date_options(self):
         dates = set()
@@ -129,45 +151,72 @@ class Attendance:
         todays_logs.sort(key=lambda x: x['check_in_time'], reverse=True)
         
         for log in todays_logs:
-            member = self.data_manager.get_member(log['member_id'])
-            name = f"{member['first_name']} {member['last_name']}" if member else "Unknown"
-            
-            check_in_time = "-"
+            self.tree.insert("", "end", iid=log['log_id'], values=self._row_values(log))
+
+    def _row_values(self, log):
+        """Formats an attendance log as a table row."""
+        member = self.data_manager.get_member(log['member_id'])
+        name = f"{member['first_name']} {member['last_name']}" if member else "Unknown"
+        
+        check_in_time = "-"
+        try:
+            if "T" in log['check_in_time']:
+                check_in_time = log['check_in_time'].split("T")[1]
+            else:
+                check_in_time = log['check_in_time'].split(" ")[1]
+        except IndexError:
+            check_in_time = log['check_in_time']
+
+        check_out_time = "-"
+        status = "Checked In"
+        duration = "-"
+        
+        if log.get('check_out_time'):
+            status = "Checked Out"
             try:
-                if "T" in log['check_in_time']:
-                    check_in_time = log['check_in_time'].split("T")[1]
+                if "T" in log['check_out_time']:
+                    check_out_time = log['check_out_time'].split("T")[1]
                 else:
-                    check_in_time = log['check_in_time'].split(" ")[1]
+                    check_out_time = log['check_out_time'].split(" ")[1]
             except IndexError:
-                check_in_time = log['check_in_time']
-
-            check_out_time = "-"
-            status = "Checked In"
-            duration = "-"
-            
-            if log.get('check_out_time'):
-                status = "Checked Out"
-                try:
-                    if "T" in log['check_out_time']:
-                        check_out_time = log['check_out_time'].split("T")[1]
-                    else:
-                        check_out_time = log['check_out_time'].split(" ")[1]
-                except IndexError:
-                    check_out_time = log['check_out_time']
-                
-                duration = str(log.get('duration_minutes', 0))
+                check_out_time = log['check_out_time']
             
-            self.tree.insert("", "end", values=(
-                check_in_time,
-                check_out_time,
-                log['member_id'],
-                name,
-                status,
-                duration,
-                log['log_id'] # Hidden column for ID if needed, or just use index
-            ))
+            duration = str(log.get('duration_minutes', 0))
+        
+        return (
+            check_in_time,
+            check_out_time,
+            log['member_id'],
+            name,
+            status,
+            duration,
+            log['log_id'] # Hidden column for ID if needed, or just use index
+        )
+
+    def show_log_row(self, log):
+        """Adds or updates a single row instead of rebuilding the table."""
+        log_date = log['check_in_time'][:10]
+        if log_date not in self.date_combo.cget("values"):
+            self.update_date_options()
+        if self.date_var.get() != log_date:
+            return
+        
+        if self.tree.exists(log['log_id']):
+            self.tree.item(log['log_id'], values=self._row_values(log))
+        else:
+            self.tree.insert("", 0, iid=log['log_id'], values=self._row_values(log))
+
+    def on_data_changed(self, changes):
+        """Refreshes the log when reloaded data touches what it shows."""
+        if changes.keys() & {"attendance_log.json", "members.json"}:
+            self.update_date_options()
+            self.populate_table()
 
     def on_search_type(self, event):
+        # Scans arrive as fast keystrokes; no autocomplete in scanner mode
+        if self.scanner_var.get():
+            return
+        
         # Ignore navigation keys
         if event.keysym in ('Up', 'Down', 'Left', 'Right', 'Return', 'Tab'):
             return
@@ -257,6 +306,9 @@ class Attendance:
 
     def on_return_key(self, event):
         """Handle Enter key: select from list if open, else check in."""
+        if self.scanner_var.get():
+            self.process_scan()
+            return "break"
         if self.search_list_frame.winfo_ismapped() and self.search_list.curselection():
             self.on_search_select(None)
         else:
@@ -288,22 +340,13 @@ class Attendance:
                 messagebox.showerror("Error", "Member not found!")
                 return
 
-        # Check if already checked in
-        for log in self.data_manager.attendance_log:
-            if log['member_id'] == member_id and log.get('check_out_time') is None:
-                messagebox.showwarning("Warning", "Member is already checked in!")
-                return
-        
-        new_log = {
-            "log_id": generate_unique_id("A"),
-            "member_id": member_id,
-            "check_in_time": get_current_datetime_iso(),
-            "check_out_time": None,
-            "duration_minutes": None
-        }
-        
-        self.data_manager.attendance_log.append(new_log)
-        self.data_manager.save_data("attendance_log.json")
+        # Check in unless already checked in
+        result, member_id, new_log = self.check_in_service.check_in(member_id)
+        if result == "already_checked_in":
+            messagebox.showwarning("Warning", "Member is already checked in!")
+            return
+        self.check_in_service.commit_now()
+        self._schedule_checkpoint()
         
         self.id_entry.delete(0, "end")
         self.search_list_frame.place_forget()
@@ -319,27 +362,14 @@ class Attendance:
         item = self.tree.item(selected[0])
         member_id = item['values'][2] # Member ID is at index 2
         
-        # Find active log
-        active_log = None
-        for log in self.data_manager.attendance_log:
-            if log['member_id'] == member_id and log.get('check_out_time') is None:
-                active_log = log
-                break
-                
-        if not active_log:
+        # Close the open session (duration is calculated by the service)
+        result, member_id, active_log = self.check_in_service.check_out(str(member_id))
+        if result != "checked_out":
             messagebox.showerror("Error", "Member is not checked in or already checked out!")
             return
-            
-        check_out_time = get_current_datetime_iso()
-        active_log['check_out_time'] = check_out_time
         
-        # Calculate duration
-        start = datetime.datetime.fromisoformat(active_log['check_in_time'])
-        end = datetime.datetime.fromisoformat(check_out_time)
-        duration = int((end - start).total_seconds() / 60)
-        active_log['duration_minutes'] = duration
-        
-        self.data_manager.save_data("attendance_log.json")
+        self.check_in_service.commit_now()
+        self._schedule_checkpoint()
         self.populate_table()
 
     def delete_log(self):
@@ -375,9 +405,92 @@ class Attendance:
         if log_to_delete:
             confirm = messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this attendance record?")
             if confirm:
-                self.data_manager.attendance_log.remove(log_to_delete)
-                self.data_manager.save_data("attendance_log.json")
+                self.data_manager.delete_record("attendance_log.json", log_to_delete['log_id'])
                 self.populate_table()
                 self.update_date_options()
         else:
             messagebox.showerror("Error", "Could not identify the log record to delete.")
+
+    # ==================== Scanner Mode ====================
+
+    def toggle_scanner_mode(self):
+        """Switches between manual search and rapid barcode/RFID scanning."""
+        self.id_entry.delete(0, "end")
+        self.search_list_frame.place_forget()
+        if self.scanner_var.get():
+            self.id_entry.focus_set()
+            self.show_scan_feedback("Ready to scan", TEXT_SECONDARY_COLOR)
+        else:
+            self.show_scan_feedback("", TEXT_COLOR)
+            self.check_in_service.checkpoint_in_background()
+
+    def process_scan(self):
+        """Checks the scanned member in, or out if they already have an open session.
+        
+        The scan is applied in memory and shown immediately; saving happens
+        on a background thread so the next member can scan right away.
+        """
+        scan = self.id_entry.get().strip()
+        self.id_entry.delete(0, "end")
+        if not scan:
+            return
+        
+        service = self.check_in_service
+        member_id = service.find_member(scan)
+        if member_id is None:
+            self.show_scan_feedback(f"No member found for '{scan}'", DANGER_COLOR)
+            return
+        
+        if member_id in service.open_sessions:
+            result, member_id, log = service.check_out(member_id)
+        else:
+            result, member_id, log = service.check_in(member_id)
+        
+        self._pending_commits.append(service.commit_in_background())
+        if len(self._pending_commits) == 1:
+            self.parent_frame.after(SCAN_COMMIT_POLL_MS, self._poll_pending_commits)
+        self._schedule_checkpoint()
+        
+        member = self.data_manager.get_member(member_id)
+        name = f"{member['first_name']} {member['last_name']}" if member else member_id
+        if result == "checked_in":
+            self.show_scan_feedback(f"Welcome, {name} - checked in", SUCCESS_COLOR)
+        else:
+            self.show_scan_feedback(f"Goodbye, {name} - checked out after {log['duration_minutes']} min", WARNING_COLOR)
+        self.show_log_row(log)
+
+    def show_scan_feedback(self, text, color):
+        """Shows a message that clears itself, instead of a blocking messagebox."""
+        self.scan_feedback_label.configure(text=text, text_color=color)
+        if self._feedback_after_id:
+            self.parent_frame.after_cancel(self._feedback_after_id)
+            self._feedback_after_id = None
+        if text:
+            self._feedback_after_id = self.parent_frame.after(SCAN_FEEDBACK_MS, self._clear_scan_feedback)
+
+    def _clear_scan_feedback(self):
+        self._feedback_after_id = None
+        if self.scan_feedback_label.winfo_exists():
+            self.scan_feedback_label.configure(text="")
+
+    def _poll_pending_commits(self):
+        """Reports background save failures on the UI thread."""
+        if not self.tree.winfo_exists():
+            return
+        still_pending = []
+        for future in self._pending_commits:
+            if not future.done():
+                still_pending.append(future)
+            elif future.exception():
+                self.show_scan_feedback(f"Could not save check-in: {future.exception()}", DANGER_COLOR)
+        self._pending_commits = still_pending
+        if still_pending:
+            self.parent_frame.after(SCAN_COMMIT_POLL_MS, self._poll_pending_commits)
+
+    def _schedule_checkpoint(self):
+        """Rewrites the attendance file once scanning goes quiet."""
+        if self._checkpoint_after_id:
+            self.parent_frame.after_cancel(self._checkpoint_after_id)
+        self._checkpoint_after_id = self.parent_frame.after(
+            SCANNER_IDLE_CHECKPOINT_MS, self.check_in_service.checkpoint_in_background
+        )
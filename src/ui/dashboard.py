@@ -1,10 +1,21 @@
 import customtkinter as ctk
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 from ..styles import *
 from ..analytics import Analytics
+from ..dashboard_cache import DashboardCache
+
+REFRESH_CHECK_INTERVAL_MS = 100
+
+_refresh_worker = None
+
+def _worker():
+    global _refresh_worker
+    if _refresh_worker is None:
+        _refresh_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dashboard")
+    return _refresh_worker
 
 class Dashboard:
     def __init__(self, parent_frame, data_manager):
@@ -12,19 +23,69 @@ class Dashboard:
         self.data_manager = data_manager
         self.analytics = Analytics(data_manager)
         
+        # Last-known metrics from disk; stale ones are refreshed in the background
+        self.cache = DashboardCache.for_data_manager(data_manager)
+        self.metrics = self.cache.values()
+        self._refresh = None
+        self._anchor = None  # A widget of the current layout, to tell if we are still shown
+        
+        self.start_refresh()
         self.setup_ui()
 
+    def start_refresh(self):
+        """Recomputes the series whose source data changed since they were cached.
+        
+        Series never computed before are computed right away; the others
+        keep showing their last-known value until the background refresh
+        finishes.
+        
+        Returns:
+            bool: True if a background refresh was started
+        """
+        with self.data_manager.lock:
+            stamps = DashboardCache.current_stamps(self.data_manager)
+            stale = self.cache.stale_series(stamps)
+            snapshot = self.data_manager.snapshot() if stale else None
+        
+        missing = [name for name in stale if name not in self.metrics]
+        if missing:
+            self.metrics.update(self.cache.refresh(self.data_manager, snapshot, stamps, missing))
+            stale = [name for name in stale if name not in missing]
+        if not stale or self._refresh is not None:
+            return False
+        
+        self._refresh = _worker().submit(self.cache.refresh, self.data_manager, snapshot, stamps, stale)
+        self.parent_frame.after(REFRESH_CHECK_INTERVAL_MS, self._check_refresh)
+        return True
+
+    def _check_refresh(self):
+        if not self._refresh.done():
+            self.parent_frame.after(REFRESH_CHECK_INTERVAL_MS, self._check_refresh)
+            return
+        refresh, self._refresh = self._refresh, None
+        if refresh.exception() is not None:
+            print(f"Dashboard refresh failed: {refresh.exception()}")
+            return
+        self.metrics.update(refresh.result())
+        if self._anchor is None or not self._anchor.winfo_exists():
+            return  # Another screen is shown now
+        # Data may have changed again while refreshing
+        if not self.start_refresh():
+            self.rebuild()
+
     def setup_ui(self):
-        # Grid configuration - 2 rows of stats, 2 rows of graphs
+        # Grid configuration - 2 rows of stats, 4 rows of graphs
         self.parent_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
         self.parent_frame.grid_rowconfigure(0, weight=0)  # Stats row 1
         self.parent_frame.grid_rowconfigure(1, weight=0)  # Stats row 2
         self.parent_frame.grid_rowconfigure(2, weight=1)  # Graphs row 1
         self.parent_frame.grid_rowconfigure(3, weight=1)  # Graphs row 2
+        self.parent_frame.grid_rowconfigure(4, weight=1)  # Cohort heatmap
+        self.parent_frame.grid_rowconfigure(5, weight=1)  # Session lengths
 
         # Load Basic Stats
         total_members = len(self.data_manager.members_db)
-        pending_payments = len([p for p in self.data_manager.payments_log if p['status'] == 'Unpaid'])
+        pending_payments = self.analytics.get_outstanding_balances()['unpaid_count']
         # Filter check-ins to today only
         today = datetime.date.today().isoformat()
         active_check_ins = 0
@@ -42,13 +103,12 @@ class Dashboard:
         frozen_memberships = len([m for m in self.data_manager.membership_history if m.get('status') == 'Frozen'])
 
         # Load Analytics Stats
-        # Load Analytics Stats
-        retention_rate = self.analytics.calculate_retention_rate()
-        at_risk_members = self.analytics.get_at_risk_members(30)
+        retention_rate = self.metrics['retention_rate']
+        at_risk_members = self.metrics['at_risk_members']
         at_risk_count = len(at_risk_members)
 
         # Row 1: Basic Stats
-        self.create_stat_card("Total Members", total_members, 0, 0)
+        self._anchor = self.create_stat_card("Total Members", total_members, 0, 0)
         self.create_stat_card("Pending Payments", pending_payments, 0, 1, 
                             text_color=DANGER_COLOR if pending_payments > 0 else TEXT_COLOR)
         self.create_stat_card("Active Check-ins", active_check_ins, 0, 2, 
@@ -63,6 +123,14 @@ class Dashboard:
         self.create_stat_card("Expiring Soon", at_risk_count, 1, 1,
                             text_color=DANGER_COLOR if at_risk_count > 0 else TEXT_COLOR)
 
+        # Scored live: the risk index only rescores members whose visits or
+        # payments changed
+        churn_risk = self.analytics.get_churn_risk_summary()
+        self.create_stat_card("High Churn Risk", churn_risk['high'], 1, 2,
+                            text_color=DANGER_COLOR if churn_risk['high'] > 0 else TEXT_COLOR)
+        self.create_stat_card("Medium Churn Risk", churn_risk['medium'], 1, 3,
+                            text_color=ACCENT_COLOR if churn_risk['medium'] > 0 else TEXT_COLOR)
+
         # Row 3: Graphs
         self.create_revenue_forecast_graph(2, 0)
         self.create_retention_trend_graph(2, 2)
@@ -71,6 +139,27 @@ class Dashboard:
         self.create_historical_revenue_graph(3, 0)
         self.create_peak_hours_graph(3, 2)
 
+        # Row 5: Cohort Retention
+        self.create_cohort_heatmap(4, 0)
+
+        # Row 6: Session Lengths
+        self.create_session_length_graph(5, 0)
+        self.create_session_length_by_hour_graph(5, 2)
+
+    def on_data_changed(self, changes):
+        """Rebuilds the cards and graphs after data is reloaded.
+        
+        Series computed from the changed data are refreshed first, in the
+        background; the layout is rebuilt once they are ready.
+        """
+        if not self.start_refresh() and self._refresh is None:
+            self.rebuild()
+
+    def rebuild(self):
+        for widget in self.parent_frame.winfo_children():
+            widget.destroy()
+        self.setup_ui()
+
     def create_stat_card(self, title, value, row, col, text_color=TEXT_COLOR):
         card = ctk.CTkFrame(self.parent_frame, fg_color=SIDEBAR_COLOR)
         card.grid(row=row, column=col, padx=10, pady=10, sticky="ew")
@@ -82,11 +171,12 @@ class Dashboard:
         value_lbl = ctk.CTkLabel(card, text=str(value), font=ctk.CTkFont(size=28, weight="bold"), 
                                 text_color=text_color)
         value_lbl.pack(pady=(0, 10))
+        return card
 
     def create_revenue_forecast_graph(self, row, col):
         """Creates revenue prediction graph."""
-        predictions = self.analytics.predict_revenue(6)
-        confidence = self.analytics.calculate_confidence_interval()
+        predictions = self.metrics['revenue_forecast']
+        confidence = self.metrics['confidence']
         
         # Create Figure
         fig = Figure(figsize=(6, 4), dpi=100, facecolor=CONTENT_COLOR)
@@ -126,7 +216,7 @@ class Dashboard:
 
     def create_retention_trend_graph(self, row, col):
         """Creates retention rate trend graph."""
-        trend = self.analytics.get_retention_trend(6)
+        trend = self.metrics['retention_trend']
         
         # Create Figure
         fig = Figure(figsize=(6, 4), dpi=100, facecolor=CONTENT_COLOR)
@@ -166,7 +256,7 @@ class Dashboard:
 
     def create_historical_revenue_graph(self, row, col):
         """Creates historical revenue graph."""
-        historical = self.analytics.get_historical_revenue_trend(6)
+        historical = self.metrics['historical_revenue']
         
         # Create Figure
         fig = Figure(figsize=(6, 4), dpi=100, facecolor=CONTENT_COLOR)
@@ -201,25 +291,10 @@ class Dashboard:
 
     def create_peak_hours_graph(self, row, col):
         """Creates peak hours graph."""
-        # Prepare Data (Peak Hours) - Last 7 Days Only
-        hours = []
-        today = datetime.date.today()
-        seven_days_ago = today - datetime.timedelta(days=7)
-        
-        for log in self.data_manager.attendance_log:
-            check_in = log.get('check_in_time')
-            if check_in:
-                try:
-                    dt = datetime.datetime.fromisoformat(check_in.replace(' ', 'T') if ' ' in check_in else check_in)
-                    # Only include check-ins from last 7 days
-                    if dt.date() >= seven_days_ago:
-                        hours.append(dt.hour)
-                except ValueError:
-                    pass
-        
-        hour_counts = Counter(hours)
-        x_hours = list(range(6, 23))  # 6 AM to 10 PM
-        y_counts = [hour_counts.get(h, 0) for h in x_hours]
+        # Peak Hours - Last 7 Days Only, 6 AM to 10 PM
+        peak_hours = self.metrics['peak_hours']
+        x_hours = peak_hours['hours']
+        y_counts = peak_hours['counts']
 
         # Create Figure
         fig = Figure(figsize=(6, 4), dpi=100, facecolor=CONTENT_COLOR)
@@ -249,3 +324,137 @@ class Dashboard:
         canvas = FigureCanvasTkAgg(fig, master=graph_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(fill="both", expand=True)
+
+    def create_cohort_heatmap(self, row, col):
+        """Creates the cohort retention heatmap (join month x months since joining)."""
+        cohorts = self.metrics['cohort_retention']
+        
+        fig = Figure(figsize=(12, 4), dpi=100, facecolor=CONTENT_COLOR)
+        ax = fig.add_subplot(111)
+        ax.set_facecolor(CONTENT_COLOR)
+        
+        if any(cohorts['sizes']):
+            # Months not reached yet (None) stay blank
+            values = [[float('nan') if rate is None else rate for rate in rates] for rates in cohorts['rates']]
+            image = ax.imshow(values, cmap="Greens", vmin=0, vmax=100, aspect='auto')
+            offsets = range(len(cohorts['cohorts']))
+            ax.set_xticks(offsets)
+            ax.set_xticklabels([str(offset) for offset in offsets])
+            ax.set_yticks(offsets)
+            ax.set_yticklabels([f"{label} ({size})" for label, size in zip(cohorts['cohorts'], cohorts['sizes'])])
+            if len(offsets) <= 12:
+                for y, rates in enumerate(cohorts['rates']):
+                    for x, rate in enumerate(rates):
+                        if rate is not None:
+                            ax.text(x, y, f"{rate:.0f}", ha='center', va='center', fontsize=7,
+                                    color=TEXT_COLOR if rate > 50 else TEXT_SECONDARY_COLOR)
+            colorbar = fig.colorbar(image, ax=ax)
+            colorbar.ax.tick_params(colors=TEXT_SECONDARY_COLOR)
+        else:
+            ax.text(0.5, 0.5, "No Members Joined Recently", ha='center', va='center',
+                   color=TEXT_SECONDARY_COLOR)
+        
+        ax.set_title("Cohort Retention (% Still Holding a Membership)", color=TEXT_COLOR, fontsize=12)
+        ax.set_xlabel("Months Since Joining", color=TEXT_COLOR)
+        ax.set_ylabel("Join Month (Members)", color=TEXT_COLOR)
+        ax.tick_params(axis='x', colors=TEXT_SECONDARY_COLOR)
+        ax.tick_params(axis='y', colors=TEXT_SECONDARY_COLOR, labelsize=8)
+        for spine in ax.spines.values():
+            spine.set_color(CONTENT_COLOR)
+
+        fig.tight_layout()
+
+        # Embed in Tkinter
+        graph_frame = ctk.CTkFrame(self.parent_frame, fg_color=CONTENT_COLOR)
+        graph_frame.grid(row=row, column=col, columnspan=4, padx=10, pady=10, sticky="nsew")
+        
+        canvas = FigureCanvasTkAgg(fig, master=graph_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
+
+    def create_session_length_graph(self, row, col):
+        """Creates the daily session length trend graph (mean, median and p90)."""
+        # Computed live: the session index is updated on every check-out
+        trend = self.analytics.get_session_duration_trend(14)
+        summary = self.analytics.get_session_duration_stats(30)
+        
+        fig = Figure(figsize=(6, 4), dpi=100, facecolor=CONTENT_COLOR)
+        ax = fig.add_subplot(111)
+        ax.set_facecolor(CONTENT_COLOR)
+        
+        if any(value is not None for value in trend['mean']):
+            x = range(len(trend['days']))
+            p50 = [float('nan') if v is None else v for v in trend['p50']]
+            p90 = [float('nan') if v is None else v for v in trend['p90']]
+            mean = [float('nan') if v is None else v for v in trend['mean']]
+            ax.fill_between(x, p50, p90, color=PRIMARY_COLOR, alpha=0.2, label='Median to p90')
+            ax.plot(x, p50, color=PRIMARY_COLOR, marker='o', linewidth=2, markersize=4, label='Median')
+            ax.plot(x, mean, color=ACCENT_COLOR, linestyle='--', linewidth=1.5, label='Mean')
+            ax.set_xticks(x)
+            ax.set_xticklabels(trend['days'], rotation=45, ha='right')
+            ax.legend(facecolor=SIDEBAR_COLOR, edgecolor=TEXT_SECONDARY_COLOR)
+        else:
+            ax.text(0.5, 0.5, "No Completed Sessions", ha='center', va='center',
+                   color=TEXT_SECONDARY_COLOR)
+        
+        title = "Session Length - Last 14 Days"
+        if summary['count']:
+            title += f" (30-day median {summary['p50']:.0f} min, p90 {summary['p90']:.0f} min)"
+        ax.set_title(title, color=TEXT_COLOR, fontsize=12)
+        ax.set_xlabel("Day", color=TEXT_COLOR)
+        ax.set_ylabel("Minutes", color=TEXT_COLOR)
+        ax.tick_params(axis='x', colors=TEXT_SECONDARY_COLOR)
+        ax.tick_params(axis='y', colors=TEXT_SECONDARY_COLOR)
+        ax.spines['bottom'].set_color(TEXT_SECONDARY_COLOR)
+        ax.spines['top'].set_color(CONTENT_COLOR)
+        ax.spines['left'].set_color(TEXT_SECONDARY_COLOR)
+        ax.spines['right'].set_color(CONTENT_COLOR)
+
+        fig.tight_layout()
+
+        # Embed in Tkinter
+        graph_frame = ctk.CTkFrame(self.parent_frame, fg_color=CONTENT_COLOR)
+        graph_frame.grid(row=row, column=col, columnspan=2, padx=10, pady=10, sticky="nsew")
+        
+        canvas = FigureCanvasTkAgg(fig, master=graph_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
+
+    def create_session_length_by_hour_graph(self, row, col):
+        """Creates the session length by check-in hour graph."""
+        by_hour = self.analytics.get_session_duration_by_hour()
+        
+        fig = Figure(figsize=(6, 4), dpi=100, facecolor=CONTENT_COLOR)
+        ax = fig.add_subplot(111)
+        ax.set_facecolor(CONTENT_COLOR)
+        
+        if any(value is not None for value in by_hour['p50']):
+            p50 = [0 if v is None else v for v in by_hour['p50']]
+            p90 = [0 if v is None else v for v in by_hour['p90']]
+            ax.bar(by_hour['hours'], p90, color=ACCENT_COLOR, alpha=0.4, label='p90')
+            ax.bar(by_hour['hours'], p50, color=ACCENT_COLOR, label='Median')
+            ax.set_xticks(by_hour['hours'][::2])  # Show every other hour
+            ax.legend(facecolor=SIDEBAR_COLOR, edgecolor=TEXT_SECONDARY_COLOR)
+        else:
+            ax.text(0.5, 0.5, "No Completed Sessions", ha='center', va='center',
+                   color=TEXT_SECONDARY_COLOR)
+        
+        ax.set_title("Session Length by Check-in Hour", color=TEXT_COLOR, fontsize=12)
+        ax.set_xlabel("Hour of Day", color=TEXT_COLOR)
+        ax.set_ylabel("Minutes", color=TEXT_COLOR)
+        ax.tick_params(axis='x', colors=TEXT_SECONDARY_COLOR)
+        ax.tick_params(axis='y', colors=TEXT_SECONDARY_COLOR)
+        ax.spines['bottom'].set_color(TEXT_SECONDARY_COLOR)
+        ax.spines['top'].set_color(CONTENT_COLOR)
+        ax.spines['left'].set_color(TEXT_SECONDARY_COLOR)
+        ax.spines['right'].set_color(CONTENT_COLOR)
+
+        fig.tight_layout()
+
+        # Embed in Tkinter
+        graph_frame = ctk.CTkFrame(self.parent_frame, fg_color=CONTENT_COLOR)
+        graph_frame.grid(row=row, column=col, columnspan=2, padx=10, pady=10, sticky="nsew")
+        
+        canvas = FigureCanvasTkAgg(fig, master=graph_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
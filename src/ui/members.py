@@ -4,11 +4,16 @@ import tkinter as tk
 import datetime
 from ..styles import *
 from ..utils import *
+from ..analytics import Analytics
+from ..balance_ledger import ledger_for
 
 class Members:
     def __init__(self, parent_frame, data_manager):
         self.parent_frame = parent_frame
         self.data_manager = data_manager
+        self.analytics = Analytics(data_manager)
+        self.sort_column = "id"
+        self.sort_reverse = False
         
         self.setup_ui()
         self.populate_table()
@@ -42,16 +47,21 @@ class Members:
         self.table_frame = ctk.CTkFrame(self.parent_frame, fg_color="transparent")
         self.table_frame.grid(row=1, column=0, sticky="nsew", padx=20, pady=(0, 20))
         
-        columns = ("id", "first_name", "last_name", "contact", "plan", "trainer", "status")
+        columns = ("id", "first_name", "last_name", "contact", "plan", "trainer", "status", "risk")
         self.tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", selectmode="browse")
         
-        self.tree.heading("id", text="ID")
-        self.tree.heading("first_name", text="First Name")
-        self.tree.heading("last_name", text="Last Name")
-        self.tree.heading("contact", text="Contact")
-        self.tree.heading("plan", text="Plan")
-        self.tree.heading("trainer", text="Trainer")
-        self.tree.heading("status", text="Status")
+        self.headings = {
+            "id": "ID",
+            "first_name": "First Name",
+            "last_name": "Last Name",
+            "contact": "Contact",
+            "plan": "Plan",
+            "trainer": "Trainer",
+            "status": "Status",
+            "risk": "Churn Risk",
+        }
+        for column, text in self.headings.items():
+            self.tree.heading(column, text=text, command=lambda c=column: self.sort_by(c))
         
         self.tree.column("id", width=80, anchor="center")
         self.tree.column("first_name", width=120)
@@ -60,6 +70,7 @@ class Members:
         self.tree.column("plan", width=120)
         self.tree.column("trainer", width=120)
         self.tree.column("status", width=100, anchor="center")
+        self.tree.column("risk", width=110, anchor="center")
 
         # Scrollbar
         scrollbar = ctk.CTkScrollbar(self.table_frame, orientation="vertical", command=self.tree.yview)
@@ -71,7 +82,15 @@ class Members:
     def populate_table(self, filter_query=None):
         for item in self.tree.get_children():
             self.tree.delete(item)
-            
+        
+        # Each member's current (active or frozen) membership, in one pass
+        current = {}
+        for ms in self.data_manager.membership_history:
+            if ms['status'] in ('Active', 'Frozen') and ms['member_id'] not in current:
+                current[ms['member_id']] = ms
+        risk_scores = self.analytics.get_churn_risk_scores()
+        
+        rows = []
         for member_id, member in self.data_manager.members_db.items():
             if filter_query:
                 full_name = f"{member['first_name']} {member['last_name']}".lower()
@@ -83,36 +102,58 @@ class Members:
             plan_name = "-"
             trainer_name = "-"
             
-            # Find active membership
-            # Find active or frozen membership
-            for ms in self.data_manager.membership_history:
-                if ms['member_id'] == member_id:
-                    if ms['status'] == 'Active':
-                        status = "Active"
-                    elif ms['status'] == 'Frozen':
-                        status = "Frozen"
-                    else:
-                        continue
-
-                    plan = self.data_manager.get_plan(ms['plan_id'])
-                    if plan:
-                        plan_name = plan['name']
-                        
-                    if ms.get('assigned_trainer_id'):
-                        trainer = self.data_manager.get_trainer(ms['assigned_trainer_id'])
-                        if trainer:
-                            trainer_name = f"{trainer['first_name']} {trainer['last_name']}"
-                    break
+            ms = current.get(member_id)
+            if ms:
+                status = ms['status']
+                plan = self.data_manager.get_plan(ms['plan_id'])
+                if plan:
+                    plan_name = plan['name']
+                    
+                if ms.get('assigned_trainer_id'):
+                    trainer = self.data_manager.get_trainer(ms['assigned_trainer_id'])
+                    if trainer:
+                        trainer_name = f"{trainer['first_name']} {trainer['last_name']}"
             
-            self.tree.insert("", "end", values=(
+            risk = risk_scores.get(member_id)
+            rows.append((
                 member_id,
                 member['first_name'],
                 member['last_name'],
                 member['contact'],
                 plan_name,
                 trainer_name,
-                status
+                status,
+                f"{risk['score']:.0f} ({risk['level']})" if risk else "-"
             ))
+        
+        index = list(self.headings).index(self.sort_column)
+        if self.sort_column == "risk":
+            key = lambda row: risk_scores[row[0]]['score'] if row[0] in risk_scores else -1
+        else:
+            key = lambda row: str(row[index]).lower()
+        rows.sort(key=key, reverse=self.sort_reverse)
+        
+        for column, text in self.headings.items():
+            arrow = (" \u25BC" if self.sort_reverse else " \u25B2") if column == self.sort_column else ""
+            self.tree.heading(column, text=text + arrow)
+        for row in rows:
+            self.tree.insert("", "end", values=row)
+
+    def sort_by(self, column):
+        """Sorts the table by a column; clicking the same column again reverses it."""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            # Riskiest first is the useful order for scores
+            self.sort_column, self.sort_reverse = column, column == "risk"
+        self.populate_table(self.search_entry.get())
+
+    def on_data_changed(self, changes):
+        """Refreshes the table when reloaded data touches what it shows."""
+        # Not on check-ins: risk scores are picked up on the next search or sort
+        if changes.keys() & {"members.json", "membership_history.json", "plans.json", "trainers.json",
+                             "payments_log.json"}:
+            self.populate_table(self.search_entry.get())
 
     def open_add_member_popup(self):
         AddMemberPopup(self)
@@ -135,8 +176,7 @@ class Members:
         if member:
             confirm = tk.messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {member['first_name']} {member['last_name']}? This cannot be undone.")
             if confirm:
-                del self.data_manager.members_db[member_id]
-                self.data_manager.save_data("members.json")
+                self.data_manager.delete_record("members.json", member_id)
                 self.populate_table()
 
     def open_member_profile(self):
@@ -233,7 +273,7 @@ class AddMemberPopup(ctk.CTkToplevel):
             return
 
         # 3. Create Member
-        member_id = generate_unique_id("M")
+        member_id = self.data_manager.new_key("members.json", "M")
         new_member = {
             "first_name": fname,
             "last_name": lname,
@@ -253,7 +293,7 @@ class AddMemberPopup(ctk.CTkToplevel):
         start_date = get_current_date_iso()
         end_date = calculate_end_date(start_date, plan['duration_months'])
         
-        ms_id = generate_unique_id("MS")
+        ms_id = self.data_manager.new_key("membership_history.json", "MS")
         membership = {
             "membership_id": ms_id,
             "member_id": member_id,
@@ -263,15 +303,14 @@ class AddMemberPopup(ctk.CTkToplevel):
             "end_date": end_date,
             "status": "Active"
         }
-        self.data_manager.membership_history.append(membership)
-        self.data_manager.save_data("membership_history.json")
+        self.data_manager.add_record("membership_history.json", membership)
         
         # 5. Generate Payment
         amount = plan['base_price']
         if trainer:
             amount += trainer['fee']
             
-        payment_id = generate_unique_id("PAY")
+        payment_id = self.data_manager.new_key("payments_log.json", "PAY")
         payment = {
             "payment_id": payment_id,
             "member_id": member_id,
@@ -282,8 +321,7 @@ class AddMemberPopup(ctk.CTkToplevel):
             "payment_date": None,
             "status": "Unpaid"
         }
-        self.data_manager.payments_log.append(payment)
-        self.data_manager.save_data("payments_log.json")
+        self.data_manager.add_record("payments_log.json", payment)
         
         # 6. Finish
         self.parent_ui.populate_table()
@@ -465,6 +503,19 @@ class MemberProfilePopup(ctk.CTkToplevel):
 
     def build_payments_tab(self):
         frame = self.tabview.tab("Payments")
+        ledger = ledger_for(self.data_manager)
+        
+        # Outstanding balance, by how overdue it is
+        balance = ledger.balance(self.member_id)
+        aging = ledger.member_aging(self.member_id)
+        overdue = ", ".join(f"{bucket} days: ${amount:,.2f}" for bucket, amount in aging.items()
+                            if amount and bucket != "not_due")
+        balance_lbl = ctk.CTkLabel(
+            frame,
+            text=f"Outstanding balance: ${balance:,.2f}" + (f" (overdue {overdue})" if overdue else ""),
+            text_color=DANGER_COLOR if balance else SUCCESS_COLOR
+        )
+        balance_lbl.pack(side="top", anchor="w", padx=10, pady=(10, 0))
         
         # Create Treeview
         columns = ("id", "amount", "status", "due_date", "paid_date")
@@ -489,8 +540,9 @@ class MemberProfilePopup(ctk.CTkToplevel):
         tree.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         scrollbar.pack(side="right", fill="y", pady=10)
         
-        # Populate
-        payments = [p for p in self.data_manager.payments_log if p['member_id'] == self.member_id]
+        # Populate from the balance ledger's per-member index instead of
+        # filtering the whole payments log
+        payments = ledger.member_payments(self.member_id)
         payments.sort(key=lambda x: x['due_date'], reverse=True)
         
         for p in payments:
@@ -743,7 +795,7 @@ class EditMemberPopup(ctk.CTkToplevel):
                     amount += trainer['fee']
                 
                 # Create new payment record
-                payment_id = generate_unique_id("PAY")
+                payment_id = self.data_manager.new_key("payments_log.json", "PAY")
                 new_payment = {
                     "payment_id": payment_id,
                     "member_id": self.member_id,
@@ -755,8 +807,7 @@ class EditMemberPopup(ctk.CTkToplevel):
                     "status": "Unpaid"
                 }
                 
-                self.data_manager.payments_log.append(new_payment)
-                self.data_manager.save_data("payments_log.json")
+                self.data_manager.add_record("payments_log.json", new_payment)
                 
                 tk.messagebox.showinfo("Payment Created", 
                     f"Created new unpaid payment record (${amount}) for plan/trainer change.")
@@ -823,13 +874,12 @@ class EditMemberPopup(ctk.CTkToplevel):
                         if payment.get('membership_id') == membership_id and payment['status'] == 'Unpaid':
                             payments_to_delete.append(payment)
                     
-                    # Delete the payments
-                    for payment in payments_to_delete:
-                        self.data_manager.payments_log.remove(payment)
+                    # Delete the payments (saved together)
+                    with self.data_manager.batch():
+                        for payment in payments_to_delete:
+                            self.data_manager.delete_record("payments_log.json", payment['payment_id'])
                     
-                    # Save the updated payments log
                     if payments_to_delete:
-                        self.data_manager.save_data("payments_log.json")
                         tk.messagebox.showinfo("Payments Deleted", 
                             f"Deleted {len(payments_to_delete)} unpaid payment(s) for this expired membership.")
                 
@@ -849,7 +899,7 @@ class EditMemberPopup(ctk.CTkToplevel):
                         amount += trainer['fee']
                     
                     # Create new payment record
-                    payment_id = generate_unique_id("PAY")
+                    payment_id = self.data_manager.new_key("payments_log.json", "PAY")
                     new_payment = {
                         "payment_id": payment_id,
                         "member_id": self.member_id,
@@ -861,14 +911,13 @@ class EditMemberPopup(ctk.CTkToplevel):
                         "status": "Unpaid"
                     }
                     
-                    self.data_manager.payments_log.append(new_payment)
-                    self.data_manager.save_data("payments_log.json")
+                    self.data_manager.add_record("payments_log.json", new_payment)
                     
                     tk.messagebox.showinfo("Payment Created", 
                         f"Created new unpaid payment record (${amount}) for reactivated membership.")
             
-            self.data_manager.save_data("membership_history.json")
+            self.data_manager.update_record("membership_history.json", self.latest_membership['membership_id'])
 
-        self.data_manager.save_data("members.json")
+        self.data_manager.update_record("members.json", self.member_id)
         self.parent_ui.populate_table()
         self.destroy()
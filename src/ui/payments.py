@@ -2,11 +2,18 @@ import customtkinter as ctk
 from tkinter import ttk
 from ..styles import *
 from ..utils import *
+from ..analytics import Analytics
+from ..balance_ledger import ledger_for
+
+PAGE_SIZE = 200  # Rows added to the table at a time
 
 class Payments:
     def __init__(self, parent_frame, data_manager):
         self.parent_frame = parent_frame
         self.data_manager = data_manager
+        self.analytics = Analytics(data_manager)
+        self.rows_shown = 0
+        self.loading_more = False
         
         self.setup_ui()
         self.populate_table()
@@ -14,7 +21,8 @@ class Payments:
     def setup_ui(self):
         self.parent_frame.grid_columnconfigure(0, weight=1)
         self.parent_frame.grid_rowconfigure(0, weight=0)
-        self.parent_frame.grid_rowconfigure(1, weight=1)
+        self.parent_frame.grid_rowconfigure(1, weight=0)
+        self.parent_frame.grid_rowconfigure(2, weight=1)
 
         # Controls
         self.controls_frame = ctk.CTkFrame(self.parent_frame, fg_color="transparent")
@@ -47,9 +55,13 @@ class Payments:
         )
         self.whatsapp_btn.pack(side="left")
 
+        # Outstanding balance summary
+        self.summary_lbl = ctk.CTkLabel(self.parent_frame, text="", anchor="w", text_color=TEXT_SECONDARY_COLOR)
+        self.summary_lbl.grid(row=1, column=0, sticky="ew", padx=20, pady=(0, 10))
+
         # Table
         self.table_frame = ctk.CTkFrame(self.parent_frame, fg_color="transparent")
-        self.table_frame.grid(row=1, column=0, sticky="nsew", padx=20, pady=(0, 20))
+        self.table_frame.grid(row=2, column=0, sticky="nsew", padx=20, pady=(0, 20))
         
         columns = ("id", "member", "amount", "due_date", "status", "paid_date")
         self.tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", selectmode="browse")
@@ -72,35 +84,43 @@ class Payments:
         self.tree.tag_configure("Unpaid", foreground=DANGER_COLOR)
         self.tree.tag_configure("Paid", foreground=SUCCESS_COLOR)
 
-        scrollbar = ctk.CTkScrollbar(self.table_frame, orientation="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = ctk.CTkScrollbar(self.table_frame, orientation="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_table_scrolled)
         
         self.tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar.pack(side="right", fill="y")
+
+    def update_summary(self):
+        """Shows the outstanding total and how overdue it is."""
+        balances = self.analytics.get_outstanding_balances()
+        aging = balances['aging']
+        self.summary_lbl.configure(text=(
+            f"Outstanding: ${balances['total']:,.2f} across {balances['unpaid_count']} unpaid payments "
+            f"({balances['overdue_count']} overdue)  |  "
+            f"Overdue 0-30 days: ${aging['0-30']['amount']:,.2f}  |  "
+            f"31-60 days: ${aging['31-60']['amount']:,.2f}  |  "
+            f"60+ days: ${aging['60+']['amount']:,.2f}"
+        ))
 
     def populate_table(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        show_unpaid_only = self.unpaid_var.get()
-        
-        # Sort payments: Unpaid first (by due_date asc), then Paid (by payment_date desc)
-        payments_to_display = []
-        for payment in self.data_manager.payments_log:
-            if show_unpaid_only and payment['status'] != 'Unpaid':
-                continue
-            payments_to_display.append(payment)
-        
-        # Sort: Unpaid payments first (earliest due date first), then Paid payments (most recent payment first)
-        unpaid_payments = [p for p in payments_to_display if p['status'] == 'Unpaid']
-        paid_payments = [p for p in payments_to_display if p['status'] == 'Paid']
-        
-        unpaid_payments.sort(key=lambda x: x['due_date'])
-        paid_payments.sort(key=lambda x: x.get('payment_date') or '', reverse=True)
-        
-        sorted_payments = unpaid_payments + paid_payments
-        
-        for payment in sorted_payments:
+        self.update_summary()
+        self.tree.delete(*self.tree.get_children())
+        self.rows_shown = 0
+        self.load_more()
+        self.tree.yview_moveto(0)
+
+    def load_more(self):
+        """Appends the next page of payments to the table.
+        
+        Unpaid payments come first (earliest due date first), then paid
+        ones (most recent payment first). The balance ledger keeps both
+        in that order, so a page is read straight off it.
+        """
+        self.loading_more = False
+        page = ledger_for(self.data_manager).payments_page(self.rows_shown, PAGE_SIZE, self.unpaid_var.get())
+        self.rows_shown += len(page)
+        
+        for payment in page:
             member = self.data_manager.get_member(payment['member_id'])
             member_name = f"{member['first_name']} {member['last_name']}" if member else "Unknown"
             
@@ -113,6 +133,20 @@ class Payments:
                 payment['payment_date'] or "-"
             ), tags=(payment['status'],))
 
+    def on_table_scrolled(self, first, last):
+        """Moves the scrollbar and loads the next page near the bottom of the table."""
+        self.scrollbar.set(first, last)
+        if self.loading_more or float(last) < 0.95:
+            return
+        if self.rows_shown < ledger_for(self.data_manager).queue_length(self.unpaid_var.get()):
+            self.loading_more = True
+            self.tree.after_idle(self.load_more)
+
+    def on_data_changed(self, changes):
+        """Refreshes the table when reloaded data touches what it shows."""
+        if changes.keys() & {"payments_log.json", "members.json"}:
+            self.populate_table()
+
     def mark_as_paid(self):
         selected = self.tree.selection()
         if not selected:
@@ -129,10 +163,9 @@ class Payments:
                 payment['status'] = 'Paid'
                 payment['amount_paid'] = payment['amount_due']
                 payment['payment_date'] = get_current_datetime_iso()
+                self.data_manager.update_record("payments_log.json", payment['payment_id'])
                 break
         
-        self.data_manager.save_data("payments_log.json")
-        self.data_manager.save_data("payments_log.json")
         self.populate_table()
 
     def mark_as_unpaid(self):
@@ -151,9 +184,9 @@ class Payments:
                 payment['status'] = 'Unpaid'
                 payment['amount_paid'] = 0.0
                 payment['payment_date'] = None
+                self.data_manager.update_record("payments_log.json", payment['payment_id'])
                 break
         
-        self.data_manager.save_data("payments_log.json")
         self.populate_table()
 
     def edit_amount(self):
@@ -185,7 +218,7 @@ class Payments:
                 if target_payment['status'] == 'Paid':
                     target_payment['amount_paid'] = new_amount # Update paid amount if already paid
                 
-                self.data_manager.save_data("payments_log.json")
+                self.data_manager.update_record("payments_log.json", target_payment['payment_id'])
                 self.populate_table()
             except ValueError:
                 tk.messagebox.showerror("Invalid Input", "Please enter a valid number.")
@@ -3,6 +3,12 @@ from tkinter import ttk, messagebox
 from ..styles import *
 from datetime import datetime
 
+BACKUP_PROGRESS_POLL_MS = 500
+BACKUP_MODES_DISPLAY = {
+    "incremental": "Incremental",
+    "archive": "Compressed Archive"
+}
+
 class Settings:
     """Settings module for backup management and system configuration."""
     
@@ -13,7 +19,12 @@ class Settings:
         self.auth_manager = auth_manager
         
         self.setup_ui()
-        self.load_backups()
+        
+        # Thin clients have no local backups; the server takes them
+        if self.backup_manager:
+            self._last_backup_state = self.backup_manager.get_progress()['state']
+            self.load_backups()
+            self.poll_backup_progress()
     
     def setup_ui(self):
         """Sets up the settings UI."""
@@ -37,11 +48,13 @@ class Settings:
         self.tabview.grid(row=1, column=0, sticky="nsew", padx=20, pady=(0, 20))
         
         # Create tabs
-        self.tabview.add("Backup & Restore")
+        if self.backup_manager:
+            self.tabview.add("Backup & Restore")
         self.tabview.add("Account")
         
         # Build tab contents
-        self.build_backup_tab()
+        if self.backup_manager:
+            self.build_backup_tab()
         self.build_account_tab()
     
     def build_backup_tab(self):
@@ -77,16 +90,44 @@ class Settings:
             border_color=PRIMARY_COLOR,
             height=40
         )
-        refresh_btn.grid(row=0, column=1, padx=10, pady=10, sticky="e")
+        refresh_btn.grid(row=0, column=2, padx=10, pady=10, sticky="e")
+        
+        # Backup type
+        self.backup_mode_var = ctk.StringVar(value=BACKUP_MODES_DISPLAY[self.backup_manager.backup_mode])
+        backup_mode_menu = ctk.CTkOptionMenu(
+            controls_frame,
+            values=list(BACKUP_MODES_DISPLAY.values()),
+            variable=self.backup_mode_var,
+            command=self.change_backup_mode,
+            height=40
+        )
+        backup_mode_menu.grid(row=0, column=1, padx=10, pady=10, sticky="w")
         
         # Info label
+        open_hour, close_hour = self.backup_manager.opening_hours
         info_label = ctk.CTkLabel(
             controls_frame,
-            text="Backups are automatically created when you close the app. Last 7 backups are kept.",
+            text=(f"Backups are created in the background when you close the app and every "
+                  f"{self.backup_manager.schedule_interval_minutes} minutes between "
+                  f"{open_hour}:00 and {close_hour}:00. Older backups are thinned out to "
+                  f"{self._describe_retention()}."),
+            font=ctk.CTkFont(size=11),
+            text_color=TEXT_SECONDARY_COLOR
+        )
+        info_label.grid(row=1, column=0, columnspan=3, padx=10, pady=(0, 10), sticky="w")
+        
+        # Background backup progress
+        self.backup_progress_bar = ctk.CTkProgressBar(controls_frame, progress_color=SUCCESS_COLOR)
+        self.backup_progress_bar.set(0)
+        self.backup_progress_bar.grid(row=2, column=0, columnspan=2, padx=10, pady=(0, 5), sticky="ew")
+        
+        self.backup_progress_label = ctk.CTkLabel(
+            controls_frame,
+            text="",
             font=ctk.CTkFont(size=11),
             text_color=TEXT_SECONDARY_COLOR
         )
-        info_label.grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        self.backup_progress_label.grid(row=2, column=2, padx=10, pady=(0, 5), sticky="e")
         
         # Backups list frame
         list_frame = ctk.CTkFrame(tab, fg_color=SIDEBAR_COLOR)
@@ -95,18 +136,22 @@ class Settings:
         list_frame.grid_rowconfigure(0, weight=1)
         
         # Table
-        columns = ("Name", "Date", "Size (KB)", "Files")
+        columns = ("Name", "Date", "Type", "Size (KB)", "Stored (KB)", "Files")
         self.backup_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
         
         # Configure columns
         self.backup_tree.heading("Name", text="Backup Name")
         self.backup_tree.heading("Date", text="Date Created")
+        self.backup_tree.heading("Type", text="Type")
         self.backup_tree.heading("Size (KB)", text="Size (KB)")
+        self.backup_tree.heading("Stored (KB)", text="Stored (KB)")
         self.backup_tree.heading("Files", text="Files")
         
         self.backup_tree.column("Name", width=250)
         self.backup_tree.column("Date", width=180)
+        self.backup_tree.column("Type", width=100)
         self.backup_tree.column("Size (KB)", width=100)
+        self.backup_tree.column("Stored (KB)", width=100)
         self.backup_tree.column("Files", width=80)
         
         # Scrollbar
@@ -132,6 +177,17 @@ class Settings:
         )
         restore_btn.pack(side="left", padx=5)
         
+        restore_time_btn = ctk.CTkButton(
+            action_frame,
+            text="Restore to Time...",
+            command=self.restore_to_point_in_time,
+            fg_color="transparent",
+            border_width=2,
+            border_color=SUCCESS_COLOR,
+            height=40
+        )
+        restore_time_btn.pack(side="left", padx=5)
+        
         validate_btn = ctk.CTkButton(
             action_frame,
             text="Validate Selected",
@@ -143,6 +199,17 @@ class Settings:
         )
         validate_btn.pack(side="left", padx=5)
         
+        deep_verify_btn = ctk.CTkButton(
+            action_frame,
+            text="Deep Verify",
+            command=lambda: self.validate_backup(deep=True),
+            fg_color="transparent",
+            border_width=2,
+            border_color=SUCCESS_COLOR,
+            height=40
+        )
+        deep_verify_btn.pack(side="left", padx=5)
+        
         delete_btn = ctk.CTkButton(
             action_frame,
             text="Delete Selected",
@@ -234,6 +301,14 @@ class Settings:
         )
         change_password_btn.pack(pady=(0, 20), padx=20, fill="x")
     
+    def _describe_retention(self):
+        """Summarizes the retention policy, e.g. '24 hourly, 7 daily, 12 monthly'."""
+        tiers = [f"{count} {tier}" for tier, count in self.backup_manager.retention.items() if tier != "last"]
+        text = ", ".join(tiers) or f"the last {self.backup_manager.retention.get('last', 0)}"
+        if self.backup_manager.max_disk_mb is not None:
+            text += f" within {self.backup_manager.max_disk_mb} MB"
+        return text
+    
     def load_backups(self):
         """Loads and displays available backups."""
         # Clear existing items
@@ -248,19 +323,52 @@ class Settings:
             self.backup_tree.insert("", "end", values=(
                 backup['name'],
                 backup['date'],
+                backup['kind'].capitalize(),
                 backup['size_kb'],
+                backup['stored_kb'],
                 backup['file_count']
             ))
     
     def create_backup(self):
-        """Creates a new backup."""
-        success, backup_name, message = self.backup_manager.create_backup()
+        """Queues a new backup on the background worker."""
+        self.data_manager.save_all_data()
+        self.backup_manager.create_backup_async(
+            self.data_manager.serialize_snapshot,
+            log_seq=self.data_manager.snapshot_seq
+        )
+        self.update_backup_progress()
+    
+    def change_backup_mode(self, choice):
+        """Switches between incremental and compressed archive backups."""
+        for mode, label in BACKUP_MODES_DISPLAY.items():
+            if label == choice:
+                self.backup_manager.backup_mode = mode
+    
+    def poll_backup_progress(self):
+        """Refreshes the progress display while the Settings view is open."""
+        if not self.backup_progress_bar.winfo_exists():
+            return
+        self.update_backup_progress()
+        self.parent_frame.after(BACKUP_PROGRESS_POLL_MS, self.poll_backup_progress)
+    
+    def update_backup_progress(self):
+        """Shows the state of the current background backup."""
+        progress = self.backup_manager.get_progress()
+        state = progress['state']
+        
+        if progress['total']:
+            self.backup_progress_bar.set(progress['done'] / progress['total'])
+        elif state in ("idle", "queued"):
+            self.backup_progress_bar.set(0)
+        self.backup_progress_label.configure(
+            text=progress['message'],
+            text_color=DANGER_COLOR if state == "failed" else TEXT_SECONDARY_COLOR
+        )
         
-        if success:
-            messagebox.showinfo("Backup Created", message)
+        # Show new backups as soon as the worker finishes
+        if state != self._last_backup_state and state in ("done", "failed"):
             self.load_backups()
-        else:
-            messagebox.showerror("Backup Failed", message)
+        self._last_backup_state = state
     
     def restore_backup(self):
         """Restores from selected backup."""
@@ -282,19 +390,51 @@ class Settings:
         ):
             return
         
-        # Restore
+        # Write every current edit to the files first, so the restore is
+        # diffed against (and replaces) them
+        self.data_manager.save_all_data()
         success, message = self.backup_manager.restore_backup(backup_name)
         
         if success:
-            # Reload all data from restored files
-            self.data_manager.load_all_data()
-            messagebox.showinfo("Restore Successful", 
-                f"{message}\n\nData has been reloaded. Please refresh your current view.")
+            self._reload_restored_data(message)
         else:
             messagebox.showerror("Restore Failed", message)
     
-    def validate_backup(self):
-        """Validates selected backup."""
+    def restore_to_point_in_time(self):
+        """Restores data as it was at a time entered by the user."""
+        dialog = ctk.CTkInputDialog(
+            text="Restore data as it was at (YYYY-MM-DD HH:MM:SS):",
+            title="Restore to Point in Time"
+        )
+        target = dialog.get_input()
+        if not target:
+            return
+        
+        if not messagebox.askyesno(
+            "Confirm Restore",
+            f"Are you sure you want to restore data as of '{target}'?\n\n"
+            "This will replace all current data."
+        ):
+            return
+        
+        # Make sure every current edit is in the change log before rewinding
+        self.data_manager.save_all_data()
+        success, message = self.backup_manager.restore_to_point_in_time(target)
+        
+        if success:
+            self._reload_restored_data(message)
+        else:
+            messagebox.showerror("Restore Failed", message)
+    
+    def _reload_restored_data(self, message):
+        """Applies restored records to the live data and reports what changed."""
+        changes = self.data_manager.reload_changed()
+        changed_count = sum(len(keys) for keys in changes.values())
+        messagebox.showinfo("Restore Successful", 
+            f"{message}\n\n{changed_count} records updated across {len(changes)} files.")
+    
+    def validate_backup(self, deep=False):
+        """Validates selected backup against its checksums (or fully parses it when deep)."""
         selection = self.backup_tree.selection()
         
         if not selection:
@@ -306,7 +446,7 @@ class Settings:
         backup_name = item['values'][0]
         
         # Validate
-        valid, message = self.backup_manager.validate_backup(backup_name)
+        valid, message = self.backup_manager.validate_backup(backup_name, deep=deep)
         
         if valid:
             messagebox.showinfo("Validation Successful", message)
@@ -88,6 +88,11 @@ class Trainers:
                 trainer['status']
             ))
 
+    def on_data_changed(self, changes):
+        """Refreshes the table when reloaded data touches what it shows."""
+        if changes.keys() & {"trainers.json"}:
+            self.populate_table(self.search_entry.get())
+
     def open_popup(self, trainer_id):
         AddEditTrainerPopup(self, trainer_id)
 
@@ -115,8 +120,7 @@ class Trainers:
         if trainer:
             confirm = tk.messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {trainer['first_name']} {trainer['last_name']}? This cannot be undone.")
             if confirm:
-                del self.data_manager.trainers_db[trainer_id]
-                self.data_manager.save_data("trainers.json")
+                self.data_manager.delete_record("trainers.json", trainer_id)
                 self.populate_table()
 
 
@@ -313,11 +317,10 @@ class AddEditTrainerPopup(ctk.CTkToplevel):
         }
         
         if self.trainer_id:
-            self.data_manager.trainers_db[self.trainer_id] = data
+            self.data_manager.update_record("trainers.json", self.trainer_id, data)
         else:
-            new_id = generate_unique_id("T")
-            self.data_manager.trainers_db[new_id] = data
+            new_id = self.data_manager.new_key("trainers.json", "T")
+            self.data_manager.add_record("trainers.json", data, key=new_id)
             
-        self.data_manager.save_data("trainers.json")
         self.parent_ui.populate_table()
         self.destroy()
@@ -82,6 +82,11 @@ class Visitors:
                 visitor['status']
             ))
 
+    def on_data_changed(self, changes):
+        """Refreshes the table when reloaded data touches what it shows."""
+        if changes.keys() & {"visitors_log.json"}:
+            self.populate_table(self.search_entry.get())
+
     def open_popup(self, visitor_id):
         AddEditVisitorPopup(self, visitor_id)
 
@@ -102,8 +107,7 @@ class Visitors:
         if visitor:
             confirm = tk.messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {visitor['first_name']} {visitor['last_name']}? This cannot be undone.")
             if confirm:
-                self.data_manager.visitors_log.remove(visitor)
-                self.data_manager.save_data("visitors_log.json")
+                self.data_manager.delete_record("visitors_log.json", visitor_id)
                 self.populate_table()
 
 class AddEditVisitorPopup(ctk.CTkToplevel):
@@ -197,15 +201,10 @@ class AddEditVisitorPopup(ctk.CTkToplevel):
         }
         
         if self.visitor_id:
-            # Update existing
-            for v in self.data_manager.visitors_log:
-                if v['visitor_id'] == self.visitor_id:
-                    v.update(data)
-                    break
+            self.data_manager.update_record("visitors_log.json", self.visitor_id, data)
         else:
-            data["visitor_id"] = generate_unique_id("V")
-            self.data_manager.visitors_log.append(data)
+            data["visitor_id"] = self.data_manager.new_key("visitors_log.json", "V")
+            self.data_manager.add_record("visitors_log.json", data)
             
-        self.data_manager.save_data("visitors_log.json")
         self.parent_ui.populate_table()
         self.destroy()